@@ -4,20 +4,12 @@ from jose import jwt, JWTError
 from sqlalchemy.orm import Session
 
 from app.config import JWT_SECRET, JWT_ALGORITHM
-from app.database import SessionLocal
+from app.database import get_db
 from app.models import User
 
 security = HTTPBearer()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
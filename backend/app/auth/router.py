@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from passlib.hash import bcrypt
-from app.database import SessionLocal
+from app.database import get_db
 from app.models import User, ImpersonationLog
 from app.auth.jwt import create_access_token
 from app.config import ACCESS_TOKEN_EXPIRE_MINUTES
@@ -10,12 +10,6 @@ from app.schemas import ImpersonateRequest, ImpersonateResponse
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.post("/login")
 def login(data: dict, db: Session = Depends(get_db)):
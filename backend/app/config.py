@@ -12,6 +12,13 @@ load_dotenv(BASE_DIR / ".env")
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set. Please configure it in the environment.")
+
+# SQLite only: "tuned" (WAL, reader pool, one batching writer; app.utils.sqlite_writer) or "default"
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned").lower()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+SQLITE_WRITE_BATCH = int(os.getenv("SQLITE_WRITE_BATCH", "256"))
 JWT_SECRET = os.getenv("JWT_SECRET", "CHANGE_ME")
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
@@ -26,3 +33,43 @@ ADMIN_NAME = os.getenv("ADMIN_NAME", "System Admin")
 PRIME_ADMIN_USERNAME = os.getenv("PRIME_ADMIN_USERNAME", "primeadmin")
 PRIME_ADMIN_PASSWORD = os.getenv("PRIME_ADMIN_PASSWORD", "primepass123")
 PRIME_ADMIN_NAME = os.getenv("PRIME_ADMIN_NAME", "Prime Admin")
+
+# Bulk rider import: bcrypt cost and hashing threads (0 = one per CPU)
+IMPORT_BCRYPT_ROUNDS = int(os.getenv("IMPORT_BCRYPT_ROUNDS", "10"))
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", "0"))
+
+# Response compression: bodies smaller than this many bytes go out uncompressed
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Dashboard aggregate cache: memory (per worker), sqlite (shared by workers on one host) or off
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory").lower()
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "10"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "/tmp/riderapp-result-cache.sqlite3")
+
+# Query diagnostics: off, log or raise on repeated query shapes (N+1) and exceeded query budgets
+QUERY_DIAGNOSTICS = os.getenv("QUERY_DIAGNOSTICS", "off").lower()
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+
+# Slow-query log: statements over SLOW_QUERY_MS (0 = off) go to a rotating JSON-lines file;
+# on Postgres a bounded number of them per minute also get EXPLAIN (ANALYZE, BUFFERS)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_LOG_PATH = os.getenv("SLOW_QUERY_LOG_PATH", "/tmp/riderapp-slow-queries.log")
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "3"))
+SLOW_QUERY_EXPLAIN_PER_MINUTE = int(os.getenv("SLOW_QUERY_EXPLAIN_PER_MINUTE", "2"))
+
+# On-demand request profiling (X-Profile: 1 from a prime admin); off = middleware not installed
+PROFILING = os.getenv("PROFILING", "false").lower() == "true"
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/riderapp-profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_PER_MINUTE = int(os.getenv("PROFILE_MAX_PER_MINUTE", "6"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "100"))
+
+# Background scheduler: one leader across workers (Postgres advisory lock, or a file lock on one host)
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+SCHEDULER_LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", "/tmp/riderapp-scheduler.lock")
+# Riders with no status change or location ping for this long are moved to offline
+STALE_RIDER_MINUTES = float(os.getenv("STALE_RIDER_MINUTES", "15"))
+STALE_RIDER_CHECK_SECONDS = float(os.getenv("STALE_RIDER_CHECK_SECONDS", "30"))
+# POST /rider/sync remembers idempotency keys this long; older client events are rejected
+SYNC_KEY_RETENTION_HOURS = float(os.getenv("SYNC_KEY_RETENTION_HOURS", "168"))
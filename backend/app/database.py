@@ -1,10 +1,68 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
-from app.config import DATABASE_URL
+from app.config import (
+    DATABASE_URL,
+    SLOW_QUERY_MS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_MMAP_SIZE,
+    SQLITE_PROFILE,
+    SQLITE_READ_POOL_SIZE,
+    SQLITE_WRITE_BATCH,
+)
+from app.utils import slow_queries, sqlite_writer
 
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+is_sqlite = DATABASE_URL.startswith("sqlite")
+connect_args = {"check_same_thread": False} if is_sqlite else {}
+# An in-memory database lives in a single connection; only file databases get the tuned profile.
+tuned_sqlite = (
+    is_sqlite and SQLITE_PROFILE == "tuned" and make_url(DATABASE_URL).database not in (None, "", ":memory:")
+)
+
+write_queue: sqlite_writer.WriteQueue | None = None
+if tuned_sqlite:
+    engine = create_engine(DATABASE_URL, connect_args=connect_args, pool_size=SQLITE_READ_POOL_SIZE)
+    write_engine = create_engine(DATABASE_URL, connect_args=connect_args, pool_size=1, max_overflow=0)
+    for e in (engine, write_engine):
+        sqlite_writer.tune_connections(e, SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE)
+    sqlite_writer.immediate_transactions(write_engine)
+    write_queue = sqlite_writer.WriteQueue(write_engine, SQLITE_WRITE_BATCH)
+else:
+    engine = create_engine(DATABASE_URL, connect_args=connect_args)
+    write_engine = engine
 SessionLocal = sessionmaker(bind=engine)
 
+if SLOW_QUERY_MS > 0:
+    slow_queries.instrument_engine(engine)
+    if write_engine is not engine:
+        slow_queries.instrument_engine(write_engine)
+
 Base = declarative_base()
+
+
+def get_db():
+    """
+    Request-scoped session. Routers and the auth dependencies all depend on this one
+    function, so FastAPI's per-request dependency cache gives them a single shared
+    session (and pool connection) instead of one each.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def run_write(db: Session, fn):
+    """
+    Run fn(session) and commit; returns its result. On the tuned SQLite profile
+    this happens on the batching writer's own session (app.utils.sqlite_writer),
+    so fn must only use the session it is given, and only already-loaded
+    attributes of objects from `db`.
+    """
+    if write_queue is None:
+        result = fn(db)
+        db.commit()
+        return result
+    return write_queue.submit(fn)
@@ -0,0 +1,11 @@
+# Loaded automatically by gunicorn from the working directory (/app in the image).
+
+
+def child_exit(server, worker):
+    """Drop an exited worker's live gauges from the multiprocess metrics directory."""
+    import os
+
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,178 @@
+"""
+Derive `present` attendance from rider activity.
+
+Consumes new rider_status and rider_locations rows past a stored high-water
+mark. On Postgres a transaction can commit after others that took later ids
+(a large offline sync, say), so each batch also reads the RESCAN_IDS ids
+below the mark again rather than miss those rows. An event counts when it is not an
+`offline` status and falls inside one of the rider's shifts (stored or
+generated from a template); the rider is then present on that shift's day.
+Rows are written with ON CONFLICT DO NOTHING, so any existing mark for the
+day, and in particular a manual one, is never overwritten. Nothing is
+consumed while rider_status is still being converted to status codes
+(app.jobs.status_code_migration).
+
+    python -m app.jobs.attendance_derivation            # poll every 60s
+    python -m app.jobs.attendance_derivation --once     # drain and exit
+"""
+import argparse
+import time as time_mod
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Attendance, JobCheckpoint, RiderLocation, RiderStatus, Shift
+from app.routers.shifts import load_templates
+from app.utils.change_version import bump, scopes_for_riders
+from app.utils.shift_templates import merged_occurrences
+from app.utils.status_codes import backfill_pending
+from app.utils.upsert import upsert
+
+STATUS_CHECKPOINT = "attendance_derivation:rider_status"
+LOCATION_CHECKPOINT = "attendance_derivation:rider_locations"
+BATCH_SIZE = 5000
+RESCAN_IDS = 1000  # trailing ids re-read per batch; re-deriving a row is a no-op
+
+
+def get_checkpoint(db: Session, name: str) -> JobCheckpoint:
+    checkpoint = db.get(JobCheckpoint, name)
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name=name, position=0)
+        db.add(checkpoint)
+    return checkpoint
+
+
+def shift_windows(db: Session, rider_ids: set[int], start: datetime, end: datetime):
+    """Per rider, (starts, spans) sorted by start for shifts overlapping [start, end]."""
+    spans: dict[int, list[tuple[datetime, datetime]]] = defaultdict(list)
+    rows = (
+        db.query(Shift.rider_id, Shift.start_time, Shift.end_time)
+        .filter(
+            Shift.rider_id.in_(rider_ids),
+            Shift.start_time <= end,
+            Shift.end_time > start,
+        )
+        .all()
+    )
+    for row in rows:
+        spans[row.rider_id].append((row.start_time, row.end_time))
+
+    gen_start = start - timedelta(days=1)  # overnight occurrences from the day before
+    gen_end = end + timedelta(microseconds=1)
+    templates, skip = load_templates(db, list(rider_ids), gen_start, gen_end)
+    for occ in merged_occurrences(templates, skip, gen_start, gen_end):
+        spans[occ["rider_id"]].append((occ["start_time"], occ["end_time"]))
+
+    windows = {}
+    for rider_id, items in spans.items():
+        items.sort()
+        windows[rider_id] = ([s for s, _ in items], items)
+    return windows
+
+
+def derive_batch(db: Session, batch_size: int = BATCH_SIZE) -> tuple[int, int]:
+    """
+    Consume up to batch_size new events from each source and write attendance for them.
+    Checkpoints move in the same transaction as the writes. Returns (events, rows written).
+    """
+    status_cp = get_checkpoint(db, STATUS_CHECKPOINT)
+    location_cp = get_checkpoint(db, LOCATION_CHECKPOINT)
+
+    statuses = (
+        db.query(RiderStatus.id, RiderStatus.rider_id, RiderStatus.status, RiderStatus.updated_at)
+        .filter(RiderStatus.id > status_cp.position - RESCAN_IDS)
+        .order_by(RiderStatus.id)
+        .limit(batch_size + RESCAN_IDS)
+        .all()
+    )
+    locations = (
+        db.query(RiderLocation.id, RiderLocation.rider_id, RiderLocation.updated_at)
+        .filter(RiderLocation.id > location_cp.position - RESCAN_IDS)
+        .order_by(RiderLocation.id)
+        .limit(batch_size + RESCAN_IDS)
+        .all()
+    )
+    consumed = sum(r.id > status_cp.position for r in statuses)
+    consumed += sum(r.id > location_cp.position for r in locations)
+    if statuses:
+        status_cp.position = max(status_cp.position, statuses[-1].id)
+    if locations:
+        location_cp.position = max(location_cp.position, locations[-1].id)
+
+    activity = [
+        (r.rider_id, r.updated_at)
+        for r in statuses
+        if r.status is not None and r.status != "offline" and r.updated_at and r.rider_id
+    ]
+    activity += [(r.rider_id, r.updated_at) for r in locations if r.updated_at and r.rider_id]
+
+    written = 0
+    if activity:
+        stamps = [ts for _, ts in activity]
+        windows = shift_windows(db, {rid for rid, _ in activity}, min(stamps), max(stamps))
+
+        present: set[tuple[int, object]] = set()
+        for rider_id, ts in activity:
+            if rider_id not in windows:
+                continue
+            starts, spans = windows[rider_id]
+            idx = bisect_right(starts, ts) - 1
+            if idx >= 0 and ts < spans[idx][1]:
+                present.add((rider_id, spans[idx][0].date()))
+
+        now = datetime.utcnow()
+        written = upsert(
+            db,
+            Attendance.__table__,
+            [
+                {"rider_id": rid, "date": day, "status": "present", "source": "auto", "created_at": now, "updated_at": now}
+                for rid, day in sorted(present)
+            ],
+            conflict_columns=["rider_id", "date"],
+            update_columns=[],
+        )
+        if written:
+            bump(db, scopes_for_riders(db, {rid for rid, _ in present}))
+
+    db.commit()
+    return consumed, written
+
+
+def run_once(batch_size: int = BATCH_SIZE) -> dict:
+    """Drain everything past the high-water marks, one batch per transaction."""
+    events = written = 0
+    db = SessionLocal()
+    try:
+        if backfill_pending(db):
+            return {"events": 0, "attendance_rows": 0}
+        while True:
+            consumed, rows = derive_batch(db, batch_size)
+            events += consumed
+            written += rows
+            if consumed < batch_size:
+                break
+    finally:
+        db.close()
+    return {"events": events, "attendance_rows": written}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--interval", type=float, default=60.0, help="Seconds between polls")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--once", action="store_true", help="Drain once and exit")
+    args = parser.parse_args()
+
+    while True:
+        result = run_once(args.batch_size)
+        print(f"[attendance] consumed {result['events']} events, wrote {result['attendance_rows']} rows")
+        if args.once:
+            break
+        time_mod.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
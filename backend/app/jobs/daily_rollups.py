@@ -0,0 +1,454 @@
+"""
+Daily rollups for historical reporting (rider_daily_rollups, store_daily_rollups).
+
+A rider-day row holds the seconds spent in each status, the transitions into
+delivery, GPS pings and distance, the attendance mark and the status the day
+ended in. Store rows are the per-store sums of a day. /reports reads only
+these tables, never the raw history.
+
+Days are UTC and are rolled up once complete. Each run:
+
+1. Consumes rider_status, rider_locations and attendance rows past their id
+   high-water marks, re-reading the RESCAN_IDS ids below each mark for rows
+   that committed behind it (see app.jobs.attendance_derivation). Rows that land on an already closed day (late uploads,
+   manual edits) mark that rider-day dirty; later days are left to step 3.
+   Attendance is also updated in place, so the marks of the last
+   ATTENDANCE_LOOKBACK_DAYS closed days are compared with the rollups too.
+2. Recomputes dirty rider-days oldest first. A day starts in the previous
+   day's end_status, so when a recomputed end_status changes the next closed
+   day is recomputed as well.
+3. Closes the days after the `daily_rollups:closed_through` checkpoint up to
+   yesterday, one transaction per day. The first run starts at most
+   BACKFILL_DAYS back.
+
+Nothing runs while rider_status is still being converted to status codes
+(app.jobs.status_code_migration), so no day is rolled up from rows whose
+status is not readable yet.
+
+Recomputing a day replaces its rows, so runs are idempotent and any range can
+be rebuilt by hand (e.g. after attendance edits older than the lookback):
+
+    python -m app.jobs.daily_rollups                                  # run once
+    python -m app.jobs.daily_rollups --recompute 2026-01-01 2026-01-31
+"""
+import argparse
+import math
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.jobs.attendance_derivation import RESCAN_IDS, get_checkpoint
+from app.models import (
+    Attendance,
+    RiderDailyRollup,
+    RiderLocation,
+    RiderStatus,
+    StoreDailyRollup,
+    User,
+)
+from app.utils.rider_status import OFFLINE
+from app.utils.status_codes import backfill_pending
+from app.utils.upsert import upsert
+
+STATUS_CHECKPOINT = "daily_rollups:rider_status"
+LOCATION_CHECKPOINT = "daily_rollups:rider_locations"
+ATTENDANCE_CHECKPOINT = "daily_rollups:attendance"
+CLOSED_CHECKPOINT = "daily_rollups:closed_through"  # date.toordinal() of the last closed day
+FIRST_DAY_CHECKPOINT = "daily_rollups:first_day"
+BATCH_SIZE = 5000
+BACKFILL_DAYS = 90
+ATTENDANCE_LOOKBACK_DAYS = 7
+UNASSIGNED = "Unassigned"
+
+# Per checkpoint, the ids below the mark this process has already read, so the
+# re-read only dirties rows that showed up late.
+_tail_seen: dict[str, set[int]] = {}
+
+DELIVERY = "delivery"
+STATUS_COLUMNS = {"available": "seconds_available", DELIVERY: "seconds_delivery", "break": "seconds_break"}
+ROLLUP_COLUMNS = [
+    "store", "seconds_online", "seconds_available", "seconds_delivery", "seconds_break",
+    "deliveries", "pings", "distance_km", "attendance", "end_status", "computed_at",
+]
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 6371.0088 * 2 * math.asin(math.sqrt(a))
+
+
+def day_bounds(day: date) -> tuple[datetime, datetime]:
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def _live(state: str | None) -> str | None:
+    """None for "not online", so a missing status and `offline` compare equal."""
+    return None if state in (None, OFFLINE) else state
+
+
+# ---------- RAW READS ----------
+def raw_carry_in(db: Session, start: datetime, rider_ids: set[int] | None) -> dict[int, str]:
+    """Each rider's last status before `start`, read from rider_status (where no rollup day precedes it)."""
+    latest = db.query(
+        RiderStatus.rider_id.label("rider_id"),
+        func.max(RiderStatus.updated_at).label("at"),
+    ).filter(RiderStatus.updated_at < start)
+    if rider_ids is not None:
+        latest = latest.filter(RiderStatus.rider_id.in_(rider_ids))
+    latest = latest.group_by(RiderStatus.rider_id).subquery()
+    rows = (
+        db.query(RiderStatus.rider_id, RiderStatus.status)
+        .join(latest, and_(RiderStatus.rider_id == latest.c.rider_id, RiderStatus.updated_at == latest.c.at))
+        .order_by(RiderStatus.id)
+        .all()
+    )
+    return {r.rider_id: r.status for r in rows}  # ties: highest id wins
+
+
+def _carry_in(db: Session, day: date, first_day: date, rider_ids: set[int] | None) -> dict[int, str]:
+    if day <= first_day:
+        return raw_carry_in(db, day_bounds(day)[0], rider_ids)
+    q = db.query(RiderDailyRollup.rider_id, RiderDailyRollup.end_status).filter(
+        RiderDailyRollup.day == day - timedelta(days=1)
+    )
+    if rider_ids is not None:
+        q = q.filter(RiderDailyRollup.rider_id.in_(rider_ids))
+    return {r.rider_id: r.end_status for r in q}
+
+
+def compute_day(db: Session, day: date, first_day: date, rider_ids: set[int] | None = None) -> dict[int, dict]:
+    """
+    Rollup rows for `day`, keyed by rider id: for `rider_ids`, or for every rider
+    with activity, an attendance mark or a carried-in online status when None.
+    Riders with none of those get no row.
+    """
+    start, end = day_bounds(day)
+
+    def scoped(q, column):
+        return q.filter(column.in_(rider_ids)) if rider_ids is not None else q
+
+    statuses = scoped(
+        db.query(RiderStatus.rider_id, RiderStatus.status, RiderStatus.updated_at)
+        .filter(RiderStatus.updated_at >= start, RiderStatus.updated_at < end),
+        RiderStatus.rider_id,
+    ).order_by(RiderStatus.rider_id, RiderStatus.updated_at, RiderStatus.id).all()
+    pings = scoped(
+        db.query(RiderLocation.rider_id, RiderLocation.lat, RiderLocation.lng)
+        .filter(RiderLocation.updated_at >= start, RiderLocation.updated_at < end),
+        RiderLocation.rider_id,
+    ).order_by(RiderLocation.rider_id, RiderLocation.updated_at, RiderLocation.id).all()
+    marks = dict(
+        scoped(db.query(Attendance.rider_id, Attendance.status).filter(Attendance.date == day), Attendance.rider_id).all()
+    )
+    carry = _carry_in(db, day, first_day, rider_ids)
+
+    events: dict[int, list] = defaultdict(list)
+    for r in statuses:
+        events[r.rider_id].append((r.status, r.updated_at))
+    tracks: dict[int, list] = defaultdict(list)
+    for r in pings:
+        tracks[r.rider_id].append((r.lat, r.lng))
+
+    candidates = set(events) | set(tracks) | set(marks) | {rid for rid, s in carry.items() if _live(s)}
+    if not candidates:
+        return {}
+    stores = dict(
+        db.query(User.id, User.store).filter(User.role == "rider", User.id.in_(candidates)).all()
+    )
+
+    now = datetime.utcnow()
+    rows = {}
+    for rider_id in candidates:
+        if rider_id not in stores:
+            continue  # deleted, or not a rider
+        seconds: dict[str, float] = defaultdict(float)
+        deliveries = 0
+        state, since = carry.get(rider_id), start
+        for status, at in events.get(rider_id, ()):
+            if state is not None:
+                seconds[state] += (at - since).total_seconds()
+            if status == DELIVERY and state != DELIVERY:
+                deliveries += 1
+            state, since = status, at
+        if state is not None:
+            seconds[state] += (end - since).total_seconds()
+
+        track = tracks.get(rider_id, [])
+        distance = sum(
+            haversine_km(a[0], a[1], b[0], b[1]) for a, b in zip(track, track[1:])
+        )
+        row = {
+            "rider_id": rider_id,
+            "day": day,
+            "store": stores[rider_id],
+            "seconds_online": round(sum(v for k, v in seconds.items() if k != OFFLINE)),
+            "deliveries": deliveries,
+            "pings": len(track),
+            "distance_km": round(distance, 3),
+            "attendance": marks.get(rider_id),
+            "end_status": state,
+            "computed_at": now,
+        }
+        for status, column in STATUS_COLUMNS.items():
+            row[column] = round(seconds.get(status, 0.0))
+        rows[rider_id] = row
+    return rows
+
+
+# ---------- WRITES ----------
+def write_day(db: Session, day: date, rows: dict[int, dict], rider_ids: set[int] | None = None) -> set[int]:
+    """
+    Replace the day's rows (all of them, or those of `rider_ids`) and re-sum its
+    store rows. Returns the riders whose end_status changed.
+    """
+    existing = db.query(RiderDailyRollup.rider_id, RiderDailyRollup.end_status).filter(RiderDailyRollup.day == day)
+    if rider_ids is not None:
+        existing = existing.filter(RiderDailyRollup.rider_id.in_(rider_ids))
+    before = {r.rider_id: r.end_status for r in existing}
+
+    stale = set(before) - set(rows)
+    if stale:
+        db.query(RiderDailyRollup).filter(
+            RiderDailyRollup.day == day, RiderDailyRollup.rider_id.in_(stale)
+        ).delete(synchronize_session=False)
+    upsert(
+        db,
+        RiderDailyRollup.__table__,
+        list(rows.values()),
+        conflict_columns=["rider_id", "day"],
+        update_columns=ROLLUP_COLUMNS,
+    )
+    sum_stores(db, day)
+
+    changed = set()
+    for rider_id in set(before) | set(rows):
+        new = rows[rider_id]["end_status"] if rider_id in rows else None
+        if _live(before.get(rider_id)) != _live(new):
+            changed.add(rider_id)
+    return changed
+
+
+def store_sum_columns() -> list:
+    """Aggregates of rider_daily_rollups that make up a store_daily_rollups row (group by store and day)."""
+    r = RiderDailyRollup
+    return [
+        func.sum(case((r.seconds_online + r.pings > 0, 1), else_=0)).label("riders_active"),
+        func.sum(case((r.attendance == "present", 1), else_=0)).label("riders_present"),
+        func.sum(case((r.attendance == "absent", 1), else_=0)).label("riders_absent"),
+        func.sum(r.seconds_online).label("seconds_online"),
+        func.sum(r.seconds_available).label("seconds_available"),
+        func.sum(r.seconds_delivery).label("seconds_delivery"),
+        func.sum(r.seconds_break).label("seconds_break"),
+        func.sum(r.deliveries).label("deliveries"),
+        func.sum(r.distance_km).label("distance_km"),
+    ]
+
+
+def sum_stores(db: Session, day: date) -> None:
+    """Rebuild the day's store rows from its rider rows."""
+    store = func.coalesce(RiderDailyRollup.store, UNASSIGNED)
+    sums = (
+        db.query(store.label("store"), *store_sum_columns())
+        .filter(RiderDailyRollup.day == day)
+        .group_by(store)
+        .all()
+    )
+    now = datetime.utcnow()
+    db.query(StoreDailyRollup).filter(StoreDailyRollup.day == day).delete(synchronize_session=False)
+    if sums:
+        db.bulk_insert_mappings(
+            StoreDailyRollup,
+            [{**row._asdict(), "day": day, "computed_at": now} for row in sums],
+        )
+
+
+# ---------- RUN ----------
+def _consume(db: Session, checkpoint_name: str, id_col, rider_col, day_of, closed: date, dirty, tails) -> int:
+    """
+    Mark the closed rider-days of rows past the checkpoint dirty; returns new rows read.
+    The ids now below the mark go to tails, for _tail_seen once the marks are committed.
+    """
+    checkpoint = get_checkpoint(db, checkpoint_name)
+    mark = checkpoint.position
+    seen = _tail_seen.get(checkpoint_name, set())
+    after = mark - RESCAN_IDS
+    ids: list[int] = []
+    while True:
+        rows = (
+            db.query(id_col, rider_col, day_of)
+            .filter(id_col > after)
+            .order_by(id_col)
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        for row_id, rider_id, day in rows:
+            ids.append(row_id)
+            if row_id <= mark and row_id in seen:
+                continue
+            if rider_id is not None and day is not None:
+                day = day.date() if isinstance(day, datetime) else day
+                if day <= closed:
+                    dirty[day].add(rider_id)
+        if rows:
+            after = rows[-1][0]
+        if len(rows) < BATCH_SIZE:
+            break
+    checkpoint.position = max(mark, after)
+    tails[checkpoint_name] = {i for i in ids if i > checkpoint.position - RESCAN_IDS}
+    return sum(i > mark for i in ids)
+
+
+def _changed_attendance(db: Session, since: date, closed: date, dirty) -> None:
+    marks = {
+        (r.rider_id, r.date): r.status
+        for r in db.query(Attendance.rider_id, Attendance.date, Attendance.status)
+        .join(User, User.id == Attendance.rider_id)
+        .filter(User.role == "rider", Attendance.date >= since, Attendance.date <= closed)
+    }
+    rolled = {
+        (r.rider_id, r.day): r.attendance
+        for r in db.query(RiderDailyRollup.rider_id, RiderDailyRollup.day, RiderDailyRollup.attendance)
+        .filter(RiderDailyRollup.day >= since, RiderDailyRollup.day <= closed)
+    }
+    for key in set(marks) | set(rolled):
+        if marks.get(key) != rolled.get(key):
+            dirty[key[1]].add(key[0])
+
+
+def recompute(db: Session, dirty: dict[date, set[int]], first_day: date, closed: date) -> int:
+    """Recompute dirty rider-days oldest first, following end_status changes forward. Returns rider-days written."""
+    written = 0
+    day = min(dirty, default=None)
+    while day is not None and day <= closed:
+        riders = dirty.pop(day, set())
+        if riders and day >= first_day:
+            rows = compute_day(db, day, first_day, riders)
+            changed = write_day(db, day, rows, riders)
+            written += len(riders)
+            if changed:
+                dirty[day + timedelta(days=1)] |= changed
+        day = min(dirty, default=None)
+    return written
+
+
+def _initialize(db: Session, yesterday: date) -> None:
+    """First run: start the marks at the current ids and pick the first day to close."""
+    for name, col in (
+        (STATUS_CHECKPOINT, RiderStatus.id),
+        (LOCATION_CHECKPOINT, RiderLocation.id),
+        (ATTENDANCE_CHECKPOINT, Attendance.id),
+    ):
+        get_checkpoint(db, name).position = db.query(func.coalesce(func.max(col), 0)).scalar()
+    earliest = db.query(func.min(RiderStatus.updated_at)).scalar()
+    first_day = max(earliest.date(), yesterday - timedelta(days=BACKFILL_DAYS - 1)) if earliest else yesterday + timedelta(days=1)
+    get_checkpoint(db, FIRST_DAY_CHECKPOINT).position = first_day.toordinal()
+    get_checkpoint(db, CLOSED_CHECKPOINT).position = first_day.toordinal() - 1
+    db.commit()
+
+
+def run_once() -> dict:
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    db = SessionLocal()
+    try:
+        if backfill_pending(db):
+            return {"events": 0, "recomputed": 0, "closed_days": 0}
+        if get_checkpoint(db, CLOSED_CHECKPOINT).position == 0:
+            _initialize(db, yesterday)
+        first_day = date.fromordinal(get_checkpoint(db, FIRST_DAY_CHECKPOINT).position)
+        closed_cp = get_checkpoint(db, CLOSED_CHECKPOINT)
+        closed = date.fromordinal(closed_cp.position)
+
+        # 1. late rows for closed days; the marks commit with the recomputation
+        dirty: dict[date, set[int]] = defaultdict(set)
+        tails: dict[str, set[int]] = {}
+        events = _consume(
+            db, STATUS_CHECKPOINT, RiderStatus.id, RiderStatus.rider_id, RiderStatus.updated_at, closed, dirty, tails
+        )
+        events += _consume(
+            db, LOCATION_CHECKPOINT, RiderLocation.id, RiderLocation.rider_id, RiderLocation.updated_at, closed, dirty, tails
+        )
+        events += _consume(db, ATTENDANCE_CHECKPOINT, Attendance.id, Attendance.rider_id, Attendance.date, closed, dirty, tails)
+        _changed_attendance(db, max(first_day, closed - timedelta(days=ATTENDANCE_LOOKBACK_DAYS - 1)), closed, dirty)
+        if dirty and min(dirty) < first_day:
+            # History older than the rollups (e.g. imported after the first run): start them
+            # earlier; the end_status cascade fills in the days in between.
+            first_day = max(min(dirty), yesterday - timedelta(days=BACKFILL_DAYS - 1))
+            get_checkpoint(db, FIRST_DAY_CHECKPOINT).position = first_day.toordinal()
+
+        # 2. recompute them
+        recomputed = recompute(db, dirty, first_day, closed)
+        db.commit()
+        _tail_seen.update(tails)
+
+        # 3. close complete days
+        closed_days = 0
+        while closed < yesterday:
+            closed += timedelta(days=1)
+            write_day(db, closed, compute_day(db, closed, first_day))
+            closed_cp.position = closed.toordinal()
+            db.commit()
+            closed_days += 1
+    finally:
+        db.close()
+    return {"events": events, "recomputed": recomputed, "closed_days": closed_days}
+
+
+def recompute_range(start: date, end: date) -> int:
+    """Rebuild every rider-day in [start, end] (clamped to closed days); moves the first day back if needed."""
+    db = SessionLocal()
+    try:
+        if backfill_pending(db):
+            raise SystemExit("rider_status is still being converted to status codes; wait for the backfill")
+        closed_cp = get_checkpoint(db, CLOSED_CHECKPOINT)
+        if closed_cp.position == 0:
+            raise SystemExit("Rollups were never initialized; run the job once first")
+        first_cp = get_checkpoint(db, FIRST_DAY_CHECKPOINT)
+        if start.toordinal() < first_cp.position:
+            first_cp.position = start.toordinal()
+        first_day = date.fromordinal(first_cp.position)
+        end = min(end, date.fromordinal(closed_cp.position))
+        days = 0
+        day = start
+        while day <= end:
+            write_day(db, day, compute_day(db, day, first_day))
+            db.commit()
+            day += timedelta(days=1)
+            days += 1
+        if days:
+            # The day after the range starts from the rebuilt end_status.
+            following = day
+            if following <= date.fromordinal(closed_cp.position):
+                riders = {r.rider_id for r in db.query(RiderDailyRollup.rider_id).filter(RiderDailyRollup.day == end)}
+                riders |= {r.rider_id for r in db.query(RiderDailyRollup.rider_id).filter(RiderDailyRollup.day == following)}
+                recompute(db, defaultdict(set, {following: riders}), first_day, date.fromordinal(closed_cp.position))
+                db.commit()
+    finally:
+        db.close()
+    return days
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--recompute", nargs=2, metavar=("FROM", "TO"), type=date.fromisoformat,
+                        help="Rebuild the rollups of an inclusive range of days")
+    args = parser.parse_args()
+
+    if args.recompute:
+        days = recompute_range(*args.recompute)
+        print(f"[rollups] recomputed {days} days")
+        return
+    result = run_once()
+    print(
+        f"[rollups] consumed {result['events']} rows, recomputed {result['recomputed']} rider-days, "
+        f"closed {result['closed_days']} days"
+    )
+
+
+if __name__ == "__main__":
+    main()
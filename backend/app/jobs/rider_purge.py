@@ -0,0 +1,116 @@
+"""
+Set-based deletion of riders and their history.
+
+Small teams are removed synchronously with one DELETE per table. Riders
+with large histories are soft-deleted instead (role becomes
+`deleted_rider`, login disabled, username freed) and their rows are purged
+here in bounded batches, one short transaction each, so no request holds
+long table locks.
+
+    python -m app.jobs.rider_purge     # finish any pending purge
+"""
+from sqlalchemy import String, cast, func
+from sqlalchemy.orm import Query, Session
+
+from app.database import SessionLocal
+from app.models import (
+    Attendance,
+    Dispatch,
+    RiderCurrentStatus,
+    RiderDailyRollup,
+    RiderLocation,
+    RiderStatus,
+    Shift,
+    ShiftTemplate,
+    ShiftTemplateException,
+    SyncReceipt,
+    User,
+)
+
+DELETED_ROLE = "deleted_rider"
+SYNC_HISTORY_LIMIT = 10000  # rows per history table above which deletion goes async
+PURGE_BATCH_SIZE = 5000
+
+# Tables keyed by rider_id, children before parents.
+HISTORY_MODELS = (
+    RiderStatus, RiderLocation, Attendance, Shift, Dispatch, RiderDailyRollup, RiderCurrentStatus, SyncReceipt,
+)
+# Keyed by (rider_id, ...) without an id column; removed at soft-delete time instead of purged in batches.
+SOFT_DELETED_MODELS = (RiderDailyRollup, RiderCurrentStatus, SyncReceipt)
+
+
+def delete_rider_rows(db: Session, rider_ids: Query | list[int]) -> None:
+    """One DELETE per table for every rider id given (a subquery or a short list)."""
+    db.query(ShiftTemplateException).filter(
+        ShiftTemplateException.template_id.in_(
+            db.query(ShiftTemplate.id).filter(ShiftTemplate.rider_id.in_(rider_ids))
+        )
+    ).delete(synchronize_session=False)
+    db.query(ShiftTemplate).filter(ShiftTemplate.rider_id.in_(rider_ids)).delete(synchronize_session=False)
+    for model in HISTORY_MODELS:
+        db.query(model).filter(model.rider_id.in_(rider_ids)).delete(synchronize_session=False)
+
+
+def has_large_history(db: Session, rider_ids: Query | list[int]) -> bool:
+    """True when status or location history exceeds SYNC_HISTORY_LIMIT (probed, not counted)."""
+    for model in (RiderStatus, RiderLocation):
+        probe = (
+            db.query(model.id)
+            .filter(model.rider_id.in_(rider_ids))
+            .offset(SYNC_HISTORY_LIMIT)
+            .limit(1)
+            .first()
+        )
+        if probe is not None:
+            return True
+    return False
+
+
+def soft_delete_riders(db: Session, rider_ids: list[int]) -> None:
+    """Hide riders at once: they drop out of every role == "rider" query and cannot log in."""
+    if not rider_ids:
+        return
+    db.query(User).filter(User.id.in_(rider_ids)).update(
+        {
+            User.role: DELETED_ROLE,
+            User.is_active: False,
+            # Free the username for re-use while the purge is pending.
+            User.username: func.substr(User.username, 1, 70) + "#deleted-" + cast(User.id, String),
+        },
+        synchronize_session=False,
+    )
+    for model in SOFT_DELETED_MODELS:
+        db.query(model).filter(model.rider_id.in_(rider_ids)).delete(synchronize_session=False)
+
+
+def purge_deleted_riders(batch_size: int = PURGE_BATCH_SIZE) -> int:
+    """Delete history of soft-deleted riders in bounded batches, then the riders. Returns rows removed."""
+    removed = 0
+    db = SessionLocal()
+    try:
+        pending = db.query(User.id).filter(User.role == DELETED_ROLE)
+        targets = [
+            (ShiftTemplateException, ShiftTemplateException.template_id.in_(
+                db.query(ShiftTemplate.id).filter(ShiftTemplate.rider_id.in_(pending))
+            )),
+            (ShiftTemplate, ShiftTemplate.rider_id.in_(pending)),
+        ] + [(model, model.rider_id.in_(pending)) for model in HISTORY_MODELS if model not in SOFT_DELETED_MODELS]
+
+        for model, condition in targets:
+            while True:
+                ids = [r.id for r in db.query(model.id).filter(condition).limit(batch_size).all()]
+                if not ids:
+                    break
+                db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+                db.commit()
+                removed += len(ids)
+
+        removed += db.query(User).filter(User.role == DELETED_ROLE).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return removed
+
+
+if __name__ == "__main__":
+    print(f"[purge] removed {purge_deleted_riders()} rows")
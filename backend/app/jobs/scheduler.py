@@ -0,0 +1,197 @@
+"""
+In-process job scheduler with one leader across workers (SCHEDULER_ENABLED).
+
+Every worker starts the scheduler thread on startup, but only the worker
+holding the leader lock runs jobs; the others retry the lock every
+LEADER_RETRY_SECONDS and take over when the leader exits. On Postgres the
+lock is a session-level pg_try_advisory_lock on a connection the leader
+keeps open, so it covers every host and is released when the process or
+its connection dies. Elsewhere (SQLite) it is an fcntl lock on
+SCHEDULER_LOCK_PATH, which covers the workers of one host.
+
+Registered jobs:
+  stale-riders           every STALE_RIDER_CHECK_SECONDS (app.jobs.stale_riders)
+  attendance-derivation  every 60s (app.jobs.attendance_derivation)
+  rider-purge            every 10 minutes (app.jobs.rider_purge)
+  status-code-backfill   every 60s until done (app.jobs.status_code_migration)
+  daily-rollups          every 5 minutes (app.jobs.daily_rollups)
+  sync-receipts          every hour (app.jobs.sync_receipts)
+"""
+import heapq
+import os
+import threading
+import time
+import zlib
+
+from sqlalchemy import text
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: no worker can take the file lock there, so jobs do not run
+    fcntl = None
+
+from app.config import SCHEDULER_LOCK_PATH, STALE_RIDER_CHECK_SECONDS
+from app.database import engine
+
+LEADER_RETRY_SECONDS = 15
+ADVISORY_LOCK_KEY = zlib.crc32(b"riderapp-scheduler")
+
+
+class AdvisoryLock:
+    """pg_try_advisory_lock held on a dedicated connection."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.conn = None
+
+    def acquire(self) -> bool:
+        if self.conn is not None:
+            try:
+                self.conn.execute(text("SELECT 1"))
+                self.conn.commit()
+                return True
+            except Exception:
+                # Connection lost, and the session lock with it.
+                self.release()
+        conn = self.engine.connect()
+        try:
+            held = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not held:
+            conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    def release(self) -> None:
+        if self.conn is not None:
+            try:
+                self.conn.invalidate()  # drop the session, do not return it (or its lock) to the pool
+            finally:
+                self.conn = None
+
+
+class FileLock:
+    """Exclusive fcntl lock on a file, held for the life of the process."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+
+    def acquire(self) -> bool:
+        if self.fd is not None:
+            return True
+        if fcntl is None:
+            return False
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)  # closing drops the lock
+            self.fd = None
+
+
+class Job:
+    def __init__(self, name: str, interval: float, run, reset=None):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.reset = reset  # called on becoming leader, for jobs with in-memory state
+
+
+class Scheduler:
+    def __init__(self, lock):
+        self.lock = lock
+        self.jobs: list[Job] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add_job(self, name: str, interval: float, run, reset=None) -> None:
+        self.jobs.append(Job(name, interval, run, reset))
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+        self.lock.release()
+
+    def _is_leader(self) -> bool:
+        try:
+            return self.lock.acquire()
+        except Exception as exc:
+            print(f"[scheduler] leader lock check failed: {exc}")
+            return False
+
+    def _loop(self) -> None:
+        leading = False
+        due: list[tuple[float, int]] = []
+        while not self._stop.is_set():
+            if not self._is_leader():
+                if leading:
+                    print(f"[scheduler] worker {os.getpid()} lost leadership")
+                    leading = False
+                self._stop.wait(LEADER_RETRY_SECONDS)
+                continue
+            if not leading:
+                print(f"[scheduler] worker {os.getpid()} is the leader")
+                leading = True
+                for job in self.jobs:
+                    if job.reset:
+                        job.reset()
+                now = time.monotonic()
+                due = [(now, i) for i in range(len(self.jobs))]
+                heapq.heapify(due)
+
+            at, index = due[0]
+            # Re-check the lock at least every LEADER_RETRY_SECONDS while idle.
+            wait = at - time.monotonic()
+            if wait > 0:
+                self._stop.wait(min(wait, LEADER_RETRY_SECONDS))
+                continue
+            heapq.heappop(due)
+            job = self.jobs[index]
+            try:
+                job.run()
+            except Exception as exc:
+                print(f"[scheduler] job {job.name} failed: {exc}")
+            heapq.heappush(due, (time.monotonic() + job.interval, index))
+
+
+def build_scheduler() -> Scheduler:
+    from app.jobs.attendance_derivation import run_once as derive_attendance
+    from app.jobs.daily_rollups import run_once as roll_up_days
+    from app.jobs.rider_purge import purge_deleted_riders
+    from app.jobs.status_code_migration import run_once as backfill_status_codes
+    from app.jobs.sync_receipts import prune_receipts
+    from app.jobs.stale_riders import StaleRiderTracker
+
+    if engine.dialect.name == "postgresql":
+        lock = AdvisoryLock(engine)
+    else:
+        lock = FileLock(SCHEDULER_LOCK_PATH)
+    scheduler = Scheduler(lock)
+
+    stale = StaleRiderTracker()
+    scheduler.add_job("stale-riders", STALE_RIDER_CHECK_SECONDS, stale.run, reset=stale.reset)
+    scheduler.add_job("attendance-derivation", 60, derive_attendance)
+    scheduler.add_job("rider-purge", 600, purge_deleted_riders)
+    scheduler.add_job("status-code-backfill", 60, backfill_status_codes)
+    scheduler.add_job("daily-rollups", 300, roll_up_days)
+    scheduler.add_job("sync-receipts", 3600, prune_receipts)
+    return scheduler
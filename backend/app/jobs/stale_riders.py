@@ -0,0 +1,160 @@
+"""
+Auto-offline riders whose app stopped sending heartbeats.
+
+A heartbeat is any non-offline rider_status row or any rider_locations ping.
+The tracker keeps, per rider who is not offline, the time of the last
+heartbeat plus a min-heap of expiry times (last heartbeat + STALE_RIDER_MINUTES).
+Each run only reads rows past in-memory high-water marks on the two primary
+keys, plus rows among the RESCAN_IDS ids below each mark that committed after
+it and were not read yet (see app.jobs.attendance_derivation), pops the heap entries that are due and moves those riders to `offline`
+in bulk (mark_offline). Superseded heap entries are skipped lazily when popped.
+
+The state is built once, when the tracker starts or regains scheduler
+leadership, from rider_current_status and the pings of the last TTL.
+
+    python -m app.jobs.stale_riders     # bootstrap, expire once and exit
+"""
+import heapq
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import STALE_RIDER_MINUTES
+from app.database import SessionLocal
+from app.jobs.attendance_derivation import RESCAN_IDS
+from app.models import RiderCurrentStatus, RiderLocation, RiderStatus
+from app.utils.rider_status import OFFLINE, mark_offline
+
+BATCH_SIZE = 5000
+
+
+class StaleRiderTracker:
+    def __init__(self, ttl: timedelta = timedelta(minutes=STALE_RIDER_MINUTES)):
+        self.ttl = ttl
+        self.reset()
+
+    def reset(self) -> None:
+        self.last_seen: dict[int, datetime] = {}
+        self.heap: list[tuple[datetime, int]] = []
+        self.status_mark: int | None = None
+        self.location_mark: int | None = None
+        # ids read among the RESCAN_IDS below each mark
+        self.status_tail: set[int] = set()
+        self.location_tail: set[int] = set()
+
+    def _bootstrap(self, db: Session, now: datetime) -> None:
+        # Marks first, so rows landing during the reads are consumed (again) next time.
+        self.status_mark = db.query(func.coalesce(func.max(RiderStatus.id), 0)).scalar()
+        self.location_mark = db.query(func.coalesce(func.max(RiderLocation.id), 0)).scalar()
+        self.status_tail = {i for (i,) in db.query(RiderStatus.id).filter(RiderStatus.id > self.status_mark - RESCAN_IDS)}
+        self.location_tail = {
+            i for (i,) in db.query(RiderLocation.id).filter(RiderLocation.id > self.location_mark - RESCAN_IDS)
+        }
+        for rider_id, at in (
+            db.query(RiderCurrentStatus.rider_id, RiderCurrentStatus.updated_at)
+            .filter(RiderCurrentStatus.status != OFFLINE)
+        ):
+            self.last_seen[rider_id] = at
+        for rider_id, at in (
+            db.query(RiderLocation.rider_id, func.max(RiderLocation.updated_at))
+            .filter(RiderLocation.updated_at >= now - self.ttl)
+            .group_by(RiderLocation.rider_id)
+        ):
+            if rider_id in self.last_seen and at > self.last_seen[rider_id]:
+                self.last_seen[rider_id] = at
+        self.heap = [(at + self.ttl, rider_id) for rider_id, at in self.last_seen.items()]
+        heapq.heapify(self.heap)
+
+    @staticmethod
+    def _unread(db: Session, model, columns, mark: int, tail: set[int]):
+        """Rows past mark, and rows among the RESCAN_IDS ids below it not in tail, by id."""
+        after = mark - RESCAN_IDS
+        while True:
+            rows = db.query(model.id, *columns).filter(model.id > after).order_by(model.id).limit(BATCH_SIZE).all()
+            for row in rows:
+                if row.id > mark or row.id not in tail:
+                    yield row
+            if len(rows) < BATCH_SIZE:
+                return
+            after = rows[-1].id
+
+    @staticmethod
+    def _advance(mark: int, tail: set[int], read: list[int]) -> tuple[int, set[int]]:
+        mark = max(mark, *read) if read else mark
+        return mark, {i for i in (*tail, *read) if i > mark - RESCAN_IDS}
+
+    def _consume(self, db: Session) -> int:
+        """Apply new status rows, then new pings; returns rows read."""
+        touched: set[int] = set()
+        read: list[int] = []
+        for row in self._unread(
+            db, RiderStatus, (RiderStatus.rider_id, RiderStatus.status, RiderStatus.updated_at),
+            self.status_mark, self.status_tail,
+        ):
+            read.append(row.id)
+            if row.status == OFFLINE:
+                self.last_seen.pop(row.rider_id, None)
+                touched.discard(row.rider_id)
+            elif row.rider_id is not None and row.updated_at is not None:
+                self.last_seen[row.rider_id] = max(row.updated_at, self.last_seen.get(row.rider_id, row.updated_at))
+                touched.add(row.rider_id)
+        self.status_mark, self.status_tail = self._advance(self.status_mark, self.status_tail, read)
+        consumed = len(read)
+
+        read = []
+        for row in self._unread(
+            db, RiderLocation, (RiderLocation.rider_id, RiderLocation.updated_at),
+            self.location_mark, self.location_tail,
+        ):
+            read.append(row.id)
+            # Pings of offline riders do not bring them back online.
+            seen = self.last_seen.get(row.rider_id)
+            if seen is not None and row.updated_at is not None and row.updated_at > seen:
+                self.last_seen[row.rider_id] = row.updated_at
+                touched.add(row.rider_id)
+        self.location_mark, self.location_tail = self._advance(self.location_mark, self.location_tail, read)
+        consumed += len(read)
+
+        # One heap entry per rider per run; the older ones are skipped when they surface.
+        for rider_id in touched:
+            heapq.heappush(self.heap, (self.last_seen[rider_id] + self.ttl, rider_id))
+        if len(self.heap) > 2 * len(self.last_seen) + 1024:
+            self.heap = [(at + self.ttl, rider_id) for rider_id, at in self.last_seen.items()]
+            heapq.heapify(self.heap)
+        return consumed
+
+    def _due(self, now: datetime) -> list[int]:
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            expires, rider_id = heapq.heappop(self.heap)
+            seen = self.last_seen.get(rider_id)
+            if seen is not None and seen + self.ttl == expires:
+                del self.last_seen[rider_id]
+                due.append(rider_id)
+        return due
+
+    def run(self) -> dict:
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            if self.status_mark is None:
+                self._bootstrap(db, now)
+                consumed = 0
+            else:
+                consumed = self._consume(db)
+            due = self._due(now)
+            moved = mark_offline(db, due, stale_before=now - self.ttl, at=now) if due else []
+            db.commit()
+        except Exception:
+            # Start over from the database next time rather than trust half-applied state.
+            self.reset()
+            raise
+        finally:
+            db.close()
+        return {"consumed": consumed, "tracked": len(self.last_seen), "offlined": len(moved)}
+
+
+if __name__ == "__main__":
+    result = StaleRiderTracker().run()
+    print(f"[stale-riders] tracking {result['tracked']} riders, moved {result['offlined']} offline")
@@ -0,0 +1,234 @@
+"""
+Move rider statuses from the legacy VARCHAR `status` columns to SMALLINT `status_code`.
+
+Expand (expand(), at startup): create status_codes with the built-in codes,
+add status_code to rider_status and rider_current_status, let the legacy
+column take NULLs (new rows only carry the code) and convert the small
+rider_current_status table in one statement.
+
+Backfill (scheduled, or this module): converts rider_status in id ranges of
+BATCH_SIZE, newest first so recent history is right soonest, one short
+transaction each, so the table stays writable throughout. Statuses outside
+the built-in set get codes as the batches meet them. Until it is done,
+workers read rider_status through the legacy fallback of StatusCodeType
+(app.utils.status_codes), and the daily rollups and attendance derivation
+wait, so nothing derived from history is computed from unconverted rows.
+Once it reaches id 0 the rows older workers wrote since the expand are
+converted too and the legacy indexes are dropped.
+
+Contract (--drop-legacy, once every worker has restarted after the backfill
+finished, so none still reads the legacy column): converts any rows older
+workers wrote meanwhile, then drops the legacy columns.
+
+SQLite cannot relax NOT NULL in place, so a SQLite database is converted and
+its legacy columns dropped during startup instead (SQLite 3.35+).
+
+    python -m app.jobs.status_code_migration                 # backfill to the end
+    python -m app.jobs.status_code_migration --drop-legacy
+"""
+import argparse
+import sqlite3
+import time as time_mod
+
+from sqlalchemy import column, func, inspect, select, table, text, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine
+from app.jobs.attendance_derivation import get_checkpoint
+from app.models import JobCheckpoint
+from app.utils import status_codes
+from app.utils.status_codes import (
+    BACKFILL_CHECKPOINT,
+    BUILTIN_CODES,
+    LEGACY_COLUMN as LEGACY,
+    backfill_pending,
+    code_case,
+    ensure_status,
+    seed_builtin_codes,
+)
+
+EXPAND_CHECKPOINT = "status_codes:expand_mark"  # first id written after the expand
+BATCH_SIZE = 20000
+RUN_SECONDS = 20  # per scheduled run, so other jobs keep their slots
+
+HISTORY = table("rider_status", column("id"), column(LEGACY), column("status_code"))
+CURRENT = table("rider_current_status", column("rider_id"), column(LEGACY), column("status_code"))
+LEGACY_INDEXES = (
+    "ix_rider_status_status",
+    "ix_rider_current_status_status",
+    "ix_rider_current_status_status_updated",
+)
+
+
+def legacy_tables() -> list:
+    """The status tables that still have the VARCHAR column."""
+    insp = inspect(engine)
+    return [
+        t for t in (HISTORY, CURRENT)
+        if LEGACY in {c["name"] for c in insp.get_columns(t.name)}
+    ]
+
+
+def _convert(db: Session, t, *conditions) -> int:
+    """Give rows matching `conditions` the code of their legacy status; returns rows updated."""
+    conditions = (t.c.status_code.is_(None), *conditions)
+    for (name,) in db.execute(select(t.c[LEGACY]).where(*conditions).distinct()):
+        if name is not None and name not in BUILTIN_CODES:
+            ensure_status(db, name)
+    return db.execute(
+        update(t).where(*conditions).values(status_code=code_case(t.c[LEGACY]))
+    ).rowcount
+
+
+def _drop_indexes() -> None:
+    postgres = engine.dialect.name == "postgresql"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in LEGACY_INDEXES:
+            if postgres:
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+            elif engine.dialect.name == "sqlite":
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            else:
+                for t in (HISTORY, CURRENT):
+                    if name in {i["name"] for i in inspect(conn).get_indexes(t.name)}:
+                        conn.execute(text(f"DROP INDEX {name} ON {t.name}"))
+
+
+def _drop_columns(tables) -> None:
+    with engine.begin() as conn:
+        for t in tables:
+            conn.execute(text(f"ALTER TABLE {t.name} DROP COLUMN {LEGACY}"))
+
+
+def expand() -> None:
+    db = SessionLocal()
+    try:
+        seed_builtin_codes(db)
+        db.commit()
+    finally:
+        db.close()
+
+    tables = legacy_tables()
+    if not tables:
+        return
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for t in tables:
+            if "status_code" not in {c["name"] for c in insp.get_columns(t.name)}:
+                conn.execute(text(f"ALTER TABLE {t.name} ADD COLUMN status_code SMALLINT"))
+                print(f"[startup] Added status_code column to {t.name}.")
+
+    if engine.dialect.name == "sqlite":
+        if sqlite3.sqlite_version_info < (3, 35):
+            raise RuntimeError("Converting rider statuses to codes needs SQLite 3.35+ (DROP COLUMN)")
+        db = SessionLocal()
+        try:
+            converted = sum(_convert(db, t) for t in tables)
+            db.commit()
+        finally:
+            db.close()
+        _drop_indexes()
+        _drop_columns(tables)
+        print(f"[startup] Converted {converted} status rows to codes and dropped the legacy columns.")
+        return
+
+    with engine.begin() as conn:
+        for t in tables:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text(f"ALTER TABLE {t.name} ALTER COLUMN {LEGACY} DROP NOT NULL"))
+            else:
+                conn.execute(text(f"ALTER TABLE {t.name} MODIFY {LEGACY} VARCHAR(50) NULL"))
+
+    db = SessionLocal()
+    try:
+        if CURRENT in tables:
+            _convert(db, CURRENT)
+        if HISTORY in tables and db.get(JobCheckpoint, BACKFILL_CHECKPOINT) is None:
+            mark = db.execute(select(func.coalesce(func.max(HISTORY.c.id), 0))).scalar() + 1
+            get_checkpoint(db, BACKFILL_CHECKPOINT).position = mark
+            get_checkpoint(db, EXPAND_CHECKPOINT).position = mark
+            print(f"[startup] rider_status ids below {mark} will be converted to status codes in the background.")
+        db.commit()
+        if HISTORY in tables and backfill_pending(db):
+            status_codes.legacy_fallback.add(HISTORY.name)
+    finally:
+        db.close()
+
+
+def backfill_batch(db: Session, batch_size: int = BATCH_SIZE) -> bool:
+    """Convert the next id range; returns True while older rows remain."""
+    checkpoint = db.get(JobCheckpoint, BACKFILL_CHECKPOINT)
+    if checkpoint is None or checkpoint.position <= 0:
+        return False
+    hi = checkpoint.position
+    lo = max(hi - batch_size, 0)
+    _convert(db, HISTORY, HISTORY.c.id >= lo, HISTORY.c.id < hi)
+    if lo == 0:
+        # rows older workers wrote since the expand; workers started from now on read codes only
+        mark = db.get(JobCheckpoint, EXPAND_CHECKPOINT)
+        _convert(db, HISTORY, HISTORY.c.id >= (mark.position if mark else 0))
+    checkpoint.position = lo
+    db.commit()
+    if lo == 0:
+        _drop_indexes()
+        print("[status-codes] rider_status converted; legacy indexes dropped")
+    return lo > 0
+
+
+def run_once(max_seconds: float = RUN_SECONDS, batch_size: int = BATCH_SIZE) -> dict:
+    started = time_mod.monotonic()
+    db = SessionLocal()
+    try:
+        batches, more = 0, True
+        while more and not (max_seconds and time_mod.monotonic() - started > max_seconds):
+            checkpoint = db.get(JobCheckpoint, BACKFILL_CHECKPOINT)
+            if checkpoint is None or checkpoint.position <= 0:
+                break
+            more = backfill_batch(db, batch_size)
+            batches += 1
+        remaining = db.get(JobCheckpoint, BACKFILL_CHECKPOINT)
+    finally:
+        db.close()
+    return {"batches": batches, "remaining_below": remaining.position if remaining else 0}
+
+
+def drop_legacy() -> int:
+    """Convert rows written by older workers since the expand, then drop the legacy columns."""
+    tables = legacy_tables()
+    if not tables:
+        return 0
+    db = SessionLocal()
+    try:
+        checkpoint = db.get(JobCheckpoint, BACKFILL_CHECKPOINT)
+        if checkpoint is not None and checkpoint.position > 0:
+            raise SystemExit(f"Backfill still running (ids below {checkpoint.position} left); run it to the end first")
+        mark = db.get(JobCheckpoint, EXPAND_CHECKPOINT)
+        converted = 0
+        if HISTORY in tables:
+            converted += _convert(db, HISTORY, HISTORY.c.id >= (mark.position if mark else 0))
+        if CURRENT in tables:
+            converted += _convert(db, CURRENT)
+        db.commit()
+    finally:
+        db.close()
+    _drop_indexes()
+    _drop_columns(tables)
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--drop-legacy", action="store_true", help="Contract step: drop the VARCHAR columns")
+    args = parser.parse_args()
+
+    if args.drop_legacy:
+        print(f"[status-codes] converted {drop_legacy()} late rows, dropped the legacy columns")
+        return
+    expand()
+    result = run_once(max_seconds=0, batch_size=args.batch_size)
+    print(f"[status-codes] converted {result['batches']} batches, ids below {result['remaining_below']} left")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Forget offline-sync idempotency keys older than SYNC_KEY_RETENTION_HOURS.
+
+POST /rider/sync rejects events older than the same window, so a pruned key
+can no longer be replayed into a duplicate. Rows go in batches of
+PRUNE_BATCH_SIZE, one short transaction each.
+
+    python -m app.jobs.sync_receipts
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, tuple_
+
+from app.config import SYNC_KEY_RETENTION_HOURS
+from app.database import SessionLocal
+from app.models import SyncReceipt
+
+PRUNE_BATCH_SIZE = 5000
+
+
+def prune_receipts(batch_size: int = PRUNE_BATCH_SIZE) -> int:
+    """Returns the number of receipts removed."""
+    cutoff = datetime.utcnow() - timedelta(hours=SYNC_KEY_RETENTION_HOURS)
+    removed = 0
+    db = SessionLocal()
+    try:
+        while True:
+            keys = db.execute(
+                select(SyncReceipt.rider_id, SyncReceipt.key_hash)
+                .where(SyncReceipt.received_at < cutoff)
+                .limit(batch_size)
+            ).all()
+            if not keys:
+                break
+            db.execute(
+                delete(SyncReceipt).where(
+                    tuple_(SyncReceipt.rider_id, SyncReceipt.key_hash).in_([tuple(k) for k in keys])
+                )
+            )
+            db.commit()
+            removed += len(keys)
+    finally:
+        db.close()
+    return removed
+
+
+if __name__ == "__main__":
+    print(f"[sync-receipts] removed {prune_receipts()} receipts")
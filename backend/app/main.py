@@ -1,6 +1,6 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import inspect, text
+from sqlalchemy import func, inspect, insert, select, text
 from sqlalchemy.orm import Session
 
 from app.auth.router import router as auth_router
@@ -9,22 +9,39 @@ from app.config import (
     ADMIN_PASSWORD,
     ADMIN_USERNAME,
     AUTO_SEED_ADMIN,
+    PROFILING,
+    SCHEDULER_ENABLED,
+    COMPRESSION_MIN_SIZE,
+    QUERY_DIAGNOSTICS,
+    SLOW_QUERY_MS,
     PRIME_ADMIN_NAME,
     PRIME_ADMIN_PASSWORD,
     PRIME_ADMIN_USERNAME,
 )
-from app.database import Base, SessionLocal, engine
-from app.models import User
-from app.routers import admin, attendance, riders, shifts, tracking
+from app.database import Base, SessionLocal, engine, write_engine
+from app.jobs.scheduler import build_scheduler
+from app.jobs.status_code_migration import expand as expand_status_codes
+from app.models import RiderCurrentStatus, RiderStatus, User
+from app.routers import admin, attendance, dispatch, reports, riders, shifts, tracking
+from app.utils.compression import CompressionMiddleware
+from app.utils import query_diagnostics
+from app.utils.metrics import MetricsMiddleware, instrument_engine, render_metrics
+from app.utils.profiler import ProfilerMiddleware
+from app.utils.responses import ORJSONResponse
+from app.utils.slow_queries import SlowQueryMiddleware
 
 app = FastAPI(
     title="Rider Management API", 
     version="1.0.0",
     description="Comprehensive rider management system for delivery companies with real-time tracking, attendance management, and hierarchical admin controls.",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
 )
 
+# Compress large JSON payloads (rider lists, overviews) for slow mobile links
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
 # CORS configuration for production
 app.add_middleware(
     CORSMiddleware,
@@ -32,8 +49,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+if QUERY_DIAGNOSTICS != "off":
+    app.add_middleware(query_diagnostics.QueryDiagnosticsMiddleware)
+    query_diagnostics.instrument_engine(engine)
+
+# Route labels for the slow-query log (the engine hook is installed in app.database)
+if SLOW_QUERY_MS > 0:
+    app.add_middleware(SlowQueryMiddleware)
+
+if PROFILING:
+    app.add_middleware(ProfilerMiddleware)
+
+# Outermost, so latency covers every other middleware
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+if write_engine is not engine:
+    instrument_engine(write_engine)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -41,6 +76,13 @@ async def health_check():
     return {"status": "healthy", "service": "rider-management-api"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (restrict to the internal network at the proxy)"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/create-admin")
 async def create_admin():
     """Create admin users manually"""
@@ -93,6 +135,12 @@ def on_startup():
     try:
         Base.metadata.create_all(bind=engine)
         ensure_manager_column()
+        ensure_column("attendance", "source", "VARCHAR(20) NOT NULL DEFAULT 'manual'")
+        ensure_column("attendance", "updated_at", "TIMESTAMP")
+        ensure_column("shift_templates", "materialized_from", "DATE")
+        expand_status_codes()  # before ensure_indexes: the status indexes are on status_code
+        ensure_indexes()
+        backfill_current_status()
         if AUTO_SEED_ADMIN:
             seed_prime_admin()
             seed_default_admin()
@@ -100,20 +148,76 @@ def on_startup():
     except Exception as e:
         print(f"[startup] Database initialization failed: {e}")
 
+    if SCHEDULER_ENABLED:
+        app.state.scheduler = build_scheduler()
+        app.state.scheduler.start()
 
-def ensure_manager_column():
-    """Ensure manager_id exists on users table for hierarchy support."""
+
+@app.on_event("shutdown")
+def on_shutdown():
+    scheduler = getattr(app.state, "scheduler", None)
+    if scheduler is not None:
+        scheduler.stop()
+
+
+def ensure_column(table: str, column: str, ddl: str):
+    """Add a column that postdates the table (create_all does not alter existing tables)."""
     insp = inspect(engine)
-    cols = [c["name"] for c in insp.get_columns("users")]
-    if "manager_id" in cols:
+    cols = [c["name"] for c in insp.get_columns(table)]
+    if column in cols:
         return
     with engine.connect() as conn:
         try:
-            conn.execute(text("ALTER TABLE users ADD COLUMN manager_id INTEGER"))
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
             conn.commit()
-            print("[startup] Added manager_id column to users.")
+            print(f"[startup] Added {column} column to {table}.")
         except Exception as exc:  # pragma: no cover - best effort
-            print(f"[startup] Skipped manager_id migration: {exc}")
+            print(f"[startup] Skipped {column} migration: {exc}")
+
+
+def ensure_manager_column():
+    """Ensure manager_id exists on users table for hierarchy support."""
+    ensure_column("users", "manager_id", "INTEGER")
+
+
+def ensure_indexes():
+    """Create indexes declared on models that predate them (create_all skips existing tables)."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as exc:  # pragma: no cover - best effort
+                print(f"[startup] Skipped index {index.name}: {exc}")
+
+
+def backfill_current_status():
+    """Populate rider_current_status from history the first time it exists."""
+    db: Session = SessionLocal()
+    try:
+        if db.query(RiderCurrentStatus.rider_id).first() is not None:
+            return
+        latest = (
+            select(func.max(RiderStatus.id).label("id"))
+            .where(RiderStatus.rider_id.is_not(None))
+            .group_by(RiderStatus.rider_id)
+            .subquery()
+        )
+        db.execute(
+            insert(RiderCurrentStatus).from_select(
+                ["rider_id", "status", "updated_at"],
+                select(
+                    RiderStatus.rider_id,
+                    RiderStatus.status,
+                    func.coalesce(RiderStatus.updated_at, func.current_timestamp()),
+                ).join(latest, latest.c.id == RiderStatus.id),
+            )
+        )
+        db.commit()
+    except Exception as exc:  # pragma: no cover - best effort
+        db.rollback()
+        print(f"[startup] Skipped current status backfill: {exc}")
+    finally:
+        db.close()
 
 
 def seed_prime_admin():
@@ -195,6 +299,8 @@ try:
     app.include_router(attendance.router) 
     app.include_router(shifts.router)
     app.include_router(tracking.router)
+    app.include_router(dispatch.router)
+    app.include_router(reports.router)
     print("[startup] Additional routers loaded successfully")
 except Exception as e:
     print(f"[startup] Additional router error: {e}")
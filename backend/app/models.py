@@ -1,18 +1,23 @@
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
     Date,
     DateTime,
+    Time,
     ForeignKey,
     Float,
     Boolean,
+    Index,
+    SmallInteger,
     UniqueConstraint
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime, date
 
 from app.database import Base
+from app.utils.status_codes import StatusCodeType
 
 
 # =========================
@@ -20,12 +25,17 @@ from app.database import Base
 # =========================
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_role_store", "role", "store"),
+        Index("ix_users_manager_id", "manager_id"),
+        Index("ix_users_name", "name"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String(100), unique=True, index=True, nullable=False)
     password = Column(String(255), nullable=False)
     name = Column(String(100), nullable=False)
-    role = Column(String(20), nullable=False)  # prime_admin | sub_admin | admin | rider
+    role = Column(String(20), nullable=False)  # prime_admin | sub_admin | admin | rider | deleted_rider (purge pending)
     store = Column(String(100), nullable=True)  # store/group name (nullable for admins)
     manager_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
@@ -47,12 +57,23 @@ class User(Base):
 # =========================
 # RIDER STATUS (LIVE)
 # =========================
+class StatusCode(Base):
+    """Lookup of the SMALLINT status codes stored in rider_status and rider_current_status."""
+    __tablename__ = "status_codes"
+
+    code = Column(SmallInteger, primary_key=True, autoincrement=False)
+    name = Column(String(50), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f"<StatusCode {self.code}={self.name}>"
+
+
 class RiderStatus(Base):
     __tablename__ = "rider_status"
 
     id = Column(Integer, primary_key=True, index=True)
     rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
-    status = Column(String(50), nullable=False, index=True)
+    status = Column("status_code", StatusCodeType, key="status", nullable=False)  # app.utils.status_codes
     updated_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     rider = relationship("User", back_populates="statuses")
@@ -62,6 +83,45 @@ class RiderStatus(Base):
 
 
 
+class RiderCurrentStatus(Base):
+    """Latest rider_status row per rider, kept in step on every status write."""
+    __tablename__ = "rider_current_status"
+    __table_args__ = (
+        # Dispatch and queue order: longest-waiting rider with a given status first
+        Index("ix_rider_current_status_code_updated", "status", "updated_at"),
+    )
+
+    rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    status = Column("status_code", StatusCodeType, key="status", nullable=False)
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<RiderCurrentStatus rider_id={self.rider_id} status={self.status}>"
+
+
+
+# =========================
+# DISPATCH
+# =========================
+class Dispatch(Base):
+    """One assignment of an available rider to a delivery by POST /dispatch/next."""
+    __tablename__ = "dispatches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    store = Column(String(100), nullable=True)
+    dispatched_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    order_ref = Column(String(100), nullable=True)
+    waited_seconds = Column(Float, nullable=True)  # time the rider had been available
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    rider = relationship("User", foreign_keys=[rider_id])
+
+    def __repr__(self):
+        return f"<Dispatch rider_id={self.rider_id} store={self.store} order_ref={self.order_ref}>"
+
+
+
 # =========================
 # ATTENDANCE
 # =========================
@@ -75,8 +135,10 @@ class Attendance(Base):
     rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     date = Column(Date, default=date.today, index=True)
     status = Column(String(20), nullable=False, index=True)  # present | absent | off_day
+    source = Column(String(20), default="manual", nullable=False)  # manual | auto (derived from activity)
 
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # when the current status was marked
 
     rider = relationship("User", back_populates="attendance")
 
@@ -90,6 +152,10 @@ class Attendance(Base):
 # =========================
 class Shift(Base):
     __tablename__ = "shifts"
+    __table_args__ = (
+        Index("ix_shifts_rider_start", "rider_id", "start_time"),
+        Index("ix_shifts_start_id", "start_time", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
@@ -105,6 +171,57 @@ class Shift(Base):
 
 
 
+# =========================
+# RECURRING SHIFT TEMPLATES
+# =========================
+class ShiftTemplate(Base):
+    """
+    Weekly rule expanded on read instead of stored as one Shift row per week.
+    Times are UTC; an end_time at or before start_time ends on the next day.
+    Dates from materialized_from (the beginning, when null) through
+    materialized_until already exist as real Shift rows.
+    """
+    __tablename__ = "shift_templates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    weekday = Column(Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    effective_from = Column(Date, nullable=False)
+    effective_to = Column(Date, nullable=True)  # inclusive; open-ended when null
+    materialized_from = Column(Date, nullable=True)
+    materialized_until = Column(Date, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    exceptions = relationship(
+        "ShiftTemplateException",
+        back_populates="template",
+        cascade="all, delete-orphan",
+    )
+
+    def __repr__(self):
+        return f"<ShiftTemplate rider_id={self.rider_id} weekday={self.weekday} {self.start_time}-{self.end_time}>"
+
+
+class ShiftTemplateException(Base):
+    __tablename__ = "shift_template_exceptions"
+    __table_args__ = (
+        UniqueConstraint("template_id", "date", name="unique_template_exception"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    template_id = Column(Integer, ForeignKey("shift_templates.id", ondelete="CASCADE"), index=True)
+    date = Column(Date, nullable=False)  # occurrence skipped on this day
+
+    template = relationship("ShiftTemplate", back_populates="exceptions")
+
+    def __repr__(self):
+        return f"<ShiftTemplateException template_id={self.template_id} date={self.date}>"
+
+
+
 # =========================
 # LIVE GPS TRACKING
 # =========================
@@ -116,7 +233,7 @@ class RiderLocation(Base):
     lat = Column(Float, nullable=False)
     lng = Column(Float, nullable=False)
 
-    updated_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     rider = relationship("User", back_populates="locations")
 
@@ -124,6 +241,99 @@ class RiderLocation(Base):
         return f"<RiderLocation rider_id={self.rider_id} lat={self.lat} lng={self.lng}>"
 
 
+# =========================
+# OFFLINE SYNC RECEIPTS
+# =========================
+class SyncReceipt(Base):
+    """Idempotency key of an event already applied by POST /rider/sync, kept for SYNC_KEY_RETENTION_HOURS."""
+    __tablename__ = "sync_receipts"
+    __table_args__ = (
+        Index("ix_sync_receipts_received_at", "received_at"),
+    )
+
+    rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    key_hash = Column(BigInteger, primary_key=True, autoincrement=False)  # 64-bit hash of the client's key
+    received_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SyncReceipt rider_id={self.rider_id} key_hash={self.key_hash}>"
+
+
+# =========================
+# DAILY ROLLUPS (REPORTING)
+# =========================
+class RiderDailyRollup(Base):
+    """One rider's UTC day: time per status, deliveries, distance and attendance (app.jobs.daily_rollups)."""
+    __tablename__ = "rider_daily_rollups"
+    __table_args__ = (
+        Index("ix_rider_daily_rollups_day_store", "day", "store"),
+    )
+
+    rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    store = Column(String(100), nullable=True)  # rider's store when the day was rolled up
+    seconds_online = Column(Integer, nullable=False, default=0)  # any status but offline
+    seconds_available = Column(Integer, nullable=False, default=0)
+    seconds_delivery = Column(Integer, nullable=False, default=0)
+    seconds_break = Column(Integer, nullable=False, default=0)
+    deliveries = Column(Integer, nullable=False, default=0)  # transitions into delivery
+    pings = Column(Integer, nullable=False, default=0)
+    distance_km = Column(Float, nullable=False, default=0.0)
+    attendance = Column(String(20), nullable=True)  # present | absent | off_day | null
+    end_status = Column(String(50), nullable=True)  # status carried into the next day
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RiderDailyRollup rider_id={self.rider_id} day={self.day}>"
+
+
+class StoreDailyRollup(Base):
+    """Per store and UTC day, the sum of its riders' rollups."""
+    __tablename__ = "store_daily_rollups"
+
+    store = Column(String(100), primary_key=True)  # "Unassigned" for riders without a store
+    day = Column(Date, primary_key=True)
+    riders_active = Column(Integer, nullable=False, default=0)
+    riders_present = Column(Integer, nullable=False, default=0)
+    riders_absent = Column(Integer, nullable=False, default=0)
+    seconds_online = Column(Integer, nullable=False, default=0)
+    seconds_available = Column(Integer, nullable=False, default=0)
+    seconds_delivery = Column(Integer, nullable=False, default=0)
+    seconds_break = Column(Integer, nullable=False, default=0)
+    deliveries = Column(Integer, nullable=False, default=0)
+    distance_km = Column(Float, nullable=False, default=0.0)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StoreDailyRollup store={self.store} day={self.day}>"
+
+
+# =========================
+# BACKGROUND JOB CHECKPOINTS
+# =========================
+class JobCheckpoint(Base):
+    """High-water mark of an incremental job (e.g. last consumed rider_status id)."""
+    __tablename__ = "job_checkpoints"
+
+    name = Column(String(100), primary_key=True)
+    position = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<JobCheckpoint {self.name}={self.position}>"
+
+
+class ChangeVersion(Base):
+    """Counter per visibility scope (all, manager:<id>, store:<name>) bumped on every write."""
+    __tablename__ = "change_versions"
+
+    scope = Column(String(150), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ChangeVersion {self.scope}={self.version}>"
+
+
 class ImpersonationLog(Base):
     __tablename__ = "impersonation_logs"
 
@@ -1,19 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import and_, func, insert, literal, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
 from datetime import datetime
-from app.database import SessionLocal
-from app.models import User, RiderStatus, Attendance, Shift, RiderLocation, ImpersonationLog
+from app.config import SLOW_QUERY_MS
+from app.database import get_db
+from app.models import User, RiderCurrentStatus, Attendance, ImpersonationLog
 from passlib.hash import bcrypt
 from app.auth.deps import admin_only, prime_admin_only
+from app.schemas import (
+    DashboardStats,
+    ImpersonationLogList,
+    PrimeOverview,
+    ProfileList,
+    RiderListResponse,
+    RiderStatusList,
+    SlowQueryList,
+    SubAdminList,
+)
+from app.jobs.rider_purge import delete_rider_rows, has_large_history, purge_deleted_riders, soft_delete_riders
+from app.utils.change_version import (
+    ALL_SCOPE,
+    bump,
+    bump_for_rider,
+    not_modified,
+    rider_scopes,
+    scope_version,
+    scopes_for_riders,
+)
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.profiler import list_profiles, profile_path
+from app.utils.query_diagnostics import query_budget
+from app.utils.rider_import import hash_passwords, iter_rows
+from app.utils.result_cache import result_cache
+from app.utils.slow_queries import read_entries
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+IMPORT_BATCH_SIZE = 1000
+
 
 @router.post("/add-rider")
 def add_rider(
@@ -60,17 +86,136 @@ def add_rider(
         is_active=True
     )
     db.add(rider)
+    bump(db, rider_scopes(manager_id, rider.store))
     db.commit()
     return {"message": "Rider added"}
 
 
+def existing_usernames(db: Session, usernames: list[str]) -> set[str]:
+    """Which of these usernames are taken, in a few IN queries rather than one per name."""
+    taken: set[str] = set()
+    for i in range(0, len(usernames), 5000):
+        chunk = usernames[i:i + 5000]
+        taken.update(r.username for r in db.query(User.username).filter(User.username.in_(chunk)).all())
+    return taken
+
+
+@router.post("/import-riders")
+def import_riders(
+    file: UploadFile = File(...),
+    dry_run: bool = Query(default=False, description="Validate only, insert nothing"),
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Bulk-create riders from a CSV/XLSX upload with columns username, name, password,
+    store and (prime admin only) sub_admin_id. Every row is validated first; valid rows
+    are inserted in batches and invalid ones come back in a per-row error report.
+    """
+    total = 0
+    errors = []
+    rows = []
+    seen: set[str] = set()
+    for line_no, row in iter_rows(file):
+        total += 1
+        username = row.get("username")
+        missing = [col for col in ("username", "name", "password", "store") if not row.get(col)]
+        if missing:
+            errors.append({"row": line_no, "username": username, "error": f"Missing {', '.join(missing)}"})
+            continue
+        if username in seen:
+            errors.append({"row": line_no, "username": username, "error": "Duplicate username in file"})
+            continue
+        manager_id = admin.id
+        if row.get("sub_admin_id"):
+            try:
+                manager_id = int(float(row["sub_admin_id"]))
+            except (ValueError, OverflowError):  # also nan and inf
+                errors.append({"row": line_no, "username": username, "error": "Invalid sub_admin_id"})
+                continue
+            if admin.role != "prime_admin" and manager_id != admin.id:
+                errors.append({"row": line_no, "username": username, "error": "Cannot assign riders to other admins"})
+                continue
+        seen.add(username)
+        rows.append((line_no, {
+            "username": username,
+            "name": row["name"],
+            "store": row["store"],
+            "role": "rider",
+            "manager_id": manager_id,
+            "password": row["password"],
+            "is_active": True,
+        }))
+
+    # Set-based checks: one lookup for all usernames, one for all referenced sub admins.
+    taken = existing_usernames(db, [r["username"] for _, r in rows])
+    managers = {r["manager_id"] for _, r in rows} - {admin.id}
+    valid_managers = {admin.id} | {
+        u.id for u in db.query(User.id).filter(User.id.in_(managers), User.role == "sub_admin").all()
+    } if managers else {admin.id}
+
+    valid = []
+    for line_no, r in rows:
+        if r["username"] in taken:
+            errors.append({"row": line_no, "username": r["username"], "error": "Username already exists"})
+        elif r["manager_id"] not in valid_managers:
+            errors.append({"row": line_no, "username": r["username"], "error": "Sub admin not found"})
+        else:
+            valid.append((line_no, r))
+
+    inserted = 0
+    if valid and not dry_run:
+        hashes = hash_passwords([r["password"] for _, r in valid])
+        for (_, r), hashed in zip(valid, hashes):
+            r["password"] = hashed
+        for i in range(0, len(valid), IMPORT_BATCH_SIZE):
+            batch = valid[i:i + IMPORT_BATCH_SIZE]
+            try:
+                db.execute(insert(User), [r for _, r in batch])
+                bump(db, set().union(*(rider_scopes(r["manager_id"], r["store"]) for _, r in batch)))
+                db.commit()
+            except IntegrityError:
+                # A concurrent request took some of these usernames; report them, retry the rest once.
+                db.rollback()
+                raced = existing_usernames(db, [r["username"] for _, r in batch])
+                for line_no, r in batch:
+                    if r["username"] in raced:
+                        errors.append({"row": line_no, "username": r["username"], "error": "Username already exists"})
+                batch = [(n, r) for n, r in batch if r["username"] not in raced]
+                if batch:
+                    try:
+                        with db.begin_nested():
+                            db.execute(insert(User), [r for _, r in batch])
+                    except IntegrityError:
+                        # Raced again (or a sub admin went away): report the rows rather than fail the import.
+                        for line_no, r in batch:
+                            errors.append({"row": line_no, "username": r["username"], "error": "Conflicting concurrent change"})
+                        batch = []
+                    else:
+                        bump(db, set().union(*(rider_scopes(r["manager_id"], r["store"]) for _, r in batch)))
+                        db.commit()
+            inserted += len(batch)
+
+    errors.sort(key=lambda e: e["row"])
+    return {
+        "total": total,
+        "inserted": inserted,
+        "dry_run": dry_run,
+        "errors": errors,
+    }
+
+
 @router.delete("/delete-rider")
 def delete_rider(
     data: dict,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     admin=Depends(admin_only)
 ):
-    """Delete a rider by username or id."""
+    """
+    Delete a rider by username or id. Riders with a large history are soft-deleted
+    and purged in the background so the request returns immediately.
+    """
     rider = None
     if "id" in data:
         rider = db.query(User).filter(User.id == data["id"], User.role == "rider").first()
@@ -83,84 +228,124 @@ def delete_rider(
     if admin.role == "sub_admin" and rider.manager_id != admin.id:
         raise HTTPException(status_code=403, detail="Cannot delete riders from other admins")
 
-    # Remove related data explicitly to ensure cleanup on databases without ON DELETE CASCADE enforcement
-    db.query(RiderStatus).filter(RiderStatus.rider_id == rider.id).delete(synchronize_session=False)
-    db.query(Attendance).filter(Attendance.rider_id == rider.id).delete(synchronize_session=False)
-    db.query(Shift).filter(Shift.rider_id == rider.id).delete(synchronize_session=False)
-    db.query(RiderLocation).filter(RiderLocation.rider_id == rider.id).delete(synchronize_session=False)
+    rider_ids = [rider.id]
+    bump_for_rider(db, rider)
+    if has_large_history(db, rider_ids):
+        soft_delete_riders(db, rider_ids)
+        db.commit()
+        background_tasks.add_task(purge_deleted_riders)
+        return {"message": "Rider deleted", "history_purge": "scheduled"}
 
+    # Remove related data explicitly to ensure cleanup on databases without ON DELETE CASCADE enforcement
+    delete_rider_rows(db, rider_ids)
     db.delete(rider)
     db.commit()
     return {"message": "Rider deleted"}
 
 
-@router.get("/rider-status")
+@router.get("/rider-status", response_model=RiderStatusList, dependencies=[Depends(query_budget(4))])
 def rider_status(
+    request: Request,
+    response: Response,
     store: str | None = Query(default=None, description="Optional store filter (prime admin only)"),
     db: Session = Depends(get_db),
     admin=Depends(admin_only)
 ):
     """Return latest status per rider for the admin view."""
-    rider_ids = get_visible_rider_ids(admin, db, store_filter=store)
+    cached = not_modified(request, response, db, admin, store)
+    if cached:
+        return cached
+
     rows = (
-        db.query(RiderStatus)
-        .filter(RiderStatus.rider_id.in_(rider_ids) if rider_ids else False)
-        .order_by(RiderStatus.rider_id, RiderStatus.updated_at.desc())
+        db.query(User.id, User.name, User.store, RiderCurrentStatus.status, RiderCurrentStatus.updated_at)
+        .join(RiderCurrentStatus, RiderCurrentStatus.rider_id == User.id)
+        .filter(User.id.in_(visible_rider_query(admin, db, store_filter=store)))
+        .order_by(User.id)
         .all()
     )
+    data = [
+        {
+            "rider_id": r.id,
+            "name": r.name,
+            "store": r.store,
+            "status": r.status,
+            "updated_at": r.updated_at,
+        }
+        for r in rows
+    ]
+    return {"items": data}
 
-    latest: dict[int, RiderStatus] = {}
-    for r in rows:
-        if r.rider_id not in latest:
-            latest[r.rider_id] = r
-
-    data = []
-    for rider_id, status in latest.items():
-        user = db.query(User).filter(User.id == rider_id).first()
-        data.append(
-            {
-                "rider_id": rider_id,
-                "name": user.name if user else f"Rider {rider_id}",
-                "store": getattr(user, "store", None),
-                "status": status.status,
-                "updated_at": status.updated_at.isoformat() if isinstance(status.updated_at, datetime) else None,
-            }
-        )
 
-    return {"items": data}
+RIDER_SORT_TYPES = {"id": int, "name": str, "username": str, "store": str, "status": str, "updated_at": datetime}
 
 
-@router.get("/riders")
+@router.get("/riders", response_model=RiderListResponse, dependencies=[Depends(query_budget(4))])
 def list_riders(
+    request: Request,
+    response: Response,
     store: str | None = Query(default=None, description="Optional store filter (prime admin only)"),
+    q: str | None = Query(default=None, description="Search in name or username"),
+    manager_id: int | None = Query(default=None),
+    status: str | None = Query(default=None, description="Current status; riders without one count as offline"),
+    sort: str = Query(default="id", pattern="^(id|name|username|store|status|updated_at)$"),
+    order: str = Query(default="asc", pattern="^(asc|desc)$"),
+    cursor: str | None = Query(default=None, description="next_cursor from the previous page"),
+    limit: int = Query(default=500, ge=1, le=1000),
     db: Session = Depends(get_db),
     admin=Depends(admin_only)
 ):
     """
-    Return all rider accounts with their latest status (if any).
-    Falls back to 'offline' when no status exists yet.
+    Rider accounts with their current status, filtered and sorted server-side and
+    paged by keyset on (sort key, id). Falls back to 'offline' when no status exists yet.
     """
-    rider_ids = get_visible_rider_ids(admin, db, store_filter=store)
-    riders = (
-        db.query(User)
-        .filter(User.role == "rider", User.id.in_(rider_ids) if rider_ids else False)
-        .all()
-    )
+    cached = not_modified(request, response, db, admin, store)
+    if cached:
+        return cached
+
+    status_type = RiderCurrentStatus.status.type  # code in SQL, name in Python
+    status_col = func.coalesce(RiderCurrentStatus.status, literal("offline", status_type), type_=status_type)
+    sort_cols = {
+        "id": User.id,
+        "name": User.name,
+        "username": User.username,
+        "store": func.coalesce(User.store, ""),
+        "status": status_col,
+        "updated_at": func.coalesce(RiderCurrentStatus.updated_at, datetime(1970, 1, 1)),
+    }
+    sort_col = sort_cols[sort]
 
-    rows = (
-        db.query(RiderStatus)
-        .filter(RiderStatus.rider_id.in_(rider_ids) if rider_ids else False)
-        .order_by(RiderStatus.rider_id, RiderStatus.updated_at.desc())
-        .all()
+    query = (
+        db.query(User, RiderCurrentStatus.status, RiderCurrentStatus.updated_at, sort_col.label("sort_key"))
+        .outerjoin(RiderCurrentStatus, RiderCurrentStatus.rider_id == User.id)
+        .filter(User.id.in_(visible_rider_query(admin, db, store_filter=store)))
     )
-    latest: dict[int, RiderStatus] = {}
-    for r in rows:
-        if r.rider_id not in latest:
-            latest[r.rider_id] = r
+    if q:
+        pattern = f"%{q.strip().lower()}%"
+        query = query.filter(or_(func.lower(User.name).like(pattern), func.lower(User.username).like(pattern)))
+    if manager_id is not None:
+        query = query.filter(User.manager_id == manager_id)
+    if status:
+        query = query.filter(status_col == status)
+    if cursor:
+        after_key, after_id = decode_cursor(cursor, RIDER_SORT_TYPES[sort], int)
+        if order == "asc":
+            query = query.filter(or_(sort_col > after_key, and_(sort_col == after_key, User.id > after_id)))
+        else:
+            query = query.filter(or_(sort_col < after_key, and_(sort_col == after_key, User.id < after_id)))
+
+    if order == "asc":
+        query = query.order_by(sort_col.asc(), User.id.asc())
+    else:
+        query = query.order_by(sort_col.desc(), User.id.desc())
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].sort_key, rows[-1].User.id)
 
     items = []
-    for rider in riders:
-        status_row = latest.get(rider.id)
+    for rider, current, updated_at, _ in rows:
         items.append(
             {
                 "id": rider.id,
@@ -168,16 +353,18 @@ def list_riders(
                 "name": rider.name,
                 "manager_id": rider.manager_id,
                 "store": getattr(rider, "store", None),
-                "status": status_row.status if status_row else "offline",
-                "updated_at": status_row.updated_at.isoformat() if status_row else None,
+                "status": current or "offline",
+                "updated_at": updated_at,
             }
         )
 
-    return {"items": items}
+    return {"items": items, "next_cursor": next_cursor}
 
 
-@router.get("/dashboard-stats")
+@router.get("/dashboard-stats", response_model=DashboardStats, dependencies=[Depends(query_budget(7))])
 def dashboard_stats(
+    request: Request,
+    response: Response,
     store: str | None = Query(default=None, description="Optional store filter (prime admin only)"),
     db: Session = Depends(get_db),
     admin=Depends(admin_only)
@@ -185,34 +372,37 @@ def dashboard_stats(
     """
     Summary counts for the admin dashboard, based on latest rider status and today's attendance.
     """
-    rider_ids = get_visible_rider_ids(admin, db, store_filter=store)
-    total_riders = (
-        db.query(User)
-        .filter(User.role == "rider", User.id.in_(rider_ids) if rider_ids else False)
-        .count()
+    cached = not_modified(request, response, db, admin, store)
+    if cached:
+        return cached
+
+    scope, version = scope_version(db, admin, store)
+    return result_cache.get_or_compute(
+        ("dashboard_stats", scope, version, store),
+        lambda: compute_dashboard_stats(db, admin, store),
     )
 
-    rows = (
-        db.query(RiderStatus)
-        .filter(RiderStatus.rider_id.in_(rider_ids) if rider_ids else False)
-        .order_by(RiderStatus.rider_id, RiderStatus.updated_at.desc())
+
+def compute_dashboard_stats(db: Session, admin: User, store: str | None) -> dict:
+    visible = visible_rider_query(admin, db, store_filter=store)
+    total_riders = visible.count()
+
+    counts = dict(
+        db.query(RiderCurrentStatus.status, func.count(RiderCurrentStatus.rider_id))
+        .filter(RiderCurrentStatus.rider_id.in_(visible))
+        .group_by(RiderCurrentStatus.status)
         .all()
     )
-    latest: dict[int, RiderStatus] = {}
-    for r in rows:
-        if r.rider_id not in latest:
-            latest[r.rider_id] = r
-
-    active = sum(1 for s in latest.values() if s.status != "offline")
-    delivery = sum(1 for s in latest.values() if s.status == "delivery")
-    available = sum(1 for s in latest.values() if s.status == "available")
-    on_break = sum(1 for s in latest.values() if s.status == "break")
+    active = sum(n for status, n in counts.items() if status != "offline")
+    delivery = counts.get("delivery", 0)
+    available = counts.get("available", 0)
+    on_break = counts.get("break", 0)
 
     today = datetime.utcnow().date()
     absent = (
         db.query(Attendance)
         .filter(
-            Attendance.rider_id.in_(rider_ids) if rider_ids else False,
+            Attendance.rider_id.in_(visible),
             Attendance.date == today,
             Attendance.status.in_(["absent", "off_day"]),
         )
@@ -226,32 +416,28 @@ def dashboard_stats(
         "available": available,
         "on_break": on_break,
         "absent": absent,
-        "updated_at": datetime.utcnow().isoformat(),
+        "updated_at": datetime.utcnow(),
     }
 
 
 # ---------- SUB ADMIN MANAGEMENT (PRIME ONLY) ----------
-@router.get("/sub-admins")
+@router.get("/sub-admins", response_model=SubAdminList, dependencies=[Depends(query_budget(3))])
 def list_sub_admins(
     db: Session = Depends(get_db),
     admin=Depends(prime_admin_only)
 ):
-    sub_admins = db.query(User).filter(User.role == "sub_admin").all()
-    items = []
-    for sub in sub_admins:
-        rider_count = (
-            db.query(User)
-            .filter(User.role == "rider", User.manager_id == sub.id)
-            .count()
-        )
-        items.append(
-            {
-                "id": sub.id,
-                "username": sub.username,
-                "name": sub.name,
-                "rider_count": rider_count,
-            }
-        )
+    Rider = aliased(User)
+    rows = (
+        db.query(User.id, User.username, User.name, func.count(Rider.id).label("rider_count"))
+        .outerjoin(Rider, and_(Rider.manager_id == User.id, Rider.role == "rider"))
+        .filter(User.role == "sub_admin")
+        .group_by(User.id, User.username, User.name)
+        .all()
+    )
+    items = [
+        {"id": r.id, "username": r.username, "name": r.name, "rider_count": r.rider_count}
+        for r in rows
+    ]
     return {"items": items}
 
 
@@ -273,6 +459,7 @@ def add_sub_admin(
         manager_id=admin.id,
     )
     db.add(sub_admin)
+    bump(db, {ALL_SCOPE})
     db.commit()
     return {"message": "Sub admin added"}
 
@@ -280,6 +467,7 @@ def add_sub_admin(
 @router.delete("/delete-sub-admin")
 def delete_sub_admin(
     data: dict,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     admin=Depends(prime_admin_only)
 ):
@@ -292,34 +480,40 @@ def delete_sub_admin(
     if not sub:
         return {"message": "Sub admin not found"}
 
-    # cascade delete riders belonging to this sub admin
-    riders = db.query(User).filter(User.role == "rider", User.manager_id == sub.id).all()
-    for rider in riders:
-        db.query(RiderStatus).filter(RiderStatus.rider_id == rider.id).delete(synchronize_session=False)
-        db.query(Attendance).filter(Attendance.rider_id == rider.id).delete(synchronize_session=False)
-        db.query(Shift).filter(Shift.rider_id == rider.id).delete(synchronize_session=False)
-        db.query(RiderLocation).filter(RiderLocation.rider_id == rider.id).delete(synchronize_session=False)
-        db.delete(rider)
-
+    # cascade delete riders belonging to this sub admin, one statement per table
+    team = db.query(User.id).filter(User.role == "rider", User.manager_id == sub.id)
+    bump(db, scopes_for_riders(db, team) | {f"manager:{sub.id}"})
+    if has_large_history(db, team):
+        soft_delete_riders(db, [r.id for r in team.all()])
+        # One UPDATE; otherwise db.delete loads the whole `team` backref to null it row by row.
+        db.query(User).filter(User.manager_id == sub.id).update({User.manager_id: None}, synchronize_session=False)
+        db.delete(sub)
+        db.commit()
+        background_tasks.add_task(purge_deleted_riders)
+        return {"message": "Sub admin deleted", "history_purge": "scheduled"}
+
+    delete_rider_rows(db, team)
+    db.query(User).filter(User.role == "rider", User.manager_id == sub.id).delete(synchronize_session=False)
     db.delete(sub)
     db.commit()
     return {"message": "Sub admin deleted"}
 
 
-def get_visible_rider_ids(admin_user: User, db: Session, store_filter: str | None = None) -> list[int]:
+def visible_rider_query(admin_user: User, db: Session, store_filter: str | None = None):
+    """Query of rider ids visible to the admin; usable directly as an IN subquery."""
     q = db.query(User.id).filter(User.role == "rider")
-    if admin_user.role == "prime_admin":
-        if store_filter:
-            q = q.filter(User.store == store_filter)
-        return [r.id for r in q.all()]
-    else:
+    if admin_user.role != "prime_admin":
         q = q.filter(User.manager_id == admin_user.id)
-        if store_filter:
-            q = q.filter(User.store == store_filter)
-        return [r.id for r in q.all()]
+    if store_filter:
+        q = q.filter(User.store == store_filter)
+    return q
 
 
-@router.get("/impersonation-logs")
+def get_visible_rider_ids(admin_user: User, db: Session, store_filter: str | None = None) -> list[int]:
+    return [r.id for r in visible_rider_query(admin_user, db, store_filter).all()]
+
+
+@router.get("/impersonation-logs", response_model=ImpersonationLogList, dependencies=[Depends(query_budget(4))])
 def impersonation_logs(
     limit: int = 20,
     db: Session = Depends(get_db),
@@ -357,67 +551,80 @@ def impersonation_logs(
     return {"items": items}
 
 
-@router.get("/prime-overview")
+@router.get("/slow-queries", response_model=SlowQueryList)
+def slow_queries(
+    limit: int = Query(default=100, ge=1, le=1000),
+    route: str | None = Query(default=None, description="Substring of the issuing route, e.g. /admin/rider-status"),
+    min_ms: float = Query(default=0, ge=0),
+    admin=Depends(prime_admin_only),
+):
+    """Newest slow-query log entries (see SLOW_QUERY_MS); empty when the log is off."""
+    return {"threshold_ms": SLOW_QUERY_MS, "items": read_entries(limit, route, min_ms)}
+
+
+@router.get("/profiles", response_model=ProfileList)
+def profiles(admin=Depends(prime_admin_only)):
+    """Request profiles taken with X-Profile: 1 (see PROFILING), newest first."""
+    return {"items": list_profiles()}
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def download_profile(profile_id: str, admin=Depends(prime_admin_only)):
+    """Collapsed stacks of one profile, for flamegraph.pl, speedscope or inferno."""
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    with open(path) as fh:
+        return fh.read()
+
+
+@router.get("/prime-overview", response_model=PrimeOverview, dependencies=[Depends(query_budget(5))])
 def prime_overview(
     db: Session = Depends(get_db),
     admin=Depends(prime_admin_only)
 ):
     """Prime admin dashboard overview of sub admins and their rider activity."""
-    sub_admins = db.query(User).filter(User.role == "sub_admin").all()
+    scope, version = scope_version(db, admin)
+    return result_cache.get_or_compute(("prime_overview", scope, version), lambda: compute_prime_overview(db))
 
-    rows = (
-        db.query(RiderStatus)
-        .order_by(RiderStatus.rider_id, RiderStatus.updated_at.desc())
+
+def compute_prime_overview(db: Session) -> dict:
+    sub_admins = db.query(User.id, User.name, User.username).filter(User.role == "sub_admin").all()
+
+    # One grouped pass over riders and their current status feeds every rollup.
+    groups = (
+        db.query(User.manager_id, User.store, RiderCurrentStatus.status, func.count(User.id).label("n"))
+        .outerjoin(RiderCurrentStatus, RiderCurrentStatus.rider_id == User.id)
+        .filter(User.role == "rider")
+        .group_by(User.manager_id, User.store, RiderCurrentStatus.status)
         .all()
     )
-    latest: dict[int, RiderStatus] = {}
-    for r in rows:
-        if r.rider_id not in latest:
-            latest[r.rider_id] = r
 
-    sub_items = []
-    totals = {"active": 0, "delivery": 0, "available": 0}
+    def empty_bucket():
+        return {"rider_count": 0, "active": 0, "delivery": 0, "available": 0}
+
+    by_manager: dict[int, dict[str, int]] = {}
     store_buckets: dict[str, dict[str, int]] = {}
+    for g in groups:
+        for bucket in (
+            by_manager.setdefault(g.manager_id, empty_bucket()),
+            store_buckets.setdefault(g.store or "Unassigned", empty_bucket()),
+        ):
+            bucket["rider_count"] += g.n
+            if g.status and g.status != "offline":
+                bucket["active"] += g.n
+            if g.status == "delivery":
+                bucket["delivery"] += g.n
+            if g.status == "available":
+                bucket["available"] += g.n
 
+    sub_items = []
+    totals = {"active": 0, "delivery": 0, "available": 0}
     for sub in sub_admins:
-        rider_ids = [
-            r.id for r in db.query(User.id).filter(User.role == "rider", User.manager_id == sub.id).all()
-        ]
-        statuses = [latest[rid] for rid in rider_ids if rid in latest]
-        delivery = sum(1 for s in statuses if s.status == "delivery")
-        available = sum(1 for s in statuses if s.status == "available")
-        active = sum(1 for s in statuses if s.status != "offline")
-        totals["delivery"] += delivery
-        totals["available"] += available
-        totals["active"] += active
-        sub_items.append(
-            {
-                "id": sub.id,
-                "name": sub.name,
-                "username": sub.username,
-                "rider_count": len(rider_ids),
-                "active": active,
-                "delivery": delivery,
-                "available": available,
-            }
-        )
-
-    # Per-store rollups
-    riders = db.query(User).filter(User.role == "rider").all()
-    for rider in riders:
-        st = rider.store or "Unassigned"
-        store_bucket = store_buckets.setdefault(
-            st, {"rider_count": 0, "active": 0, "delivery": 0, "available": 0}
-        )
-        store_bucket["rider_count"] += 1
-        status = latest.get(rider.id)
-        if status:
-            if status.status != "offline":
-                store_bucket["active"] += 1
-            if status.status == "delivery":
-                store_bucket["delivery"] += 1
-            if status.status == "available":
-                store_bucket["available"] += 1
+        counts = by_manager.get(sub.id, empty_bucket())
+        for key in totals:
+            totals[key] += counts[key]
+        sub_items.append({"id": sub.id, "name": sub.name, "username": sub.username, **counts})
 
     store_items = [
         {"store": name, **vals}
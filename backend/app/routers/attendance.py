@@ -1,19 +1,46 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import get_db
 from app.models import Attendance
-from datetime import date
-from app.schemas import AttendanceMark
-from app.auth.deps import rider_only
+from datetime import datetime, date
+from app.schemas import AttendanceMark, AttendanceBulkMark
+from app.auth.deps import rider_only, admin_only
+from app.routers.admin import visible_rider_query
+from app.utils.change_version import bump, bump_for_rider, scopes_for_riders
+from app.utils.upsert import upsert
 
 router = APIRouter(prefix="/attendance", tags=["Attendance"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+ATTENDANCE_STATUSES = {"present", "absent", "off_day"}
+
+
+def upsert_attendance(
+    db: Session, rider_ids: list[int], day: date, status: str, marked_at: datetime | None = None
+) -> int:
+    """
+    Insert or overwrite (rider, day) rows against unique_rider_attendance in bulk.
+    Marks written here are manual and replace any automatically derived row.
+    marked_at (naive UTC, default now) is when the mark was made.
+    """
+    now = datetime.utcnow()
+    return upsert(
+        db,
+        Attendance.__table__,
+        [
+            {
+                "rider_id": rid,
+                "date": day,
+                "status": status,
+                "source": "manual",
+                "created_at": now,
+                "updated_at": marked_at or now,
+            }
+            for rid in rider_ids
+        ],
+        conflict_columns=["rider_id", "date"],
+        update_columns=["status", "source", "updated_at"],
+    )
+
 
 @router.post("/mark")
 def mark_attendance(
@@ -21,25 +48,42 @@ def mark_attendance(
     db: Session = Depends(get_db),
     rider=Depends(rider_only)
 ):
-    today = date.today()
-    existing = (
-        db.query(Attendance)
-        .filter(Attendance.rider_id == rider.id, Attendance.date == today)
-        .first()
-    )
+    if data.status not in ATTENDANCE_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid attendance status")
 
-    if existing:
-        existing.status = data.status
+    upsert_attendance(db, [rider.id], date.today(), data.status)
+    bump_for_rider(db, rider)
+    db.commit()
+    return {"message": "Attendance marked"}
+
+
+@router.post("/bulk")
+def bulk_mark_attendance(
+    data: AttendanceBulkMark,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Mark attendance for many visible riders at once: an explicit rider_ids list,
+    or every rider of a store (or of the admin's whole scope).
+    """
+    if data.status not in ATTENDANCE_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid attendance status")
+
+    q = visible_rider_query(admin, db, store_filter=data.store)
+    if data.rider_ids is not None:
+        requested = set(data.rider_ids)
+        rider_ids = [r.id for r in q.all() if r.id in requested]
+        if len(rider_ids) != len(requested):
+            raise HTTPException(status_code=403, detail="Cannot mark attendance for some of these riders")
     else:
-        a = Attendance(
-            rider_id=rider.id,
-            date=today,
-            status=data.status
-        )
-        db.add(a)
+        rider_ids = [r.id for r in q.all()]
 
+    count = upsert_attendance(db, rider_ids, data.date or date.today(), data.status)
+    if rider_ids:
+        bump(db, scopes_for_riders(db, rider_ids))
     db.commit()
-    return {"message": "Attendance marked"}
+    return {"message": "Attendance marked", "count": count}
 
 
 @router.get("/today")
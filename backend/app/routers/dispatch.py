@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.auth.deps import admin_only
+from app.routers.admin import visible_rider_query
+from app.schemas import DispatchQueue, DispatchRequest, DispatchResponse
+from app.utils.dispatch import available_queue, dispatch_next
+
+router = APIRouter(prefix="/dispatch", tags=["Dispatch"])
+
+
+# ---------- ASSIGN NEXT RIDER (ADMIN) ----------
+@router.post("/next", response_model=DispatchResponse)
+def dispatch_next_rider(
+    data: DispatchRequest,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Atomically move the store's longest-waiting available rider (among the admin's
+    riders) to delivery. Concurrent calls never get the same rider; 409 when nobody
+    is available.
+    """
+    visible = visible_rider_query(admin, db, store_filter=data.store)
+    dispatch = dispatch_next(db, visible, actor=admin, order_ref=data.order_ref)
+    if dispatch is None:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"No available rider in store '{data.store}'")
+    db.commit()
+    return {
+        "id": dispatch.id,
+        "rider_id": dispatch.rider_id,
+        "rider_name": dispatch.rider.name if dispatch.rider else "",
+        "store": dispatch.store,
+        "order_ref": dispatch.order_ref,
+        "waited_seconds": dispatch.waited_seconds,
+        "created_at": dispatch.created_at,
+    }
+
+
+# ---------- DISPATCH QUEUE (ADMIN) ----------
+@router.get("/queue", response_model=DispatchQueue)
+def dispatch_queue(
+    store: str,
+    limit: int = Query(default=50, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """Available riders of a store in the order /dispatch/next will assign them."""
+    visible = visible_rider_query(admin, db, store_filter=store)
+    rows = available_queue(db, visible)
+    return {
+        "store": store,
+        "total_waiting": len(rows),
+        "items": [
+            {"rider_id": r.id, "name": r.name, "available_since": r.updated_at}
+            for r in rows[:limit]
+        ],
+    }
@@ -0,0 +1,306 @@
+from datetime import date, datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.auth.deps import admin_only
+from app.jobs.daily_rollups import CLOSED_CHECKPOINT, UNASSIGNED, store_sum_columns
+from app.models import JobCheckpoint, RiderDailyRollup, StoreDailyRollup, User
+from app.routers.admin import visible_rider_query
+from app.schemas import (
+    RiderDailyReport,
+    StatusSeriesResponse,
+    StoreDailyReport,
+    StoreSummaryReport,
+    TimeInStateReport,
+)
+from app.utils.intervals import naive_utc
+from app.utils.query_diagnostics import query_budget
+from app.utils.status_series import fleet_series
+from app.utils.time_in_state import OTHER, STATES, time_in_state
+
+router = APIRouter(prefix="/reports", tags=["Reports"])
+
+MAX_RANGE_DAYS = 366
+MAX_SHIFT_RANGE_DAYS = 31  # within_shifts sweeps raw history
+TIME_IN_STATE_GROUPS = {"rider", "store", "manager"}
+MAX_SERIES_POINTS = 2016
+
+
+def _check_range(from_date: date, to_date: date) -> None:
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="to_date must not be before from_date")
+    if (to_date - from_date).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_RANGE_DAYS} days")
+
+
+def _rollups_through(db: Session) -> date | None:
+    checkpoint = db.get(JobCheckpoint, CLOSED_CHECKPOINT)
+    return date.fromordinal(checkpoint.position) if checkpoint and checkpoint.position else None
+
+
+def _store_rows(db: Session, admin, from_date: date, to_date: date, store: str | None):
+    """
+    Per store and day sums. Prime admins read store_daily_rollups; sub admins only
+    see their own riders, so their sums come from the rider rows.
+    """
+    if admin.role == "prime_admin":
+        q = db.query(StoreDailyRollup).filter(
+            StoreDailyRollup.day >= from_date, StoreDailyRollup.day <= to_date
+        )
+        if store:
+            q = q.filter(StoreDailyRollup.store == store)
+        return q.order_by(StoreDailyRollup.day, StoreDailyRollup.store).all()
+
+    store_col = func.coalesce(RiderDailyRollup.store, UNASSIGNED)
+    q = db.query(store_col.label("store"), RiderDailyRollup.day, *store_sum_columns()).filter(
+        RiderDailyRollup.rider_id.in_(visible_rider_query(admin, db)),
+        RiderDailyRollup.day >= from_date,
+        RiderDailyRollup.day <= to_date,
+    )
+    if store:
+        q = q.filter(store_col == store)
+    return q.group_by(store_col, RiderDailyRollup.day).order_by(RiderDailyRollup.day, store_col).all()
+
+
+# ---------- RIDER DAYS (ADMIN) ----------
+@router.get("/riders/daily", response_model=RiderDailyReport, dependencies=[Depends(query_budget(4))])
+def rider_daily_report(
+    from_date: date,
+    to_date: date,
+    store: str | None = None,
+    rider_id: int | None = None,
+    limit: int = Query(default=1000, ge=1, le=10000),
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """Per rider and day: time per status, deliveries, distance and attendance, from the daily rollups."""
+    _check_range(from_date, to_date)
+    q = (
+        db.query(RiderDailyRollup, User.name)
+        .join(User, User.id == RiderDailyRollup.rider_id)
+        .filter(
+            RiderDailyRollup.rider_id.in_(visible_rider_query(admin, db)),
+            RiderDailyRollup.day >= from_date,
+            RiderDailyRollup.day <= to_date,
+        )
+    )
+    if store:
+        q = q.filter(RiderDailyRollup.store == store)
+    if rider_id is not None:
+        q = q.filter(RiderDailyRollup.rider_id == rider_id)
+    rows = q.order_by(RiderDailyRollup.day, RiderDailyRollup.rider_id).limit(limit).all()
+    return {
+        "from_date": from_date,
+        "to_date": to_date,
+        "rollups_through": _rollups_through(db),
+        "items": [
+            {
+                "rider_id": r.rider_id,
+                "name": name,
+                "store": r.store,
+                "day": r.day,
+                "seconds_online": r.seconds_online,
+                "seconds_available": r.seconds_available,
+                "seconds_delivery": r.seconds_delivery,
+                "seconds_break": r.seconds_break,
+                "deliveries": r.deliveries,
+                "pings": r.pings,
+                "distance_km": r.distance_km,
+                "attendance": r.attendance,
+            }
+            for r, name in rows
+        ],
+    }
+
+
+# ---------- STORE DAYS (ADMIN) ----------
+@router.get("/stores/daily", response_model=StoreDailyReport, dependencies=[Depends(query_budget(4))])
+def store_daily_report(
+    from_date: date,
+    to_date: date,
+    store: str | None = None,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """Per store and day sums of the rider rollups (sub admins: of their own riders)."""
+    _check_range(from_date, to_date)
+    rows = _store_rows(db, admin, from_date, to_date, store)
+    return {
+        "from_date": from_date,
+        "to_date": to_date,
+        "rollups_through": _rollups_through(db),
+        "items": [
+            {
+                "store": r.store,
+                "day": r.day,
+                "riders_active": r.riders_active,
+                "riders_present": r.riders_present,
+                "riders_absent": r.riders_absent,
+                "seconds_online": r.seconds_online,
+                "seconds_available": r.seconds_available,
+                "seconds_delivery": r.seconds_delivery,
+                "seconds_break": r.seconds_break,
+                "deliveries": r.deliveries,
+                "distance_km": round(r.distance_km or 0.0, 3),
+            }
+            for r in rows
+        ],
+    }
+
+
+# ---------- STORE SUMMARY (ADMIN) ----------
+@router.get("/stores/summary", response_model=StoreSummaryReport, dependencies=[Depends(query_budget(4))])
+def store_summary_report(
+    from_date: date,
+    to_date: date,
+    store: str | None = None,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Per store totals over the range, with averages per active rider-day
+    (e.g. average deliveries per rider per day last month, by store).
+    """
+    _check_range(from_date, to_date)
+    totals: dict[str, dict] = {}
+    for r in _store_rows(db, admin, from_date, to_date, store):
+        t = totals.setdefault(r.store, {
+            "rider_days": 0, "deliveries": 0, "seconds_online": 0,
+            "distance_km": 0.0, "present": 0, "absent": 0,
+        })
+        t["rider_days"] += r.riders_active
+        t["deliveries"] += r.deliveries
+        t["seconds_online"] += r.seconds_online
+        t["distance_km"] += r.distance_km or 0.0
+        t["present"] += r.riders_present
+        t["absent"] += r.riders_absent
+
+    items = []
+    for name in sorted(totals):
+        t = totals[name]
+        rider_days = t["rider_days"]
+        marked = t["present"] + t["absent"]
+        items.append({
+            "store": name,
+            "rider_days": rider_days,
+            "deliveries": t["deliveries"],
+            "avg_deliveries_per_rider_day": round(t["deliveries"] / rider_days, 2) if rider_days else 0.0,
+            "avg_online_hours_per_rider_day": round(t["seconds_online"] / 3600 / rider_days, 2) if rider_days else 0.0,
+            "distance_km": round(t["distance_km"], 3),
+            "attendance_rate": round(t["present"] / marked, 4) if marked else None,
+        })
+    return {
+        "from_date": from_date,
+        "to_date": to_date,
+        "rollups_through": _rollups_through(db),
+        "items": items,
+    }
+
+
+# ---------- TIME IN STATE (ADMIN) ----------
+@router.get("/time-in-state", response_model=TimeInStateReport)
+def time_in_state_report(
+    from_time: datetime,
+    to_time: datetime,
+    group_by: str = "rider",
+    store: str | None = None,
+    within_shifts: bool = False,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Seconds available / on delivery / on break / other / offline per rider, store or
+    manager over [from_time, to_time), clipped to now and optionally to shift time.
+    """
+    if group_by not in TIME_IN_STATE_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {sorted(TIME_IN_STATE_GROUPS)}")
+    start, end = naive_utc(from_time), min(naive_utc(to_time), datetime.utcnow())
+    if end <= start:
+        raise HTTPException(status_code=400, detail="to_time must be after from_time (and not after now)")
+    limit = MAX_SHIFT_RANGE_DAYS if within_shifts else MAX_RANGE_DAYS
+    if (end - start).days >= limit:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {limit} days")
+
+    visible = visible_rider_query(admin, db, store_filter=store)
+    riders = db.query(User.id, User.name, User.store, User.manager_id).filter(User.id.in_(visible)).all()
+    seconds = time_in_state(db, visible, [r.id for r in riders], start, end, within_shifts)
+
+    columns = [*STATES, OTHER, "offline", "total"]
+    groups: dict = {}
+    for r in riders:
+        if group_by == "rider":
+            key = r.id
+            item = {"rider_id": r.id, "name": r.name, "store": r.store, "manager_id": r.manager_id}
+        elif group_by == "store":
+            key = r.store or UNASSIGNED
+            item = {"store": key}
+        else:
+            key = r.manager_id
+            item = {"manager_id": r.manager_id}
+        group = groups.setdefault(key, {**item, "riders": 0, **{c: 0 for c in columns}})
+        group["riders"] += 1
+        for c in columns:
+            group[c] += seconds[r.id][c]
+
+    if group_by == "manager":
+        manager_ids = [k for k in groups if k is not None]
+        names = dict(db.query(User.id, User.name).filter(User.id.in_(manager_ids)).all()) if manager_ids else {}
+        for key, group in groups.items():
+            group["name"] = names.get(key)
+
+    items = [
+        {
+            **{k: v for k, v in g.items() if k not in columns},
+            **{f"seconds_{c}": g[c] for c in columns},
+        }
+        for key, g in sorted(groups.items(), key=lambda kv: (kv[0] is None, kv[0] or 0))
+    ]
+    return {
+        "from_time": start,
+        "to_time": end,
+        "group_by": group_by,
+        "within_shifts": within_shifts,
+        "items": items,
+    }
+
+
+# ---------- FLEET STATUS SERIES (ADMIN) ----------
+@router.get("/status-series", response_model=StatusSeriesResponse)
+def status_series(
+    store: str | None = None,
+    hours: int = Query(default=24, ge=1, le=168),
+    bucket_minutes: int = Query(default=5, ge=1, le=60),
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Active / available / delivery / break counts of the admin's riders at every
+    bucket boundary of the last `hours`, plus now, for the dashboard chart.
+    Repeated polls only read the status changes since the previous one.
+    """
+    if hours * 60 // bucket_minutes > MAX_SERIES_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SERIES_POINTS} buckets; use larger buckets")
+    scope = None if admin.role == "prime_admin" else admin.id
+    points = fleet_series(
+        db,
+        (scope, store),
+        visible_rider_query(admin, db, store_filter=store),
+        timedelta(hours=hours),
+        timedelta(minutes=bucket_minutes),
+    )
+    return {
+        "bucket_seconds": bucket_minutes * 60,
+        "points": [
+            {
+                "at": p["at"],
+                "active": p["active"],
+                "available": p["available"],
+                "delivery": p["delivery"],
+                "on_break": p["break"],
+            }
+            for p in points
+        ],
+    }
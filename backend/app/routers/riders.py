@@ -1,19 +1,16 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import datetime
-from app.database import SessionLocal
-from app.models import RiderStatus, User
-from app.schemas import RiderStatusUpdate
+from app.database import get_db, run_write
+from app.models import RiderCurrentStatus, User
+from app.schemas import RiderStatusUpdate, SyncBatch, SyncResponse
 from app.auth.deps import rider_only
+from app.utils.dispatch import available_queue
+from app.utils.offline_sync import MAX_SYNC_EVENTS, apply_batch
+from app.utils.rider_status import record_status
 
 router = APIRouter(prefix="/rider", tags=["Rider"])
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.post("/status")
 def update_status(
@@ -21,16 +18,29 @@ def update_status(
     db: Session = Depends(get_db),
     rider=Depends(rider_only)
 ):
-    status = RiderStatus(
-        rider_id=rider.id,
-        status=data.status,
-        updated_at=datetime.utcnow()
-    )
-    db.add(status)
-    db.commit()
+    run_write(db, lambda session: record_status(session, rider, data.status))
     return {"status": "updated"}
 
 
+@router.post("/sync", response_model=SyncResponse)
+def sync_offline_events(
+    data: SyncBatch,
+    db: Session = Depends(get_db),
+    rider=Depends(rider_only)
+):
+    """
+    Replay status, attendance and location events queued while offline, in one
+    transaction. Safe to retry: events whose key was already applied are skipped.
+    """
+    if len(data.events) > MAX_SYNC_EVENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SYNC_EVENTS} events per sync")
+    try:
+        return run_write(db, lambda session: apply_batch(session, rider, data.events))
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="These events are being synced by another request; retry")
+
+
 @router.get("/queue")
 def rider_queue(
     db: Session = Depends(get_db),
@@ -40,45 +50,21 @@ def rider_queue(
     Return the latest status for the current rider plus the available queue ordered by
     when riders became available (oldest first).
     """
-    # Latest status per rider
-    rows = (
-        db.query(RiderStatus)
-        .order_by(RiderStatus.rider_id, RiderStatus.updated_at.desc())
-        .all()
-    )
-    latest: dict[int, RiderStatus] = {}
-    for r in rows:
-        if r.rider_id not in latest:
-            latest[r.rider_id] = r
-
-    rider_ids = list(latest.keys())
-    users = (
-        db.query(User)
-        .filter(User.id.in_(rider_ids) if rider_ids else False)
-        .all()
-    )
-    user_map = {u.id: u for u in users}
-    current_store = getattr(rider, "store", None)
-
-    queue = []
-    for rider_id, status in latest.items():
-        u = user_map.get(rider_id)
-        store_matches = (getattr(u, "store", None) == current_store)
-        if status.status == "available" and store_matches:
-            queue.append(
-                {
-                    "rider_id": rider_id,
-                    "name": u.name if u else f"Rider {rider_id}",
-                    "updated_at": status.updated_at,
-                    "store": getattr(u, "store", None),
-                }
-            )
-
-    # Oldest available first
-    queue.sort(key=lambda x: x["updated_at"] or datetime.utcnow())
+    # Same order /dispatch/next assigns in; reads the current-status table, not the history
+    store_riders = db.query(User.id).filter(User.role == "rider", User.store == rider.store)
+    queue = [
+        {
+            "rider_id": r.id,
+            "name": r.name,
+            "updated_at": r.updated_at,
+            "store": r.store,
+        }
+        for r in available_queue(db, store_riders)
+    ]
 
     # Current rider status
-    self_status = latest.get(rider.id).status if rider.id in latest else "offline"
+    current = db.get(RiderCurrentStatus, rider.id)
+    self_status = current.status if current else "offline"
 
     # Position in queue (1-based)
     position = None
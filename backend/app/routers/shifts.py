@@ -1,23 +1,91 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.orm import Session, selectinload
+from datetime import date, datetime, time, timedelta
+from itertools import dropwhile, islice
+import heapq
 import pandas as pd
 
-from app.database import SessionLocal
-from app.models import Shift
-from app.schemas import ShiftCreate, ShiftResponse, ExportRequest
+from app.database import get_db
+from app.models import Shift, ShiftTemplate, ShiftTemplateException, User
+from app.schemas import (
+    ShiftCreate,
+    ShiftResponse,
+    ShiftBulkCreate,
+    ShiftBulkResponse,
+    CoverageResponse,
+    ShiftTemplateCreate,
+    ShiftTemplateResponse,
+    ShiftTemplateExceptionCreate,
+    ShiftTemplateMaterialize,
+    ExportRequest,
+)
 from app.auth.deps import admin_only
-from app.routers.admin import get_visible_rider_ids
+from app.routers.admin import get_visible_rider_ids, visible_rider_query
+from app.utils.intervals import Interval, coverage_sweep, find_conflicts, naive_utc
+from app.utils.change_version import bump, not_modified, scopes_for_riders
+from app.utils.pagination import decode_cursor, encode_cursor
+from app.utils.shift_templates import merged_occurrences, occurrences
 
 router = APIRouter(prefix="/shifts", tags=["Shifts"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+MAX_MATERIALIZE_DAYS = 28
+
+
+def load_templates(db: Session, rider_query, range_start: datetime, range_end: datetime):
+    """Templates of the given riders that can produce shifts in the range, with their skip days."""
+    templates = (
+        db.query(ShiftTemplate)
+        .filter(
+            ShiftTemplate.rider_id.in_(rider_query),
+            ShiftTemplate.effective_from <= range_end.date(),
+            or_(
+                ShiftTemplate.effective_to.is_(None),
+                ShiftTemplate.effective_to >= range_start.date(),
+            ),
+            or_(
+                ShiftTemplate.materialized_until.is_(None),
+                ShiftTemplate.materialized_until < range_end.date(),
+                ShiftTemplate.materialized_from > range_start.date(),
+            ),
+        )
+        .all()
+    )
+    return templates, load_skip_days(db, templates, range_start.date(), range_end.date())
+
+
+def load_skip_days(db: Session, templates, first: date, last: date) -> dict[int, set[date]]:
+    """Exception days in [first, last] per template id."""
+    skip: dict[int, set[date]] = {}
+    if templates:
+        rows = (
+            db.query(ShiftTemplateException.template_id, ShiftTemplateException.date)
+            .filter(
+                ShiftTemplateException.template_id.in_([t.id for t in templates]),
+                ShiftTemplateException.date >= first,
+                ShiftTemplateException.date <= last,
+            )
+            .all()
+        )
+        for row in rows:
+            skip.setdefault(row.template_id, set()).add(row.date)
+    return skip
+
+
+def template_out(template: ShiftTemplate) -> dict:
+    return {
+        "id": template.id,
+        "rider_id": template.rider_id,
+        "weekday": template.weekday,
+        "start_time": template.start_time,
+        "end_time": template.end_time,
+        "effective_from": template.effective_from,
+        "effective_to": template.effective_to,
+        "materialized_from": template.materialized_from,
+        "materialized_until": template.materialized_until,
+        "exceptions": sorted(e.date for e in template.exceptions),
+    }
 
 
 # ---------- CREATE SHIFT (ADMIN) ----------
@@ -27,29 +95,449 @@ def create_shift(
     db: Session = Depends(get_db),
     admin=Depends(admin_only)
 ):
+    start_time, end_time = naive_utc(data.start_time), naive_utc(data.end_time)
+    if end_time <= start_time:
+        raise HTTPException(status_code=400, detail="Shift end_time must be after start_time")
+
     visible = set(get_visible_rider_ids(admin, db))
     if data.rider_id not in visible:
-        return {"detail": "Cannot create shift for this rider"}
+        raise HTTPException(status_code=403, detail="Cannot create shift for this rider")
+
+    clash = (
+        db.query(Shift.id)
+        .filter(
+            Shift.rider_id == data.rider_id,
+            Shift.start_time < end_time,
+            Shift.end_time > start_time,
+        )
+        .first()
+    )
+    if clash:
+        raise HTTPException(status_code=409, detail=f"Shift overlaps existing shift {clash.id}")
 
     shift = Shift(
         rider_id=data.rider_id,
-        start_time=data.start_time,
-        end_time=data.end_time
+        start_time=start_time,
+        end_time=end_time
     )
     db.add(shift)
+    bump(db, scopes_for_riders(db, [data.rider_id]))
     db.commit()
     db.refresh(shift)
     return shift
 
 
+# ---------- BULK ROSTER (ADMIN) ----------
+@router.post("/bulk", response_model=ShiftBulkResponse)
+def bulk_create_shifts(
+    data: ShiftBulkCreate,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Validate a whole roster in one pass and insert the valid shifts in a single write.
+    Overlaps with stored shifts or with earlier-starting shifts in the same roster are
+    reported per row; with all_or_nothing nothing is inserted if any row is rejected.
+    """
+    visible = set(get_visible_rider_ids(admin, db))
+    rejected = []
+    candidates: list[Interval] = []
+    for idx, item in enumerate(data.shifts):
+        start_time, end_time = naive_utc(item.start_time), naive_utc(item.end_time)
+        if end_time <= start_time:
+            rejected.append({"index": idx, "rider_id": item.rider_id, "reason": "invalid_range"})
+        elif item.rider_id not in visible:
+            rejected.append({"index": idx, "rider_id": item.rider_id, "reason": "not_visible"})
+        else:
+            candidates.append(Interval(item.rider_id, start_time, end_time, idx))
+
+    accepted: list[int] = []
+    if candidates:
+        # Only stored shifts that can touch the roster window matter.
+        window_start = min(c.start for c in candidates)
+        window_end = max(c.end for c in candidates)
+        existing = (
+            db.query(Shift.id, Shift.rider_id, Shift.start_time, Shift.end_time)
+            .filter(
+                Shift.rider_id.in_({c.rider_id for c in candidates}),
+                Shift.start_time < window_end,
+                Shift.end_time > window_start,
+            )
+            .all()
+        )
+        accepted, conflicts = find_conflicts(
+            (Interval(r.rider_id, r.start_time, r.end_time, r.id) for r in existing),
+            candidates,
+        )
+        for pos, (kind, ref) in conflicts.items():
+            entry = {"index": candidates[pos].ref, "rider_id": candidates[pos].rider_id}
+            if kind == "shift":
+                entry.update(reason="overlaps_existing", conflict_shift_id=ref)
+            else:
+                entry.update(reason="overlaps_request", conflict_index=ref)
+            rejected.append(entry)
+
+    rejected.sort(key=lambda r: r["index"])
+    if rejected and data.all_or_nothing:
+        return {"inserted": 0, "rejected": rejected}
+
+    if accepted:
+        db.execute(
+            insert(Shift),
+            [
+                {
+                    "rider_id": candidates[pos].rider_id,
+                    "start_time": candidates[pos].start,
+                    "end_time": candidates[pos].end,
+                    "created_at": datetime.utcnow(),
+                }
+                for pos in accepted
+            ],
+        )
+        bump(db, scopes_for_riders(db, {candidates[pos].rider_id for pos in accepted}))
+        db.commit()
+
+    return {"inserted": len(accepted), "rejected": rejected}
+
+
 # ---------- LIST SHIFTS (ADMIN) ----------
 @router.get("/list", response_model=list[ShiftResponse])
 def list_shifts(
+    request: Request,
+    response: Response,
+    from_time: datetime | None = Query(default=None, description="Only shifts starting at or after this time"),
+    to_time: datetime | None = Query(default=None, description="Only shifts starting before this time"),
+    rider_id: int | None = Query(default=None),
+    store: str | None = Query(default=None),
+    cursor: str | None = Query(default=None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(default=500, ge=1, le=2000),
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Shifts of visible riders ordered by start_time, one keyset page at a time.
+    When both from_time and to_time are given, shifts generated from recurring
+    templates are merged in (stored rows first on equal start times).
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    cached = not_modified(request, response, db, admin, store)
+    if cached:
+        return cached
+
+    visible = visible_rider_query(admin, db, store_filter=store)
+    if rider_id is not None:
+        visible = visible.filter(User.id == rider_id)
+    range_start = naive_utc(from_time) if from_time is not None else None
+    range_end = naive_utc(to_time) if to_time is not None else None
+
+    # Sort key is (start_time, source, ref): source 0 = stored row (ref = id),
+    # source 1 = template occurrence (ref = template id).
+    after = decode_cursor(cursor, datetime, int, int) if cursor else None
+
+    q = db.query(Shift).filter(Shift.rider_id.in_(visible))
+    if range_start is not None:
+        q = q.filter(Shift.start_time >= range_start)
+    if range_end is not None:
+        q = q.filter(Shift.start_time < range_end)
+    if after:
+        after_start, after_source, after_ref = after
+        if after_source == 0:
+            q = q.filter(
+                or_(
+                    Shift.start_time > after_start,
+                    and_(Shift.start_time == after_start, Shift.id > after_ref),
+                )
+            )
+        else:
+            q = q.filter(Shift.start_time > after_start)
+    stored = q.order_by(Shift.start_time, Shift.id).limit(limit + 1).all()
+    stream = ((s.start_time, 0, s.id, s) for s in stored)
+
+    if range_start is not None and range_end is not None:
+        gen_start = max(range_start, after[0]) if after else range_start
+        templates, skip = load_templates(db, visible, gen_start, range_end)
+        generated = (
+            (o["start_time"], 1, o["template_id"], o)
+            for o in merged_occurrences(templates, skip, gen_start, range_end)
+        )
+        if after:
+            generated = dropwhile(lambda row: row[:3] <= after, generated)
+        stream = heapq.merge(stream, generated, key=lambda row: row[:3])
+
+    page = list(islice(stream, limit + 1))
+    if len(page) > limit:
+        page = page[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(*page[-1][:3])
+    return [row[3] for row in page]
+
+
+# ---------- STORE COVERAGE (ADMIN) ----------
+@router.get("/coverage", response_model=CoverageResponse)
+def store_coverage(
+    from_date: date,
+    to_date: date,
+    store: str | None = Query(default=None, description="Single store; all visible stores when omitted"),
+    bucket_minutes: int = Query(default=60, ge=5, le=1440),
+    min_riders: int = Query(default=1, ge=1, description="Headcount below this is reported as a gap"),
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Riders on shift per store per bucket for [from_date, to_date] (inclusive, UTC days),
+    plus the exact windows where coverage drops below min_riders. One query loads every
+    overlapping shift with its rider's store, template occurrences are expanded for the
+    window only, and each store is then a single sweep.
+    """
+    if to_date < from_date:
+        raise HTTPException(status_code=400, detail="to_date must not be before from_date")
+    if (to_date - from_date).days > 62:
+        raise HTTPException(status_code=400, detail="Coverage range is limited to 62 days")
+
+    window_start = datetime.combine(from_date, time.min)
+    window_end = datetime.combine(to_date + timedelta(days=1), time.min)
+    visible = visible_rider_query(admin, db, store_filter=store)
+
+    spans: dict[str, list[tuple[datetime, datetime]]] = {
+        r.store or "Unassigned": []
+        for r in db.query(User.store).filter(User.id.in_(visible)).distinct().all()
+    }
+    rows = (
+        db.query(User.store, Shift.start_time, Shift.end_time)
+        .join(User, User.id == Shift.rider_id)
+        .filter(
+            Shift.rider_id.in_(visible),
+            Shift.start_time < window_end,
+            Shift.end_time > window_start,
+        )
+        .all()
+    )
+    for row in rows:
+        spans.setdefault(row.store or "Unassigned", []).append((row.start_time, row.end_time))
+
+    # Template occurrences starting the day before can still run into the window.
+    gen_start = window_start - timedelta(days=1)
+    templates, skip = load_templates(db, visible, gen_start, window_end)
+    if templates:
+        store_of = dict(
+            db.query(User.id, User.store).filter(User.id.in_({t.rider_id for t in templates})).all()
+        )
+        for occ in merged_occurrences(templates, skip, gen_start, window_end):
+            if occ["end_time"] > window_start:
+                spans.setdefault(store_of.get(occ["rider_id"]) or "Unassigned", []).append(
+                    (occ["start_time"], occ["end_time"])
+                )
+
+    bucket = timedelta(minutes=bucket_minutes)
+    stores = []
+    for name in sorted(spans):
+        buckets, gaps = coverage_sweep(spans[name], window_start, window_end, bucket, min_riders)
+        stores.append({"store": name, "buckets": buckets, "gaps": gaps})
+
+    return {
+        "from_time": window_start,
+        "to_time": window_end,
+        "bucket_minutes": bucket_minutes,
+        "min_riders": min_riders,
+        "stores": stores,
+    }
+
+
+# ---------- RECURRING TEMPLATES (ADMIN) ----------
+@router.post("/templates", response_model=ShiftTemplateResponse)
+def create_template(
+    data: ShiftTemplateCreate,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    if not 0 <= data.weekday <= 6:
+        raise HTTPException(status_code=400, detail="weekday must be 0 (Monday) to 6 (Sunday)")
+    if data.effective_to and data.effective_to < data.effective_from:
+        raise HTTPException(status_code=400, detail="effective_to must not be before effective_from")
+    if data.rider_id not in set(get_visible_rider_ids(admin, db)):
+        raise HTTPException(status_code=403, detail="Cannot create template for this rider")
+
+    # Times are stored as naive UTC like every shift column. Converting a time with
+    # an offset can move the occurrence to the neighbouring day, and its dates with it.
+    start = naive_utc(datetime.combine(data.effective_from, data.start_time))
+    end_time = naive_utc(datetime.combine(data.effective_from, data.end_time)).time()
+    moved = timedelta(days=(start.date() - data.effective_from).days)
+    if start.time() == end_time:
+        raise HTTPException(status_code=400, detail="Template start_time and end_time must differ")
+
+    template = ShiftTemplate(
+        rider_id=data.rider_id,
+        weekday=(data.weekday + moved.days) % 7,
+        start_time=start.time(),
+        end_time=end_time,
+        effective_from=data.effective_from + moved,
+        effective_to=data.effective_to + moved if data.effective_to else None,
+        exceptions=[ShiftTemplateException(date=d + moved) for d in sorted(set(data.exceptions))],
+    )
+    db.add(template)
+    bump(db, scopes_for_riders(db, [data.rider_id]))
+    db.commit()
+    db.refresh(template)
+    return template_out(template)
+
+
+@router.get("/templates", response_model=list[ShiftTemplateResponse])
+def list_templates(
+    rider_id: int | None = Query(default=None),
+    store: str | None = Query(default=None),
     db: Session = Depends(get_db),
     admin=Depends(admin_only)
 ):
-    rider_ids = get_visible_rider_ids(admin, db)
-    return db.query(Shift).filter(Shift.rider_id.in_(rider_ids) if rider_ids else False).all()
+    visible = visible_rider_query(admin, db, store_filter=store)
+    q = (
+        db.query(ShiftTemplate)
+        .options(selectinload(ShiftTemplate.exceptions))
+        .filter(ShiftTemplate.rider_id.in_(visible))
+    )
+    if rider_id is not None:
+        q = q.filter(ShiftTemplate.rider_id == rider_id)
+    return [template_out(t) for t in q.order_by(ShiftTemplate.rider_id, ShiftTemplate.weekday).all()]
+
+
+def get_visible_template(template_id: int, admin, db: Session) -> ShiftTemplate:
+    template = (
+        db.query(ShiftTemplate)
+        .filter(
+            ShiftTemplate.id == template_id,
+            ShiftTemplate.rider_id.in_(visible_rider_query(admin, db)),
+        )
+        .first()
+    )
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return template
+
+
+@router.post("/templates/{template_id}/exceptions", response_model=ShiftTemplateResponse)
+def add_template_exception(
+    template_id: int,
+    data: ShiftTemplateExceptionCreate,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """Skip one occurrence. Already-materialized days must be edited as regular shifts."""
+    template = get_visible_template(template_id, admin, db)
+    if all(e.date != data.date for e in template.exceptions):
+        template.exceptions.append(ShiftTemplateException(date=data.date))
+        bump(db, scopes_for_riders(db, [template.rider_id]))
+        db.commit()
+        db.refresh(template)
+    return template_out(template)
+
+
+@router.delete("/templates/{template_id}")
+def delete_template(
+    template_id: int,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """Stop generating shifts; rows it already materialized are kept."""
+    template = get_visible_template(template_id, admin, db)
+    bump(db, scopes_for_riders(db, [template.rider_id]))
+    db.delete(template)
+    db.commit()
+    return {"message": "Template deleted"}
+
+
+def restart_materialized_range(template: ShiftTemplate, today: date) -> None:
+    """
+    Start a lapsed template's materialized range over at today. A template holds a
+    single range, so the occurrence days of the old one, which exist as real shifts,
+    are kept from being generated again as exception days; the days in between go
+    back to being generated on read.
+    """
+    day = max(template.materialized_from or template.effective_from, template.effective_from)
+    day += timedelta(days=(template.weekday - day.weekday()) % 7)
+    taken = {e.date for e in template.exceptions}
+    while day <= template.materialized_until:
+        if day not in taken:
+            template.exceptions.append(ShiftTemplateException(date=day))
+        day += timedelta(days=7)
+    template.materialized_from = today
+
+
+@router.post("/templates/materialize")
+def materialize_templates(
+    data: ShiftTemplateMaterialize,
+    db: Session = Depends(get_db),
+    admin=Depends(admin_only)
+):
+    """
+    Write template occurrences from today up to a bounded horizon as real shifts, so
+    they can be edited individually. Each template continues from its
+    materialized_until, or from today when that has lapsed, so reruns only add the
+    new tail; past days are never written and keep being generated on read.
+    Occurrences that overlap stored shifts are skipped.
+    """
+    if not 1 <= data.horizon_days <= MAX_MATERIALIZE_DAYS:
+        raise HTTPException(
+            status_code=400, detail=f"horizon_days must be between 1 and {MAX_MATERIALIZE_DAYS}"
+        )
+    today = datetime.utcnow().date()
+    until = today + timedelta(days=data.horizon_days)
+    range_start = datetime.combine(today, time.min)
+    range_end = datetime.combine(until + timedelta(days=1), time.min)
+
+    templates, _ = load_templates(db, visible_rider_query(admin, db), range_start, range_end)
+    # right after the watermark, but never before today
+    first = {
+        t.id: max(t.materialized_until + timedelta(days=1), today) if t.materialized_until else today
+        for t in templates
+    }
+    skip = load_skip_days(db, templates, today, until)
+    candidates = [
+        Interval(o["rider_id"], o["start_time"], o["end_time"], o["template_id"])
+        for t in templates
+        for o in occurrences(t, skip.get(t.id, set()), datetime.combine(first[t.id], time.min), range_end)
+    ]
+
+    accepted: list[int] = []
+    if candidates:
+        existing = (
+            db.query(Shift.id, Shift.rider_id, Shift.start_time, Shift.end_time)
+            .filter(
+                Shift.rider_id.in_({c.rider_id for c in candidates}),
+                Shift.start_time < max(c.end for c in candidates),
+                Shift.end_time > min(c.start for c in candidates),
+            )
+            .all()
+        )
+        accepted, _ = find_conflicts(
+            (Interval(r.rider_id, r.start_time, r.end_time, r.id) for r in existing),
+            candidates,
+        )
+    if accepted:
+        db.execute(
+            insert(Shift),
+            [
+                {
+                    "rider_id": candidates[pos].rider_id,
+                    "start_time": candidates[pos].start,
+                    "end_time": candidates[pos].end,
+                    "created_at": datetime.utcnow(),
+                }
+                for pos in accepted
+            ],
+        )
+    for template in templates:
+        if template.materialized_until is not None and template.materialized_until < today - timedelta(days=1):
+            restart_materialized_range(template, today)
+        elif template.materialized_until is None:
+            template.materialized_from = today
+        template.materialized_until = until
+    if templates:
+        bump(db, scopes_for_riders(db, {t.rider_id for t in templates}))
+    db.commit()
+
+    return {
+        "materialized": len(accepted),
+        "skipped_overlaps": len(candidates) - len(accepted),
+        "until": until.isoformat(),
+    }
 
 
 # ---------- EXPORT SHIFTS TO EXCEL ----------
@@ -59,20 +547,35 @@ def export_shifts(
     db: Session = Depends(get_db),
     admin=Depends(admin_only)
 ):
-    rider_ids = get_visible_rider_ids(admin, db)
-    shifts = db.query(Shift).filter(
-        Shift.rider_id.in_(rider_ids) if rider_ids else False,
-        Shift.start_time >= data.from_date,
-        Shift.end_time <= data.to_date
-    ).all()
-
-    rows = [{
-        "rider_id": s.rider_id,
-        "start_time": s.start_time,
-        "end_time": s.end_time
-    } for s in shifts]
-
-    df = pd.DataFrame(rows)
+    visible = visible_rider_query(admin, db)
+    range_start = datetime.combine(data.from_date, time.min)
+    range_end = datetime.combine(data.to_date, time.min)
+    shifts = (
+        db.query(Shift.rider_id, Shift.start_time, Shift.end_time)
+        .filter(
+            Shift.rider_id.in_(visible),
+            Shift.start_time >= range_start,
+            Shift.end_time <= range_end,
+        )
+        .order_by(Shift.start_time, Shift.id)
+        .all()
+    )
+    templates, skip = load_templates(db, visible, range_start, range_end)
+    generated = (
+        o for o in merged_occurrences(templates, skip, range_start, range_end)
+        if o["end_time"] <= range_end
+    )
+
+    rows = heapq.merge(
+        ({"rider_id": s.rider_id, "start_time": s.start_time, "end_time": s.end_time, "template_id": None}
+         for s in shifts),
+        ({"rider_id": o["rider_id"], "start_time": o["start_time"], "end_time": o["end_time"],
+          "template_id": o["template_id"]}
+         for o in generated),
+        key=lambda r: r["start_time"],
+    )
+
+    df = pd.DataFrame(list(rows), columns=["rider_id", "start_time", "end_time", "template_id"])
     file_path = "/tmp/shifts.xlsx"
     df.to_excel(file_path, index=False)
 
@@ -2,22 +2,15 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from datetime import datetime
 
-from app.database import SessionLocal
-from app.models import RiderStatus, RiderLocation
-from app.schemas import RiderStatusUpdate
+from app.database import get_db, run_write
+from app.models import RiderLocation
+from app.schemas import RiderLocationResponse, RiderStatusUpdate
 from app.auth.deps import rider_only, admin_only
+from app.utils.rider_status import record_status
 
 router = APIRouter(prefix="/tracking", tags=["Tracking"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # ---------- RIDER SET STATUS ----------
 @router.post("/status")
 def set_status(
@@ -25,13 +18,7 @@ def set_status(
     db: Session = Depends(get_db),
     rider=Depends(rider_only)
 ):
-    status = RiderStatus(
-        rider_id=rider.id,
-        status=data.status,
-        updated_at=datetime.utcnow()
-    )
-    db.add(status)
-    db.commit()
+    run_write(db, lambda session: record_status(session, rider, data.status))
     return {"status": "updated"}
 
 
@@ -49,21 +36,14 @@ def update_location(
         lng=lng,
         updated_at=datetime.utcnow()
     )
-    db.add(loc)
-    db.commit()
+    run_write(db, lambda session: session.add(loc))
     return {"location": "updated"}
 
 
 # ---------- ADMIN VIEW LIVE RIDERS ----------
-@router.get("/live")
+@router.get("/live", response_model=list[RiderLocationResponse])
 def live_tracking(
     db: Session = Depends(get_db),
     admin=Depends(admin_only)
 ):
-    locations = db.query(RiderLocation).all()
-    return [{
-        "rider_id": l.rider_id,
-        "lat": l.lat,
-        "lng": l.lng,
-        "updated_at": l.updated_at
-    } for l in locations]
+    return db.query(RiderLocation).all()
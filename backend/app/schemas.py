@@ -1,6 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional, List
-from datetime import datetime, date
+from pydantic import BaseModel, Field
+from typing import Any, Optional, List, Union
+from datetime import datetime, date, time
 
 
 # =====================================================
@@ -60,6 +60,64 @@ class RiderStatusResponse(BaseModel):
         from_attributes = True
 
 
+# =====================================================
+# OFFLINE SYNC
+# =====================================================
+class SyncEvent(BaseModel):
+    key: str  # client-generated idempotency key, unique per rider
+    type: str  # status | attendance | location
+    at: datetime  # when it happened on the device
+    status: Optional[str] = None  # status and attendance events
+    lat: Optional[float] = None  # location events
+    lng: Optional[float] = None
+
+
+class SyncBatch(BaseModel):
+    events: List[SyncEvent]  # in the order they happened
+
+
+class SyncRejected(BaseModel):
+    key: str
+    detail: str
+
+
+class SyncResponse(BaseModel):
+    applied: int
+    duplicates: int
+    rejected: List[SyncRejected]
+    status: Optional[str] = None  # current status after the sync
+
+
+# =====================================================
+# DISPATCH
+# =====================================================
+class DispatchRequest(BaseModel):
+    store: str
+    order_ref: Optional[str] = None
+
+
+class DispatchResponse(BaseModel):
+    id: int
+    rider_id: int
+    rider_name: str
+    store: Optional[str] = None
+    order_ref: Optional[str] = None
+    waited_seconds: Optional[float] = None
+    created_at: datetime
+
+
+class DispatchQueueItem(BaseModel):
+    rider_id: int
+    name: str
+    available_since: datetime
+
+
+class DispatchQueue(BaseModel):
+    store: str
+    total_waiting: int
+    items: List[DispatchQueueItem]
+
+
 # =====================================================
 # ATTENDANCE
 # =====================================================
@@ -67,6 +125,13 @@ class AttendanceMark(BaseModel):
     status: str  # present | absent | off_day
 
 
+class AttendanceBulkMark(BaseModel):
+    status: str  # present | absent | off_day
+    date: Optional[date] = None  # defaults to today
+    store: Optional[str] = None  # whole store when rider_ids is omitted
+    rider_ids: Optional[List[int]] = None
+
+
 class AttendanceResponse(BaseModel):
     rider_id: int
     date: date
@@ -86,15 +151,95 @@ class ShiftCreate(BaseModel):
 
 
 class ShiftResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # None for shifts generated from a template
     rider_id: int
     start_time: datetime
     end_time: datetime
+    template_id: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+MAX_BULK_SHIFTS = 5000
+
+
+class ShiftBulkCreate(BaseModel):
+    shifts: List[ShiftCreate] = Field(..., max_length=MAX_BULK_SHIFTS)  # larger rosters get a 422
+    all_or_nothing: bool = False  # reject the whole roster if any shift is invalid
+
+
+class ShiftRejection(BaseModel):
+    index: int  # position in the submitted roster
+    rider_id: int
+    reason: str  # invalid_range | not_visible | overlaps_existing | overlaps_request
+    conflict_shift_id: Optional[int] = None
+    conflict_index: Optional[int] = None
+
+
+class ShiftBulkResponse(BaseModel):
+    inserted: int
+    rejected: List[ShiftRejection]
+
+
+class ShiftTemplateCreate(BaseModel):
+    rider_id: int
+    weekday: int  # 0 = Monday ... 6 = Sunday
+    start_time: time
+    end_time: time  # at or before start_time means the shift ends the next day
+    effective_from: date
+    effective_to: Optional[date] = None
+    exceptions: List[date] = []
+
+
+class ShiftTemplateResponse(BaseModel):
+    id: int
+    rider_id: int
+    weekday: int
+    start_time: time
+    end_time: time
+    effective_from: date
+    effective_to: Optional[date] = None
+    materialized_from: Optional[date] = None
+    materialized_until: Optional[date] = None
+    exceptions: List[date] = []
+
+
+class ShiftTemplateExceptionCreate(BaseModel):
+    date: date
+
+
+class ShiftTemplateMaterialize(BaseModel):
+    horizon_days: int = 14
+
+
+class CoverageBucket(BaseModel):
+    start: datetime
+    min: int  # fewest riders on shift at any moment in the bucket
+    max: int
+    avg: float  # time-weighted headcount
+
+
+class CoverageGap(BaseModel):
+    start: datetime
+    end: datetime
+    riders: int  # lowest headcount inside the gap
+
+
+class StoreCoverage(BaseModel):
+    store: str
+    buckets: List[CoverageBucket]
+    gaps: List[CoverageGap]
+
+
+class CoverageResponse(BaseModel):
+    from_time: datetime
+    to_time: datetime
+    bucket_minutes: int
+    min_riders: int
+    stores: List[StoreCoverage]
+
+
 # =====================================================
 # LIVE TRACKING (GPS)
 # =====================================================
@@ -118,9 +263,221 @@ class RiderLocationResponse(BaseModel):
 # =====================================================
 class DashboardStats(BaseModel):
     total_riders: int
-    online: int
-    off_for_delivery: int
+    active: int
+    delivery: int
+    available: int
+    on_break: int
+    absent: int
+    updated_at: datetime
+
+
+class StatusSeriesPoint(BaseModel):
+    at: datetime
+    active: int
     available: int
+    delivery: int
+    on_break: int
+
+
+class StatusSeriesResponse(BaseModel):
+    bucket_seconds: int
+    points: List[StatusSeriesPoint]  # bucket boundaries, oldest first, then now
+
+
+class RiderStatusItem(BaseModel):
+    rider_id: int
+    name: str
+    store: Optional[str] = None
+    status: str
+    updated_at: Optional[datetime] = None
+
+
+class RiderStatusList(BaseModel):
+    items: List[RiderStatusItem]
+
+
+class RiderListItem(BaseModel):
+    id: int
+    username: str
+    name: str
+    manager_id: Optional[int] = None
+    store: Optional[str] = None
+    status: str
+    updated_at: Optional[datetime] = None
+
+
+class RiderListResponse(BaseModel):
+    items: List[RiderListItem]
+    next_cursor: Optional[str] = None
+
+
+class SubAdminItem(BaseModel):
+    id: int
+    username: str
+    name: str
+    rider_count: int
+
+
+class SubAdminList(BaseModel):
+    items: List[SubAdminItem]
+
+
+class StatusCounts(BaseModel):
+    active: int
+    delivery: int
+    available: int
+
+
+class SubAdminOverview(StatusCounts):
+    id: int
+    name: str
+    username: str
+    rider_count: int
+
+
+class StoreOverview(StatusCounts):
+    store: str
+    rider_count: int
+
+
+class PrimeOverview(BaseModel):
+    items: List[SubAdminOverview]
+    totals: StatusCounts
+    stores: List[StoreOverview]
+
+
+class ImpersonationLogItem(BaseModel):
+    id: int
+    actor_id: Optional[int] = None
+    actor_name: Optional[str] = None
+    target_id: Optional[int] = None
+    target_name: Optional[str] = None
+    target_role: str
+    created_at: Optional[datetime] = None
+
+
+class ImpersonationLogList(BaseModel):
+    items: List[ImpersonationLogItem]
+
+
+class SlowQueryItem(BaseModel):
+    at: datetime
+    ms: float
+    route: Optional[str] = None
+    sql: str
+    params: Optional[Any] = None
+    rows: Optional[int] = None
+    pid: int
+    plan: Optional[Union[List[str], str]] = None
+
+
+class SlowQueryList(BaseModel):
+    threshold_ms: float
+    items: List[SlowQueryItem]
+
+
+class ProfileItem(BaseModel):
+    id: str
+    status: str
+    method: Optional[str] = None
+    route: Optional[str] = None
+    path: Optional[str] = None
+    response_status: Optional[int] = None
+    started_at: Optional[datetime] = None
+    duration_ms: Optional[float] = None
+    interval_ms: Optional[float] = None
+    samples: Optional[int] = None
+    stacks: Optional[int] = None
+    pid: Optional[int] = None
+
+
+class ProfileList(BaseModel):
+    items: List[ProfileItem]
+
+
+# =====================================================
+# REPORTS (DAILY ROLLUPS)
+# =====================================================
+class RiderDailyItem(BaseModel):
+    rider_id: int
+    name: str
+    store: Optional[str] = None
+    day: date
+    seconds_online: int
+    seconds_available: int
+    seconds_delivery: int
+    seconds_break: int
+    deliveries: int
+    pings: int
+    distance_km: float
+    attendance: Optional[str] = None
+
+
+class RiderDailyReport(BaseModel):
+    from_date: date
+    to_date: date
+    rollups_through: Optional[date] = None  # last complete day rolled up
+    items: List[RiderDailyItem]
+
+
+class StoreDailyItem(BaseModel):
+    store: str
+    day: date
+    riders_active: int
+    riders_present: int
+    riders_absent: int
+    seconds_online: int
+    seconds_available: int
+    seconds_delivery: int
+    seconds_break: int
+    deliveries: int
+    distance_km: float
+
+
+class StoreDailyReport(BaseModel):
+    from_date: date
+    to_date: date
+    rollups_through: Optional[date] = None
+    items: List[StoreDailyItem]
+
+
+class StoreSummaryItem(BaseModel):
+    store: str
+    rider_days: int  # riders active per day, summed over the range
+    deliveries: int
+    avg_deliveries_per_rider_day: float
+    avg_online_hours_per_rider_day: float
+    distance_km: float
+    attendance_rate: Optional[float] = None  # present / (present + absent)
+
+
+class StoreSummaryReport(BaseModel):
+    from_date: date
+    to_date: date
+    rollups_through: Optional[date] = None
+    items: List[StoreSummaryItem]
+
+
+class TimeInStateItem(BaseModel):
+    rider_id: Optional[int] = None  # group_by=rider
+    manager_id: Optional[int] = None  # group_by=rider|manager
+    name: Optional[str] = None  # rider or manager name
+    store: Optional[str] = None  # group_by=rider|store
+    riders: int
+    seconds_available: int
+    seconds_delivery: int
+    seconds_break: int
+    seconds_other: int
+    seconds_offline: int
+    seconds_total: int  # window length, or shift time inside it, summed over riders
+
+
+class TimeInStateReport(BaseModel):
+    from_time: datetime
+    to_time: datetime
+    group_by: str
+    within_shifts: bool
+    items: List[TimeInStateItem]
 
 
 # =====================================================
@@ -0,0 +1,94 @@
+import hashlib
+from datetime import datetime
+
+from fastapi import Request, Response
+from sqlalchemy.orm import Session
+
+from app.models import ChangeVersion, User
+from app.utils.upsert import dialect_insert
+
+ALL_SCOPE = "all"
+
+
+def rider_scopes(manager_id: int | None, store: str | None) -> set[str]:
+    """Every scope whose admin views can include a rider with this manager and store."""
+    scopes = {ALL_SCOPE}
+    if manager_id is not None:
+        scopes.add(f"manager:{manager_id}")
+    if store:
+        scopes.add(f"store:{store}")
+    return scopes
+
+
+def scopes_for_riders(db: Session, rider_ids) -> set[str]:
+    scopes = {ALL_SCOPE}
+    rows = db.query(User.manager_id, User.store).filter(User.id.in_(rider_ids)).distinct().all()
+    for row in rows:
+        scopes |= rider_scopes(row.manager_id, row.store)
+    return scopes
+
+
+def bump(db: Session, scopes: set[str]) -> None:
+    """Increment the scopes' versions in one upsert; commits with the caller's write."""
+    if not scopes:
+        return
+    table = ChangeVersion.__table__
+    dialect_name = db.get_bind().dialect.name
+    stmt = dialect_insert(dialect_name)(table).values(
+        [{"scope": scope, "version": 1} for scope in sorted(scopes)]
+    )
+    if dialect_name in {"mysql", "mariadb"}:
+        stmt = stmt.on_duplicate_key_update(version=table.c.version + 1)
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["scope"], set_={"version": table.c.version + 1}
+        )
+    db.execute(stmt)
+
+
+def bump_for_rider(db: Session, rider: User) -> None:
+    bump(db, rider_scopes(rider.manager_id, rider.store))
+
+
+def request_scope(admin: User, store: str | None) -> str:
+    """The narrowest scope covering what this admin can see with this store filter."""
+    if admin.role != "prime_admin":
+        return f"manager:{admin.id}"
+    return f"store:{store}" if store else ALL_SCOPE
+
+
+def scope_version(db: Session, admin: User, store: str | None = None) -> tuple[str, int]:
+    scope = request_scope(admin, store)
+    row = db.get(ChangeVersion, scope)
+    return scope, row.version if row else 0
+
+
+def not_modified(
+    request: Request,
+    response: Response,
+    db: Session,
+    admin: User,
+    store: str | None = None,
+) -> Response | None:
+    """
+    Set a weak ETag from the scope version, the caller, the query string and the UTC day.
+    Returns a 304 response when it matches If-None-Match, before any heavy query runs.
+    `Cache-Control: no-cache` makes browsers revalidate with If-None-Match on their own.
+    """
+    _, version = scope_version(db, admin, store)
+    key = "|".join(
+        [
+            request.url.path,
+            str(sorted(request.query_params.multi_items())),
+            str(admin.id),
+            datetime.utcnow().date().isoformat(),
+        ]
+    )
+    etag = f'W/"{version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    candidates = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",")}
+    if etag in candidates or etag.removeprefix("W/") in candidates:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,95 @@
+import gzip
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    offered = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.partition(";")
+        q = params.strip().removeprefix("q=")
+        try:
+            if params and float(q) <= 0:
+                continue
+        except ValueError:
+            pass
+        offered.add(name.strip())
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        # quality 4 is close to gzip's speed with noticeably smaller output
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """
+    Brotli or gzip for complete JSON/text responses of at least minimum_size bytes,
+    picked from Accept-Encoding. Streamed bodies (Excel exports) and responses that
+    already carry a Content-Encoding pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Message | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                if "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start = message
+                return
+            if passthrough or start is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False):
+                # Streaming response: send as-is from here on.
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if len(body) >= self.minimum_size:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
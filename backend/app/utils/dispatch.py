@@ -0,0 +1,107 @@
+"""
+Atomic rider dispatch: claim the longest-waiting available rider of a store.
+
+The claim is one statement that picks and flips the rider in the same step:
+
+    UPDATE rider_current_status SET status = 'delivery'
+    WHERE rider_id = (SELECT rider_id FROM rider_current_status
+                      WHERE status = 'available' AND rider_id IN (<visible riders of the store>)
+                      ORDER BY updated_at, rider_id LIMIT 1
+                      FOR UPDATE SKIP LOCKED)
+      AND status = 'available'
+    RETURNING rider_id, updated_at
+
+updated_at is moved to now by a second statement once the row is ours, so
+RETURNING still carries the time the rider became available.
+On Postgres, concurrent dispatches skip the row another transaction is
+claiming and take the next rider instead of queueing behind it. On SQLite
+the UPDATE takes the database write lock before the sub-select runs, so
+claims are serialized. Either way a rider is never handed out twice.
+Dialects without UPDATE ... RETURNING (MySQL) lock the candidate with
+SELECT ... FOR UPDATE SKIP LOCKED first and then flip it.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Query, Session
+
+from app.models import Dispatch, RiderCurrentStatus, RiderStatus, User
+from app.utils.change_version import bump, rider_scopes
+
+AVAILABLE = "available"
+ASSIGNED = "delivery"
+
+
+def _claim(db: Session, visible: Query, now: datetime) -> tuple[int, datetime] | None:
+    rcs = RiderCurrentStatus.__table__
+    candidate = (
+        select(rcs.c.rider_id, rcs.c.updated_at)
+        .where(rcs.c.status == AVAILABLE, rcs.c.rider_id.in_(visible))
+        .order_by(rcs.c.updated_at, rcs.c.rider_id)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=rcs)
+    )
+    if db.get_bind().dialect.update_returning:
+        row = db.execute(
+            update(rcs)
+            .where(
+                rcs.c.rider_id == candidate.with_only_columns(rcs.c.rider_id).scalar_subquery(),
+                rcs.c.status == AVAILABLE,
+            )
+            .values(status=ASSIGNED)
+            .returning(rcs.c.rider_id, rcs.c.updated_at)
+        ).first()
+    else:
+        row = db.execute(candidate).first()
+    if row is None:
+        return None
+    db.execute(
+        update(rcs).where(rcs.c.rider_id == row.rider_id).values(status=ASSIGNED, updated_at=now)
+    )
+    return row.rider_id, row.updated_at
+
+
+def dispatch_next(
+    db: Session,
+    visible: Query,
+    actor: User | None = None,
+    order_ref: str | None = None,
+) -> Dispatch | None:
+    """
+    Move the longest-waiting available rider among `visible` (an IN-able query of
+    rider ids, usually visible_rider_query(admin, db, store)) to delivery. Returns
+    the Dispatch row or None when nobody is available. The caller commits; the
+    rider's row stays locked until then.
+    """
+    now = datetime.utcnow()
+    claimed = _claim(db, visible, now)
+    if claimed is None:
+        return None
+    rider_id, available_since = claimed
+    rider = db.get(User, rider_id)
+
+    db.add(RiderStatus(rider_id=rider_id, status=ASSIGNED, updated_at=now))
+    dispatch = Dispatch(
+        rider_id=rider_id,
+        store=rider.store,
+        dispatched_by=actor.id if actor else None,
+        order_ref=order_ref,
+        waited_seconds=(now - available_since).total_seconds() if available_since else None,
+        created_at=now,
+    )
+    db.add(dispatch)
+    # Last, so the shared change-version rows are locked for as short a time as possible.
+    db.flush()
+    bump(db, rider_scopes(rider.manager_id, rider.store))
+    return dispatch
+
+
+def available_queue(db: Session, visible: Query) -> list:
+    """Available riders among `visible`, longest-waiting first (the order dispatch_next uses)."""
+    return (
+        db.query(User.id, User.name, User.store, RiderCurrentStatus.updated_at)
+        .join(RiderCurrentStatus, RiderCurrentStatus.rider_id == User.id)
+        .filter(RiderCurrentStatus.status == AVAILABLE, User.id.in_(visible))
+        .order_by(RiderCurrentStatus.updated_at, RiderCurrentStatus.rider_id)
+        .all()
+    )
@@ -0,0 +1,141 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, NamedTuple
+
+
+def naive_utc(value: datetime) -> datetime:
+    """Columns are naive UTC; clients send ISO strings with a 'Z' suffix."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class Interval(NamedTuple):
+    rider_id: int
+    start: datetime
+    end: datetime
+    ref: object = None  # shift id for stored rows, request index for candidates
+
+
+def find_conflicts(
+    existing: Iterable[Interval],
+    candidates: list[Interval],
+) -> tuple[list[int], dict[int, tuple[str, object]]]:
+    """
+    Validate candidate shifts against stored shifts and against each other.
+
+    Intervals are half-open ([start, end)), so back-to-back shifts are allowed.
+    Each rider is handled with one sorted sweep: candidates are visited in
+    start order, an accepted candidate blocks every later-starting one that
+    begins before it ends, and stored shifts are checked both behind (running
+    max end) and ahead (the next stored start).
+
+    Returns (accepted candidate positions, {rejected position: (kind, ref)})
+    where kind is "shift" for a stored row and "request" for another candidate.
+    """
+    stored: dict[int, list[Interval]] = defaultdict(list)
+    for iv in existing:
+        stored[iv.rider_id].append(iv)
+
+    per_rider: dict[int, list[int]] = defaultdict(list)
+    for pos, iv in enumerate(candidates):
+        per_rider[iv.rider_id].append(pos)
+
+    accepted: list[int] = []
+    rejected: dict[int, tuple[str, object]] = {}
+
+    for rider_id, positions in per_rider.items():
+        rows = sorted(stored.get(rider_id, ()), key=lambda iv: iv.start)
+        positions.sort(key=lambda p: (candidates[p].start, p))
+
+        reach: datetime | None = None  # max end of everything starting at or before the cursor
+        reach_ref: tuple[str, object] | None = None
+        cursor = 0  # stored rows already folded into reach
+        for pos in positions:
+            cand = candidates[pos]
+            while cursor < len(rows) and rows[cursor].start <= cand.start:
+                if reach is None or rows[cursor].end > reach:
+                    reach, reach_ref = rows[cursor].end, ("shift", rows[cursor].ref)
+                cursor += 1
+
+            if reach is not None and reach > cand.start:
+                rejected[pos] = reach_ref
+                continue
+
+            if cursor < len(rows) and rows[cursor].start < cand.end:
+                rejected[pos] = ("shift", rows[cursor].ref)
+                continue
+
+            accepted.append(pos)
+            if reach is None or cand.end > reach:
+                reach, reach_ref = cand.end, ("request", cand.ref)
+
+    accepted.sort()
+    return accepted, rejected
+
+
+def coverage_sweep(
+    spans: Iterable[tuple[datetime, datetime]],
+    window_start: datetime,
+    window_end: datetime,
+    bucket: timedelta,
+    min_required: int,
+) -> tuple[list[dict], list[dict]]:
+    """
+    Headcount over time for one store from its shift spans.
+
+    Spans are clipped to the window and turned into +1/-1 events; one pass over
+    the sorted events yields a piecewise-constant headcount that is folded into
+    fixed buckets (min / max / time-weighted average) and into maximal gap
+    windows where the headcount stays below min_required.
+    """
+    events: list[tuple[datetime, int]] = []
+    for start, end in spans:
+        start, end = max(start, window_start), min(end, window_end)
+        if start < end:
+            events.append((start, 1))
+            events.append((end, -1))
+    events.sort()
+    events.append((window_end, 0))  # sentinel closing the last segment
+
+    n_buckets = -(-(window_end - window_start) // bucket)
+    buckets = [
+        {
+            "start": window_start + i * bucket,
+            "min": None,
+            "max": 0,
+            "avg": 0.0,
+        }
+        for i in range(n_buckets)
+    ]
+    gaps: list[dict] = []
+    bucket_seconds = bucket.total_seconds()
+
+    current = 0
+    cursor = window_start
+    for at, delta in events:
+        if at > cursor:
+            # Segment [cursor, at) has a constant headcount.
+            first = (cursor - window_start) // bucket
+            last = (at - window_start - timedelta(microseconds=1)) // bucket
+            for i in range(first, last + 1):
+                b = buckets[i]
+                lo = max(cursor, b["start"])
+                hi = min(at, b["start"] + bucket, window_end)
+                b["min"] = current if b["min"] is None else min(b["min"], current)
+                b["max"] = max(b["max"], current)
+                b["avg"] += current * (hi - lo).total_seconds() / bucket_seconds
+
+            if current < min_required:
+                if gaps and gaps[-1]["end"] == cursor:
+                    gaps[-1]["end"] = at
+                    gaps[-1]["riders"] = min(gaps[-1]["riders"], current)
+                else:
+                    gaps.append({"start": cursor, "end": at, "riders": current})
+            cursor = at
+        current += delta
+
+    for b in buckets:
+        b["min"] = b["min"] or 0
+        b["avg"] = round(b["avg"], 2)
+    return buckets, gaps
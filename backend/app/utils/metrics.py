@@ -0,0 +1,163 @@
+"""
+Prometheus metrics: per-route latency, in-flight requests, SQL statements and
+time per request, DB pool checkout wait and pool usage.
+
+Everything on the hot path is a counter increment or a histogram observe.
+With several gunicorn workers set PROMETHEUS_MULTIPROC_DIR to an empty,
+writable directory so /metrics aggregates all of them (gunicorn.conf.py
+cleans up after exited workers).
+"""
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests being served",
+    multiprocess_mode="livesum",
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements",
+    "SQL statements executed per request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233, 377, 610, 1000),
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "http_request_sql_seconds",
+    "Time spent in SQL per request",
+    ["route"],
+)
+SQL_STATEMENTS = Counter("db_sql_statements", "SQL statements executed (including outside requests)")
+POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time to get a connection from the pool (including opening a new one)",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_connections_in_use",
+    "Connections currently checked out",
+    multiprocess_mode="livesum",
+)
+POOL_CAPACITY = Gauge(
+    "db_pool_capacity",
+    "Pool size plus allowed overflow",
+    multiprocess_mode="livesum",
+)
+
+# [statements, seconds] of the request being served; the list is shared with
+# the threadpool copy of the context, so sync endpoints add to the same totals.
+_request_sql: ContextVar[list | None] = ContextVar("request_sql", default=None)
+
+
+def instrument_engine(engine) -> None:
+    # The start time rides on the execution context, so a failed statement leaves nothing behind.
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.metrics_start
+        SQL_STATEMENTS.inc()
+        totals = _request_sql.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += elapsed
+
+    pool = engine.pool
+    if hasattr(pool, "size") and hasattr(pool, "_max_overflow"):
+        POOL_CAPACITY.inc(pool.size() + max(pool._max_overflow, 0))
+
+    @event.listens_for(pool, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(pool, "checkin")
+    def _checkin(dbapi_conn, record):
+        POOL_CHECKED_OUT.dec()
+
+    # The pool has no "before checkout" event, so time the call that blocks on it.
+    do_get = pool._do_get
+
+    def timed_do_get():
+        start = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+
+    pool._do_get = timed_do_get
+
+
+def route_label(scope: Scope) -> str:
+    """The matched route template (/shifts/templates/{template_id}), never the raw path."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is not None:
+        for candidate in scope["app"].routes:
+            if getattr(candidate, "endpoint", None) is endpoint:
+                return candidate.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        totals = [0, 0.0]
+        token = _request_sql.set(totals)
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            _request_sql.reset(token)
+            route = route_label(scope)
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(elapsed)
+            REQUEST_SQL_STATEMENTS.labels(route).observe(totals[0])
+            REQUEST_SQL_SECONDS.labels(route).observe(totals[1])
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,170 @@
+"""
+Idempotent replay of the events a rider's app queued while offline (POST /rider/sync).
+
+A batch lists status, attendance and location events in the order they
+happened, each with its device timestamp and a client-generated key.
+apply_batch writes all of it in the caller's transaction:
+
+- keys are hashed to 64 bits and looked up in sync_receipts (primary key
+  rider_id, key_hash) with one query per LOOKUP_CHUNK keys; events already
+  applied, and repeats within the batch, count as duplicates;
+- receipts, status history and location pings of the new events are
+  bulk-inserted, and attendance is upserted once per day from that day's
+  last mark. Days are the server's local dates, as for /attendance/mark,
+  and a day a manual mark was made for after the replayed one is left
+  alone;
+- rider_current_status moves to the newest status event only, and only if
+  it is not older than the current row, so a late replay never overrides a
+  status set online in the meantime.
+
+A concurrent sync claiming the same keys makes the receipt insert fail with
+an IntegrityError; the batch is rolled back and a retry reports those events
+as duplicates. Receipts are kept for SYNC_KEY_RETENTION_HOURS
+(app.jobs.sync_receipts), so older events are rejected: their keys may
+already be forgotten.
+"""
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.config import SYNC_KEY_RETENTION_HOURS
+from app.models import Attendance, RiderCurrentStatus, RiderLocation, RiderStatus, SyncReceipt, User
+from app.routers.attendance import ATTENDANCE_STATUSES, upsert_attendance
+from app.utils.change_version import bump_for_rider
+from app.utils.intervals import naive_utc
+from app.utils.status_codes import ensure_status
+from app.utils.upsert import upsert
+
+MAX_SYNC_EVENTS = 1000
+MAX_KEY_LENGTH = 100
+MAX_STATUS_LENGTH = 50  # longest status name status_codes holds
+LOOKUP_CHUNK = 500
+EVENT_TYPES = ("status", "attendance", "location")
+
+
+def key_hash(key: str) -> int:
+    """Signed 64-bit BLAKE2b of the key, to fit a BIGINT."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def _problem(event, at: datetime, oldest: datetime) -> str | None:
+    if not event.key or len(event.key) > MAX_KEY_LENGTH:
+        return f"key must be 1-{MAX_KEY_LENGTH} characters"
+    if event.type not in EVENT_TYPES:
+        return f"type must be one of {', '.join(EVENT_TYPES)}"
+    if at < oldest:
+        return f"older than {SYNC_KEY_RETENTION_HOURS:g} hours"
+    if event.type == "status" and not (event.status and len(event.status) <= MAX_STATUS_LENGTH):
+        return f"status must be 1-{MAX_STATUS_LENGTH} characters"
+    if event.type == "attendance" and event.status not in ATTENDANCE_STATUSES:
+        return "Invalid attendance status"
+    if event.type == "location" and (
+        event.lat is None or event.lng is None or not (-90 <= event.lat <= 90 and -180 <= event.lng <= 180)
+    ):
+        return "lat and lng are required and must be valid coordinates"
+    return None
+
+
+def apply_batch(db: Session, rider: User, events) -> dict:
+    """Write the batch's new events (see module docstring); the caller commits."""
+    now = datetime.utcnow()
+    oldest = now - timedelta(hours=SYNC_KEY_RETENTION_HOURS)
+    rejected: list[dict] = []
+    duplicates = 0
+    fresh: list[tuple[int, datetime, object]] = []
+    seen: set[int] = set()
+    for event in events:
+        at = min(naive_utc(event.at), now)  # device clocks that run ahead
+        problem = _problem(event, at, oldest)
+        if problem:
+            rejected.append({"key": event.key, "detail": problem})
+            continue
+        h = key_hash(event.key)
+        if h in seen:
+            duplicates += 1
+            continue
+        seen.add(h)
+        fresh.append((h, at, event))
+
+    hashes = [h for h, _, _ in fresh]
+    known: set[int] = set()
+    for i in range(0, len(hashes), LOOKUP_CHUNK):
+        known.update(
+            db.execute(
+                select(SyncReceipt.key_hash).where(
+                    SyncReceipt.rider_id == rider.id,
+                    SyncReceipt.key_hash.in_(hashes[i:i + LOOKUP_CHUNK]),
+                )
+            ).scalars()
+        )
+    duplicates += len(known)
+    fresh = [f for f in fresh if f[0] not in known]
+
+    if fresh:
+        db.execute(
+            insert(SyncReceipt),
+            [{"rider_id": rider.id, "key_hash": h, "received_at": now} for h, _, _ in fresh],
+        )
+
+        statuses = [(at, e.status) for _, at, e in fresh if e.type == "status"]
+        for name in {status for _, status in statuses}:
+            ensure_status(db, name)
+        if statuses:
+            db.execute(
+                insert(RiderStatus),
+                [{"rider_id": rider.id, "status": status, "updated_at": at} for at, status in statuses],
+            )
+
+        locations = [
+            {"rider_id": rider.id, "lat": e.lat, "lng": e.lng, "updated_at": at}
+            for _, at, e in fresh
+            if e.type == "location"
+        ]
+        if locations:
+            db.execute(insert(RiderLocation), locations)
+
+        marks: dict[date, tuple[datetime, str]] = {}
+        for _, at, e in fresh:
+            if e.type != "attendance":
+                continue
+            day = at.replace(tzinfo=timezone.utc).astimezone().date()  # date.today() at that moment
+            if day not in marks or at >= marks[day][0]:
+                marks[day] = (at, e.status)
+        marked = dict(
+            db.execute(
+                select(Attendance.date, func.coalesce(Attendance.updated_at, Attendance.created_at)).where(
+                    Attendance.rider_id == rider.id,
+                    Attendance.date.in_(marks),
+                    Attendance.source == "manual",
+                )
+            ).all()
+        ) if marks else {}
+        for day, (at, status) in marks.items():
+            if marked.get(day) is not None and marked[day] > at:
+                continue  # marked online (or by an admin) after this event
+            upsert_attendance(db, [rider.id], day, status, marked_at=at)
+
+        newest = None
+        for at, status in statuses:
+            if newest is None or at >= newest[0]:  # ties: the later event in the batch
+                newest = (at, status)
+        if newest is not None:
+            current_at = db.execute(
+                select(RiderCurrentStatus.updated_at).where(RiderCurrentStatus.rider_id == rider.id)
+            ).scalar()
+            if current_at is None or newest[0] >= current_at:
+                upsert(
+                    db,
+                    RiderCurrentStatus.__table__,
+                    [{"rider_id": rider.id, "status": newest[1], "updated_at": newest[0]}],
+                    conflict_columns=["rider_id"],
+                    update_columns=["status", "updated_at"],
+                )
+        bump_for_rider(db, rider)
+
+    current = db.execute(
+        select(RiderCurrentStatus.status).where(RiderCurrentStatus.rider_id == rider.id)
+    ).scalar()
+    return {"applied": len(fresh), "duplicates": duplicates, "rejected": rejected, "status": current}
@@ -0,0 +1,29 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values) -> str:
+    """Opaque keyset cursor from the sort key of the last row on a page."""
+    raw = json.dumps(
+        [v.isoformat() if isinstance(v, datetime) else v for v in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """Inverse of encode_cursor; `types` converts each part (datetime, int, str, ...)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if len(parts) != len(types):
+            raise ValueError("cursor arity")
+        return tuple(
+            None if p is None else datetime.fromisoformat(p) if t is datetime else t(p)
+            for p, t in zip(parts, types)
+        )
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
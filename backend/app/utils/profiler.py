@@ -0,0 +1,263 @@
+"""
+On-demand sampling profiler for single requests (PROFILING=true to enable).
+
+A prime admin adds `X-Profile: 1` (or `?profile=1`) to any request. While
+that request runs, a background thread samples the stacks of threads that
+are inside the matched endpoint every PROFILE_INTERVAL_MS and folds them
+into collapsed-stack text (one `frame;frame;frame count` line per stack),
+which flamegraph.pl, speedscope and inferno read directly. The profile is
+stored in PROFILE_DIR and its id returned in the X-Profile response header;
+GET /admin/profiles lists them and /admin/profiles/{id} downloads one.
+
+Only frames from the endpoint down are kept, so auth dependencies and
+response-model serialization are not included. Concurrent requests to the same route in the same worker can show
+up in the samples. PROFILE_MAX_PER_MINUTE bounds profiles across all workers
+on the host (counted from PROFILE_DIR under a file lock) and each worker
+runs one at a time; a request over the limit is served normally with
+`X-Profile: rate-limited`. With PROFILING off the middleware is not
+installed at all.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from itertools import count
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: the limit is per worker there
+    fcntl = None
+
+from jose import JWTError, jwt
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import (
+    JWT_ALGORITHM,
+    JWT_SECRET,
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_KEEP,
+    PROFILE_MAX_PER_MINUTE,
+)
+from app.utils.metrics import route_label
+
+MAX_PROFILE_SECONDS = 60  # sampling stops here even if the request does not
+_SEQUENCE = count(1)
+_busy = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def _frame_label(code) -> str:
+    path = code.co_filename
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and path.startswith(prefix + os.sep):
+            path = path[len(prefix) + 1:]
+            break
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})"
+
+
+class Sampler(threading.Thread):
+    """Collects folded stacks of the threads currently running `scope['endpoint']`."""
+
+    def __init__(self, scope: Scope, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.scope = scope
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        deadline = time.monotonic() + MAX_PROFILE_SECONDS
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval) and time.monotonic() < deadline:
+            endpoint = self.scope.get("endpoint")
+            target = getattr(endpoint, "__code__", None)
+            if target is None:  # not routed yet
+                continue
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    if frame.f_code is target:
+                        self.stacks[";".join(_frame_label(c) for c in reversed(stack))] += 1
+                        break
+                    frame = frame.f_back
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def _dir_lock():
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(PROFILE_DIR, ".lock"), "a") as fh:
+        fcntl.lockf(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.lockf(fh, fcntl.LOCK_UN)
+
+
+def _reserve_slot() -> str | None:
+    """New profile id, or None when PROFILE_MAX_PER_MINUTE profiles were started in the last minute."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with _dir_lock():
+        now = time.time()
+        metas = sorted(
+            (e for e in os.scandir(PROFILE_DIR) if e.name.endswith(".json")),
+            key=lambda e: e.stat().st_mtime,
+        )
+        if sum(1 for e in metas if now - e.stat().st_mtime < 60) >= PROFILE_MAX_PER_MINUTE:
+            return None
+        for old in metas[: max(0, len(metas) - PROFILE_KEEP + 1)]:
+            for path in (old.path, old.path[: -len(".json")] + ".folded"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}-{next(_SEQUENCE)}"
+        # Written now so the slot counts against the limit in every worker.
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), "w") as fh:
+            json.dump({"id": profile_id, "status": "running"}, fh)
+        return profile_id
+
+
+def _is_prime_admin(scope: Scope) -> bool:
+    from app.database import SessionLocal
+    from app.models import User
+
+    auth = dict(scope["headers"]).get(b"authorization", b"").decode("latin-1")
+    if not auth.lower().startswith("bearer "):
+        return False
+    try:
+        payload = jwt.decode(auth[7:], JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    except JWTError:
+        return False
+    if payload.get("role") != "prime_admin":
+        return False
+    # The role claim can outlive a demotion, so confirm against the database.
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == payload.get("id")).first()
+        return bool(user and user.is_active and user.role == "prime_admin")
+    finally:
+        db.close()
+
+
+def _requested(scope: Scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value not in (b"", b"0", b"false")
+    query = scope.get("query_string", b"")
+    return b"profile=" in query and any(
+        part in (b"profile=1", b"profile=true") for part in query.split(b"&")
+    )
+
+
+def list_profiles() -> list[dict]:
+    try:
+        entries = [e for e in os.scandir(PROFILE_DIR) if e.name.endswith(".json")]
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for entry in sorted(entries, key=lambda e: e.name, reverse=True):
+        try:
+            with open(entry.path) as fh:
+                profiles.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(profile_id: str) -> str | None:
+    if not profile_id or os.sep in profile_id or profile_id.startswith("."):
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+    return path if os.path.exists(path) else None
+
+
+class ProfilerMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if not await run_in_threadpool(_is_prime_admin, scope):
+            outcome = None
+        elif not _busy.acquire(blocking=False):
+            outcome = "rate-limited"
+        else:
+            try:
+                outcome = await run_in_threadpool(_reserve_slot) or "rate-limited"
+            except BaseException:
+                _busy.release()
+                raise
+            if outcome == "rate-limited":
+                _busy.release()
+
+        async def send_with_header(message: Message) -> None:
+            if message["type"] == "http.response.start" and outcome:
+                message["headers"] = [*message.get("headers", []), (b"x-profile", outcome.encode())]
+            await send(message)
+
+        if outcome in (None, "rate-limited"):
+            await self.app(scope, receive, send_with_header)
+            return
+
+        sampler = Sampler(scope, PROFILE_INTERVAL_MS / 1000)
+        status = 500
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+
+        async def send_and_record(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send_with_header(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            sampler.stop()
+            _busy.release()
+            self._save(outcome, scope, sampler, status, started_at, time.perf_counter() - start)
+
+    @staticmethod
+    def _save(profile_id, scope, sampler, status, started_at, elapsed) -> None:
+        base = os.path.join(PROFILE_DIR, profile_id)
+        with open(base + ".folded", "w") as fh:
+            for stack, hits in sampler.stacks.most_common():
+                fh.write(f"{stack} {hits}\n")
+        meta = {
+            "id": profile_id,
+            "status": "done",
+            "method": scope["method"],
+            "route": route_label(scope),
+            "path": scope["path"],
+            "response_status": status,
+            "started_at": started_at.isoformat(timespec="milliseconds"),
+            "duration_ms": round(elapsed * 1000, 1),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "samples": sampler.samples,
+            "stacks": sum(sampler.stacks.values()),
+            "pid": os.getpid(),
+        }
+        with open(base + ".json", "w") as fh:
+            json.dump(meta, fh)
@@ -0,0 +1,108 @@
+"""
+Diagnostic mode for query regressions (QUERY_DIAGNOSTICS=log|raise, off by default).
+
+Within one request it flags any statement shape (SQL with literals and IN
+lists collapsed) executed QUERY_REPEAT_THRESHOLD times or more, the usual
+sign of a query in a loop, and enforces the budget an endpoint declares:
+
+    @router.get("/sub-admins", dependencies=[Depends(query_budget(4))])
+
+`log` prints each finding once per request; `raise` makes the offending
+statement raise QueryDiagnosticsError, so the request fails with a 500 and
+smoke runs or benchmarks catch the regression (`python -m benchmarks.load
+--query-budgets` runs every budgeted endpoint this way). When off, nothing is hooked
+and query_budget() is a no-op.
+"""
+import re
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import QUERY_DIAGNOSTICS, QUERY_REPEAT_THRESHOLD
+
+_PARAM = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+|'[^']*'|-?\d+(?:\.\d+)?)"
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+_LITERAL = re.compile(r"'[^']*'|\b-?\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+class QueryDiagnosticsError(RuntimeError):
+    pass
+
+
+class RequestQueries:
+    __slots__ = ("path", "budget", "count", "shapes", "reported")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.budget: int | None = None
+        self.count = 0
+        self.shapes: Counter = Counter()
+        self.reported: set[str] = set()
+
+
+_current: ContextVar[RequestQueries | None] = ContextVar("request_queries", default=None)
+
+
+def normalize(statement: str) -> str:
+    """Statement shape: whitespace folded, literals and parameter lists collapsed."""
+    shape = _PARAM_LIST.sub("(?)", statement)
+    shape = _LITERAL.sub("?", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+def query_budget(limit: int):
+    """Route dependency declaring how many statements one request may run."""
+
+    def set_budget():
+        queries = _current.get()
+        if queries is not None:
+            queries.budget = limit
+
+    set_budget.limit = limit  # read by `python -m benchmarks.load --query-budgets`
+    return set_budget
+
+
+def _report(queries: RequestQueries, key: str, message: str) -> None:
+    if QUERY_DIAGNOSTICS == "raise":
+        raise QueryDiagnosticsError(message)
+    if key not in queries.reported:
+        queries.reported.add(key)
+        print(f"[queries] {message}")
+
+
+def instrument_engine(engine) -> None:
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        queries = _current.get()
+        if queries is None:
+            return
+        queries.count += 1
+        shape = normalize(statement)
+        queries.shapes[shape] += 1
+        repeats = queries.shapes[shape]
+        if repeats >= QUERY_REPEAT_THRESHOLD:
+            _report(queries, shape, f"{queries.path}: same query ran {repeats}x (N+1?): {shape[:500]}")
+        if queries.budget is not None and queries.count > queries.budget:
+            _report(
+                queries,
+                "budget",
+                f"{queries.path}: {queries.count} queries, budget is {queries.budget}",
+            )
+
+
+class QueryDiagnosticsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _current.set(RequestQueries(f"{scope['method']} {scope['path']}"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,12 @@
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON via orjson: several times faster than the stdlib encoder on large lists,
+    and datetimes/dates serialize natively in the same ISO format as isoformat().
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
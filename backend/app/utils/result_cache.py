@@ -0,0 +1,143 @@
+"""
+Short-TTL, single-flight cache for aggregate endpoints.
+
+Keys carry the caller's change-version (see change_version.py), so any write
+in the scope moves readers to a fresh key at once; the TTL only bounds how
+long an unchanged result is reused. Concurrent misses on one key wait for
+the first caller instead of recomputing.
+
+Backends:
+  memory  per-process dict (default; each gunicorn worker computes once per TTL)
+  sqlite  a local SQLite file shared by every worker on the host, with a
+          cross-process lock so the fleet computes once per TTL
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable
+
+import orjson
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: no cross-process single-flight there
+    fcntl = None
+
+from app.config import RESULT_CACHE_BACKEND, RESULT_CACHE_PATH, RESULT_CACHE_TTL
+
+MAX_MEMORY_ENTRIES = 1024
+LOCK_SLOTS = 1024
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._entries: dict[str, tuple[float, object]] = {}
+        self._mutex = threading.Lock()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def set(self, key: str, value, ttl: float) -> None:
+        now = time.monotonic()
+        with self._mutex:
+            if len(self._entries) >= MAX_MEMORY_ENTRIES:
+                self._entries = {k: e for k, e in self._entries.items() if e[0] > now}
+            self._entries[key] = (now + ttl, value)
+
+    def lock(self, key: str):
+        return nullcontext()
+
+
+class SQLiteBackend:
+    """Values stored as JSON; response models parse the datetimes back on the way out."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+        self._lock_fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600) if fcntl else None
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def get(self, key: str):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM result_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def set(self, key: str, value, ttl: float) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(value), now + ttl),
+            )
+            conn.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,))
+
+    @contextmanager
+    def lock(self, key: str):
+        """Exclusive byte-range lock on a slot of the lock file, held across processes."""
+        if self._lock_fd is None:
+            yield
+            return
+        slot = int(key[:8], 16) % LOCK_SLOTS
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, slot)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, slot)
+
+
+class ResultCache:
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self._key_locks: dict[str, threading.Lock] = {}
+        self._mutex = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._mutex:
+            if len(self._key_locks) >= MAX_MEMORY_ENTRIES:
+                self._key_locks = {k: l for k, l in self._key_locks.items() if l.locked()}
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get_or_compute(self, parts: tuple, compute: Callable[[], object]):
+        if self.backend is None:
+            return compute()
+        key = hashlib.sha1(repr(parts).encode()).hexdigest()
+        value = self.backend.get(key)
+        if value is not None:
+            return value
+        # Threads of this worker queue on the key lock, other workers on the backend lock;
+        # whoever gets in second finds the first caller's result.
+        with self._key_lock(key), self.backend.lock(key):
+            value = self.backend.get(key)
+            if value is None:
+                value = compute()
+                self.backend.set(key, value, self.ttl)
+        return value
+
+
+def build_backend(name: str):
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(RESULT_CACHE_PATH)
+    if name == "off":
+        return None
+    raise RuntimeError(f"Unknown RESULT_CACHE_BACKEND '{name}' (memory, sqlite or off)")
+
+
+result_cache = ResultCache(build_backend(RESULT_CACHE_BACKEND), RESULT_CACHE_TTL)
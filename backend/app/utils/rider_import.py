@@ -0,0 +1,70 @@
+import csv
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+
+from fastapi import HTTPException, UploadFile
+from passlib.hash import bcrypt
+
+from app.config import IMPORT_BCRYPT_ROUNDS, IMPORT_HASH_WORKERS
+
+IMPORT_COLUMNS = ("username", "name", "password", "store", "sub_admin_id")
+
+
+def iter_rows(upload: UploadFile) -> Iterator[tuple[int, dict]]:
+    """
+    Stream (row number, {column: value}) from an uploaded CSV or XLSX file.
+    Header names are matched case-insensitively; row numbers match the sheet
+    (the header is row 1).
+    """
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".csv"):
+        text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+        reader = csv.reader(text)
+    elif filename.endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(upload.file, read_only=True, data_only=True)
+        reader = workbook.active.iter_rows(values_only=True)
+    else:
+        raise HTTPException(status_code=400, detail="Upload a .csv or .xlsx file")
+
+    header = next(reader, None)
+    if not header:
+        raise HTTPException(status_code=400, detail="File is empty")
+    keys = [str(h or "").strip().lower() for h in header]
+    missing = {"username", "name", "password", "store"} - set(keys)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {', '.join(sorted(missing))}")
+
+    for line_no, values in enumerate(reader, start=2):
+        row = {
+            key: ("" if value is None else str(value).strip())
+            for key, value in zip(keys, values)
+            if key in IMPORT_COLUMNS
+        }
+        if any(row.values()):
+            yield line_no, row
+
+
+# One pool for the life of the process. bcrypt releases the GIL while it hashes,
+# so threads use every core without forking next to the scheduler and writer threads.
+_hash_pool = ThreadPoolExecutor(
+    max_workers=IMPORT_HASH_WORKERS or os.cpu_count() or 1,
+    thread_name_prefix="import-bcrypt",
+)
+
+
+def _hash_password(password: str) -> str:
+    return bcrypt.using(rounds=IMPORT_BCRYPT_ROUNDS).hash(password)
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """
+    bcrypt every password with its own salt on the shared hashing pool.
+    Returns the hashes in input order.
+    """
+    if len(passwords) < 8:
+        return [_hash_password(p) for p in passwords]
+    return list(_hash_pool.map(_hash_password, passwords))
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models import RiderCurrentStatus, RiderStatus, User
+from app.utils.change_version import bump, bump_for_rider, scopes_for_riders
+from app.utils.status_codes import ensure_status
+from app.utils.upsert import upsert
+
+OFFLINE = "offline"
+OFFLINE_CHUNK = 1000  # rider ids per UPDATE ... IN (...)
+
+
+def record_status(db: Session, rider: User, status: str, at: datetime | None = None) -> None:
+    """Append to the status history and move the rider's current-status row with it."""
+    at = at or datetime.utcnow()
+    ensure_status(db, status)
+    db.add(RiderStatus(rider_id=rider.id, status=status, updated_at=at))
+    upsert(
+        db,
+        RiderCurrentStatus.__table__,
+        [{"rider_id": rider.id, "status": status, "updated_at": at}],
+        conflict_columns=["rider_id"],
+        update_columns=["status", "updated_at"],
+    )
+    bump_for_rider(db, rider)
+
+
+def mark_offline(db: Session, rider_ids, stale_before: datetime, at: datetime | None = None) -> list[int]:
+    """
+    Bulk `offline` transition for riders whose current status is not offline and was set
+    before stale_before (a status written since then wins). One UPDATE and one history
+    INSERT per chunk; returns the riders actually moved. The caller commits.
+    """
+    at = at or datetime.utcnow()
+    rcs = RiderCurrentStatus.__table__
+    returning = db.get_bind().dialect.update_returning
+    rider_ids = list(rider_ids)
+    moved: list[int] = []
+    for i in range(0, len(rider_ids), OFFLINE_CHUNK):
+        chunk = rider_ids[i:i + OFFLINE_CHUNK]
+        stale = (rcs.c.rider_id.in_(chunk), rcs.c.status != OFFLINE, rcs.c.updated_at < stale_before)
+        if returning:
+            moved += db.execute(
+                update(rcs).where(*stale).values(status=OFFLINE, updated_at=at).returning(rcs.c.rider_id)
+            ).scalars().all()
+        else:
+            ids = db.execute(select(rcs.c.rider_id).where(*stale).with_for_update()).scalars().all()
+            if ids:
+                db.execute(update(rcs).where(rcs.c.rider_id.in_(ids)).values(status=OFFLINE, updated_at=at))
+            moved += ids
+    if moved:
+        db.execute(insert(RiderStatus), [{"rider_id": rid, "status": OFFLINE, "updated_at": at} for rid in moved])
+        bump(db, scopes_for_riders(db, moved))
+    return moved
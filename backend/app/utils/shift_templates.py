@@ -0,0 +1,57 @@
+import heapq
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator
+
+
+def occurrences(
+    template,
+    skip: set[date],
+    range_start: datetime,
+    range_end: datetime,
+) -> Iterator[dict]:
+    """
+    Shifts generated by one template that start in [range_start, range_end), in order.
+    Days already materialized as real rows and exception days are skipped.
+    """
+    first = max(range_start.date(), template.effective_from)
+    materialized_from = template.materialized_from or date.min
+    materialized_until = template.materialized_until or date.min
+    if materialized_from <= first <= materialized_until:
+        first = materialized_until + timedelta(days=1)
+    last = range_end.date()
+    if template.effective_to and template.effective_to < last:
+        last = template.effective_to
+
+    overnight = template.end_time <= template.start_time
+    day = first + timedelta(days=(template.weekday - first.weekday()) % 7)
+    while day <= last:
+        start = datetime.combine(day, template.start_time)
+        materialized = materialized_from <= day <= materialized_until
+        if not materialized and day not in skip and range_start <= start < range_end:
+            end = datetime.combine(day + timedelta(days=1) if overnight else day, template.end_time)
+            yield {
+                "id": None,
+                "rider_id": template.rider_id,
+                "start_time": start,
+                "end_time": end,
+                "template_id": template.id,
+            }
+        day += timedelta(days=7)
+
+
+def merged_occurrences(
+    templates: Iterable,
+    skip_by_template: dict[int, set[date]],
+    range_start: datetime,
+    range_end: datetime,
+) -> Iterator[dict]:
+    """
+    All templates' occurrences as one stream ordered by (start_time, template_id).
+    Each template is a lazy generator, so callers that stop early (a page of
+    results) only pay for what they consume.
+    """
+    streams = [
+        occurrences(t, skip_by_template.get(t.id, set()), range_start, range_end)
+        for t in templates
+    ]
+    return heapq.merge(*streams, key=lambda s: (s["start_time"], s["template_id"]))
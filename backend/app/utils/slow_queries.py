@@ -0,0 +1,195 @@
+"""
+Slow-query log (SLOW_QUERY_MS, 0 disables).
+
+Every statement slower than the threshold is appended as one JSON line to a
+rotating file with its normalized SQL, the shape of its bind parameters
+(types and list lengths, never values), the route that issued it and its
+duration. On Postgres a plain SELECT also gets an EXPLAIN (ANALYZE, BUFFERS)
+at most SLOW_QUERY_EXPLAIN_PER_MINUTE times a minute per process, and once
+per statement shape per minute, since ANALYZE runs the statement again.
+The plan is taken on the same connection inside a savepoint, so it sees the
+request's own snapshot and a failure cannot abort its transaction.
+
+GET /admin/slow-queries reads the newest entries back. With several workers
+all of them append to the same file; rotation is per process and may race,
+which at worst loses a few lines.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy import event
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.config import (
+    SLOW_QUERY_EXPLAIN_PER_MINUTE,
+    SLOW_QUERY_LOG_BACKUPS,
+    SLOW_QUERY_LOG_MAX_BYTES,
+    SLOW_QUERY_LOG_PATH,
+    SLOW_QUERY_MS,
+)
+from app.utils.metrics import route_label
+from app.utils.query_diagnostics import normalize
+
+EXPLAIN_WINDOW = 60.0
+
+_scope: ContextVar[Scope | None] = ContextVar("slow_query_scope", default=None)
+_logger = logging.getLogger("riderapp.slow_queries")
+
+
+def param_shape(parameters, executemany: bool = False):
+    """Types and sizes of the bind parameters, e.g. {"id_1": "int", "ids": "tuple[37]"}."""
+    if executemany and isinstance(parameters, (list, tuple)):
+        first = param_shape(parameters[0]) if parameters else None
+        return {"rows": len(parameters), "each": first}
+    if isinstance(parameters, dict):
+        return {key: _value_shape(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [_value_shape(value) for value in parameters]
+    return None
+
+
+def _value_shape(value) -> str:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+class ExplainLimiter:
+    """Global per-process rate limit plus a per-shape cooldown, both over EXPLAIN_WINDOW."""
+
+    def __init__(self, per_window: int):
+        self.per_window = per_window
+        self._recent: deque[float] = deque()
+        self._by_shape: dict[str, float] = {}
+        self._mutex = threading.Lock()
+
+    def allow(self, shape: str) -> bool:
+        if self.per_window <= 0:
+            return False
+        now = time.monotonic()
+        with self._mutex:
+            while self._recent and now - self._recent[0] >= EXPLAIN_WINDOW:
+                self._recent.popleft()
+            if len(self._recent) >= self.per_window:
+                return False
+            if now - self._by_shape.get(shape, -EXPLAIN_WINDOW) < EXPLAIN_WINDOW:
+                return False
+            if len(self._by_shape) > 1024:
+                self._by_shape = {s: t for s, t in self._by_shape.items() if now - t < EXPLAIN_WINDOW}
+            self._recent.append(now)
+            self._by_shape[shape] = now
+            return True
+
+
+def _explain(cursor, statement: str, parameters) -> list[str] | str:
+    explain = cursor.connection.cursor()
+    try:
+        explain.execute("SAVEPOINT slow_query_explain")
+        try:
+            explain.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            plan = [row[0] for row in explain.fetchall()]
+        except Exception as exc:
+            explain.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return f"EXPLAIN failed: {exc}"
+        explain.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+    finally:
+        explain.close()
+
+
+def _configure_logger() -> None:
+    if _logger.handlers:
+        return
+    directory = os.path.dirname(SLOW_QUERY_LOG_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = RotatingFileHandler(
+        SLOW_QUERY_LOG_PATH, maxBytes=SLOW_QUERY_LOG_MAX_BYTES, backupCount=SLOW_QUERY_LOG_BACKUPS
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+def instrument_engine(engine) -> None:
+    _configure_logger()
+    threshold = SLOW_QUERY_MS / 1000
+    limiter = ExplainLimiter(SLOW_QUERY_EXPLAIN_PER_MINUTE)
+    can_explain = engine.dialect.name == "postgresql"
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context.slow_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.slow_query_start
+        if elapsed < threshold:
+            return
+        scope = _scope.get()
+        shape = normalize(statement)
+        entry = {
+            "at": datetime.utcnow().isoformat(timespec="milliseconds"),
+            "ms": round(elapsed * 1000, 1),
+            "route": f"{scope['method']} {route_label(scope)}" if scope else None,
+            "sql": shape,
+            "params": param_shape(parameters, executemany),
+            "rows": cursor.rowcount if cursor.rowcount >= 0 else None,
+            "pid": os.getpid(),
+        }
+        if (
+            can_explain
+            and not executemany
+            and statement.lstrip()[:6].upper() == "SELECT"
+            and limiter.allow(shape)
+        ):
+            entry["plan"] = _explain(cursor, statement, parameters)
+        _logger.info(json.dumps(entry, default=str))
+
+
+def read_entries(limit: int, route: str | None = None, min_ms: float = 0) -> list[dict]:
+    """Newest entries first, across the current file and its rotated backups."""
+    entries: list[dict] = []
+    paths = [SLOW_QUERY_LOG_PATH] + [f"{SLOW_QUERY_LOG_PATH}.{n}" for n in range(1, SLOW_QUERY_LOG_BACKUPS + 1)]
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                lines = fh.readlines()
+        except FileNotFoundError:
+            continue
+        for line in reversed(lines):
+            try:
+                entry = json.loads(line)
+            except ValueError:  # a line cut short by a concurrent write or rotation
+                continue
+            if entry["ms"] < min_ms or (route and route not in (entry.get("route") or "")):
+                continue
+            entries.append(entry)
+            if len(entries) >= limit:
+                return entries
+    return entries
+
+
+class SlowQueryMiddleware:
+    """Makes the request scope visible to the engine hook; the router fills in scope['route']."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _scope.reset(token)
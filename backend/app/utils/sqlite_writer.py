@@ -0,0 +1,111 @@
+"""
+Tuned SQLite profile (SQLITE_PROFILE=tuned) for single-store deployments.
+
+Every connection gets WAL journaling (readers and the writer no longer block
+each other), synchronous=NORMAL (fsync at checkpoints instead of on every
+commit: a power cut can lose the last commits but not corrupt the file), a
+busy timeout so a locked database is waited for rather than an error, and a
+memory-mapped read window.
+
+SQLite has one writer at a time however many connections are open, and most
+of a small write's cost is its commit. The rider app's hot writes (status
+changes and location pings, via app.database.run_write) therefore go to
+WriteQueue: one thread on one connection takes every job queued so far, runs
+each in its own savepoint and commits them all at once, so under load a few
+dozen pings share one commit. A job that raises rolls back only its
+savepoint and the exception is re-raised to its caller. Request sessions
+stay on the regular pool, which serves as the reader pool.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+def tune_connections(engine, busy_timeout_ms: int, mmap_size: int) -> None:
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        cursor.close()
+
+
+def immediate_transactions(engine) -> None:
+    """
+    Start transactions with BEGIN IMMEDIATE: the write lock is taken (or waited
+    for) up front instead of failing when a read transaction tries to upgrade
+    after another connection has committed.
+    """
+    @event.listens_for(engine, "connect")
+    def _driver_autocommit(dbapi_conn, record):
+        dbapi_conn.isolation_level = None  # SQLAlchemy emits BEGIN itself
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class WriteQueue:
+    def __init__(self, engine, max_batch: int):
+        self.engine = engine
+        self.max_batch = max(1, max_batch)
+        self._jobs: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, fn):
+        """Run fn(session) on the writer, committed together with whatever else is queued; returns its result."""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+                    self._thread.start()
+        future = Future()
+        self._jobs.put((fn, future))
+        return future.result()
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._jobs.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._run(batch)
+            except Exception as exc:  # pragma: no cover - keep the writer alive
+                print(f"[sqlite-writer] batch failed: {exc}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def _run(self, batch) -> None:
+        session = Session(bind=self.engine, expire_on_commit=False)
+        done = []
+        try:
+            for fn, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    with session.begin_nested():
+                        result = fn(session)
+                except Exception as exc:
+                    future.set_exception(exc)
+                else:
+                    done.append((future, result))
+            session.commit()
+        except Exception as exc:
+            session.rollback()
+            for future, _ in done:
+                future.set_exception(exc)
+            return
+        finally:
+            session.close()
+        for future, result in done:
+            future.set_result(result)
@@ -0,0 +1,173 @@
+"""
+Compact storage of rider statuses: SMALLINT codes plus a status_codes lookup table.
+
+rider_status and rider_current_status keep the code in `status_code`; the
+StatusCodeType column type converts on the way in and out, so ORM and Core
+code keeps writing, comparing and reading status strings
+(RiderStatus.status == "available" binds 1, rows come back as "available").
+
+Known statuses have fixed codes, numbered in alphabetical order so that
+sorting by code sorts by name. Any other status the app sends gets the next
+free code from ensure_status() before it is written; other processes pick
+it up from the table on their first miss.
+
+While a database is mid-migration (app.jobs.status_code_migration), history
+rows not backfilled yet have only the legacy VARCHAR `status`. For the tables
+listed in legacy_fallback, StatusCodeType selects the legacy value wherever
+status_code is still NULL, so readers see every row's status throughout.
+"""
+import threading
+import time
+
+from sqlalchemy import SmallInteger, String, Table, case, cast, literal, text, type_coerce
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ColumnClause
+from sqlalchemy.types import TypeDecorator
+
+BUILTIN_CODES = {
+    "available": 1,
+    "available_for_delivery": 2,
+    "break": 3,
+    "delivery": 4,
+    "off_for_delivery": 5,
+    "offline": 6,
+    "online": 7,
+}
+UNKNOWN_CODE = -1  # what a never-written name binds to in filters: matches no row
+REFRESH_SECONDS = 1.0  # at most one lookup-table reload per second on misses
+ALLOCATE_ATTEMPTS = 5
+BACKFILL_CHECKPOINT = "status_codes:backfilled_below"  # rider_status ids below this are not converted yet
+LEGACY_COLUMN = "status"
+CODE_PREFIX = ":"  # marks a code (rather than a legacy name) in fallback results
+
+# Tables whose legacy column readers fall back to; set once at startup by the
+# migration's expand() and fixed for the life of the process (compiled
+# statements are cached).
+legacy_fallback: set[str] = set()
+
+
+class StatusRegistry:
+    """Process-wide name <-> code map, reloaded from status_codes on a miss."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_name = dict(BUILTIN_CODES)
+        self._by_code = {code: name for name, code in BUILTIN_CODES.items()}
+        self._refreshed = 0.0
+
+    def add(self, code: int, name: str) -> None:
+        with self._lock:
+            self._by_name[name] = code
+            self._by_code[code] = name
+
+    def refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._refreshed < REFRESH_SECONDS:
+            return
+        self._refreshed = now
+        from app.database import engine
+
+        with engine.connect() as conn:
+            rows = conn.execute(text("SELECT code, name FROM status_codes")).all()
+        for code, name in rows:
+            self.add(code, name)
+
+    def code(self, name: str) -> int | None:
+        if name not in self._by_name:
+            self.refresh()
+        return self._by_name.get(name)
+
+    def name(self, code: int) -> str:
+        if code not in self._by_code:
+            self.refresh()
+        return self._by_code.get(code, f"#{code}")
+
+    def items(self) -> list[tuple[str, int]]:
+        with self._lock:
+            return list(self._by_name.items())
+
+
+registry = StatusRegistry()
+
+
+class StatusCodeType(TypeDecorator):
+    """SMALLINT column read and written as the status name."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        code = registry.code(value)
+        return UNKNOWN_CODE if code is None else code
+
+    def column_expression(self, colexpr):
+        table = getattr(colexpr, "table", None)
+        base = getattr(table, "element", table)  # aliases of the table too, but not subqueries
+        if not (isinstance(colexpr, ColumnClause) and isinstance(base, Table) and base.name in legacy_fallback):
+            return colexpr
+        legacy = ColumnClause(LEGACY_COLUMN, String(50), _selectable=table)
+        expr = case((colexpr.is_(None), legacy), else_=literal(CODE_PREFIX) + cast(colexpr, String(50)))
+        return type_coerce(expr, self)  # results still go through process_result_value
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):  # legacy fallback
+            return registry.name(int(value[1:])) if value.startswith(CODE_PREFIX) else value
+        return registry.name(value)
+
+
+def ensure_status(db: Session, name: str) -> int:
+    """
+    Code for `name`, adding it to status_codes (in the caller's transaction) when new.
+    Call before writing a status that does not come from BUILTIN_CODES.
+    """
+    if name in BUILTIN_CODES:
+        return BUILTIN_CODES[name]
+    # Always read it back: a cached code may come from a transaction that rolled back.
+    for _ in range(ALLOCATE_ATTEMPTS):
+        row = db.execute(text("SELECT code FROM status_codes WHERE name = :name"), {"name": name}).first()
+        if row is not None:
+            registry.add(row.code, name)
+            return row.code
+        try:
+            with db.begin_nested():
+                db.execute(
+                    text(
+                        "INSERT INTO status_codes (code, name) "
+                        "SELECT COALESCE(MAX(code), 0) + 1, :name FROM status_codes"
+                    ),
+                    {"name": name},
+                )
+        except IntegrityError:
+            continue  # a concurrent writer took that code (or added the name); look again
+    raise RuntimeError(f"Could not allocate a status code for '{name}'")
+
+
+def seed_builtin_codes(db: Session) -> None:
+    from app.models import StatusCode
+    from app.utils.upsert import upsert
+
+    upsert(
+        db,
+        StatusCode.__table__,
+        [{"code": code, "name": name} for name, code in BUILTIN_CODES.items()],
+        conflict_columns=["code"],
+        update_columns=[],
+    )
+
+
+def backfill_pending(db: Session) -> bool:
+    """True while the rider_status backfill has rows left to convert."""
+    row = db.execute(
+        text("SELECT position FROM job_checkpoints WHERE name = :name"), {"name": BACKFILL_CHECKPOINT}
+    ).first()
+    return row is not None and row.position > 0
+
+
+def code_case(column):
+    """SQL CASE mapping a legacy status string column to its code (names must be registered)."""
+    return case({name: code for name, code in registry.items()}, value=column, else_=None)
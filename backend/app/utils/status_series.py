@@ -0,0 +1,150 @@
+"""
+Fleet status counts over time (active / available / delivery / break) for dashboard charts.
+
+A series has a point at every bucket boundary in the window (boundaries are
+multiples of the bucket since the epoch, so every scope shares them) holding
+the counts at that instant, plus a last point for now. It is built in one
+sweep: the riders' states at the window start (time_in_state.state_at), then
+the window's rider_status rows in time order, snapshotting the running
+counts at each boundary.
+
+Built series are kept per scope in process memory and advanced on the next
+poll instead of recomputed: only rider_status rows past the series' id
+high-water mark are read, new boundaries are appended and those that fell
+out of the window dropped. A series is rebuilt when the scope's riders
+change, when a new row is older than the last boundary (a late upload) and
+at least every REBUILD_SECONDS, which also picks up rows whose ids committed
+out of order.
+"""
+import threading
+import time as time_mod
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Query, Session
+
+from app.models import RiderStatus
+from app.utils.rider_status import OFFLINE
+from app.utils.time_in_state import rolled_days, state_at
+
+COUNTED = ("available", "delivery", "break")
+REBUILD_SECONDS = 600
+MAX_SERIES = 256
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def align_up(at: datetime, bucket: timedelta) -> datetime:
+    """First bucket boundary at or after `at`."""
+    return EPOCH - ((EPOCH - at) // bucket) * bucket
+
+
+class StatusSeries:
+    def __init__(self, window: timedelta, bucket: timedelta, rider_ids: frozenset[int]):
+        self.window = window
+        self.bucket = bucket
+        self.rider_ids = rider_ids
+        self.lock = threading.Lock()
+        self.state: dict[int, str] = {}
+        self.counts: Counter = Counter()
+        self.points: deque[tuple[datetime, dict]] = deque()
+        self.next_boundary: datetime | None = None
+        self.mark = 0  # last rider_status id applied
+        self.built_at = 0.0
+
+    def _apply(self, rider_id: int, status: str) -> None:
+        previous = self.state.get(rider_id)
+        if previous is not None:
+            self.counts[previous] -= 1
+        self.state[rider_id] = status
+        self.counts[status] += 1
+
+    def _snapshot(self) -> dict:
+        return {
+            "active": sum(n for status, n in self.counts.items() if status != OFFLINE),
+            **{status: self.counts[status] for status in COUNTED},
+        }
+
+    def _sweep(self, events, now: datetime) -> None:
+        """Apply (at, rider_id, status) events in time order, snapshotting each boundary passed."""
+        for at, rider_id, status in events:
+            while self.next_boundary <= at:
+                self.points.append((self.next_boundary, self._snapshot()))
+                self.next_boundary += self.bucket
+            self._apply(rider_id, status)
+        while self.next_boundary <= now:
+            self.points.append((self.next_boundary, self._snapshot()))
+            self.next_boundary += self.bucket
+        while self.points and self.points[0][0] < now - self.window:
+            self.points.popleft()
+
+    def build(self, db: Session, riders: Query, now: datetime) -> None:
+        start = now - self.window
+        # Mark first and sweep only rows up to it; later rows are the next advance's.
+        self.mark = db.query(func.coalesce(func.max(RiderStatus.id), 0)).scalar()
+        self.state, self.counts = {}, Counter()
+        for rider_id, status in state_at(db, start, riders, self.rider_ids, rolled_days(db)).items():
+            self._apply(rider_id, status)
+        self.points = deque()
+        self.next_boundary = align_up(start, self.bucket)
+        rows = (
+            db.query(RiderStatus.updated_at, RiderStatus.rider_id, RiderStatus.status)
+            .filter(RiderStatus.updated_at >= start, RiderStatus.updated_at <= now, RiderStatus.id <= self.mark)
+            .order_by(RiderStatus.updated_at, RiderStatus.id)
+        )
+        self._sweep((r for r in rows if r.rider_id in self.rider_ids), now)
+        self.built_at = time_mod.monotonic()
+
+    def advance(self, db: Session, now: datetime) -> bool:
+        """Apply rows past the mark; False when the series has to be rebuilt instead."""
+        if time_mod.monotonic() - self.built_at > REBUILD_SECONDS:
+            return False
+        rows = (
+            db.query(RiderStatus.id, RiderStatus.updated_at, RiderStatus.rider_id, RiderStatus.status)
+            .filter(RiderStatus.id > self.mark)
+            .order_by(RiderStatus.id)
+            .all()
+        )
+        if not rows:
+            self._sweep((), now)
+            return True
+        last_boundary = self.next_boundary - self.bucket
+        events = [
+            (r.updated_at, r.id, r.rider_id, r.status)
+            for r in rows
+            if r.rider_id in self.rider_ids and r.updated_at is not None
+        ]
+        if any(at < last_boundary for at, *_ in events):
+            return False
+        events.sort()
+        self._sweep(((at, rider_id, status) for at, _, rider_id, status in events), now)
+        self.mark = rows[-1].id
+        return True
+
+    def render(self, now: datetime) -> list[dict]:
+        return [{"at": at, **counts} for at, counts in self.points] + [{"at": now, **self._snapshot()}]
+
+
+_series: "OrderedDict[tuple, StatusSeries]" = OrderedDict()
+_mutex = threading.Lock()
+
+
+def fleet_series(db: Session, key: tuple, riders: Query, window: timedelta, bucket: timedelta) -> list[dict]:
+    """Points of the scope's series (`key` names the scope, `riders` is its IN-able rider id query)."""
+    rider_ids = frozenset(r.id for r in riders)
+    key = (key, window, bucket)
+    with _mutex:
+        series = _series.get(key)
+        if series is None or series.rider_ids != rider_ids:
+            series = StatusSeries(window, bucket, rider_ids)
+            _series[key] = series
+            while len(_series) > MAX_SERIES:
+                _series.popitem(last=False)
+        _series.move_to_end(key)
+
+    now = datetime.utcnow()
+    with series.lock:
+        if series.next_boundary is None or not series.advance(db, now):
+            series.build(db, riders, now)
+        return series.render(now)
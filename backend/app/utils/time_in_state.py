@@ -0,0 +1,188 @@
+"""
+Seconds each rider spent per status over a window.
+
+Complete days already closed by the daily rollups are summed from
+rider_daily_rollups in SQL; only the partial days at the window's edges (and
+days not rolled up yet, such as today) are swept from rider_status: one
+ordered read of the transitions, each state lasting until the next one and
+clipped to the window. The state at a sweep's start comes from the previous
+day's rollup end_status plus that day's earlier rows, so no unbounded scan
+of the history is needed once the rollups cover it.
+
+With `within_shifts`, every interval is also clipped to the rider's shifts
+(stored or generated from templates). The rollups do not split days by
+shift, so then the whole window is swept.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.orm import Query, Session
+
+from app.jobs.attendance_derivation import shift_windows
+from app.jobs.daily_rollups import CLOSED_CHECKPOINT, FIRST_DAY_CHECKPOINT, raw_carry_in
+from app.models import JobCheckpoint, RiderDailyRollup, RiderStatus
+from app.utils.rider_status import OFFLINE
+
+STATES = ("available", "delivery", "break")
+OTHER = "other"  # any other non-offline status
+
+
+def rolled_days(db: Session) -> tuple[date, date] | None:
+    """(first, last) day covered by the rollups, or None before the first run."""
+    first = db.get(JobCheckpoint, FIRST_DAY_CHECKPOINT)
+    closed = db.get(JobCheckpoint, CLOSED_CHECKPOINT)
+    if not first or not closed or closed.position < first.position:
+        return None
+    return date.fromordinal(first.position), date.fromordinal(closed.position)
+
+
+def state_at(db: Session, at: datetime, riders: Query, wanted: set[int], rolled) -> dict[int, str]:
+    """Each rider's status at `at`: the rollup end_status of the day before, then that day's rows up to `at`."""
+    midnight = datetime.combine(at.date(), time.min)
+    previous = at.date() - timedelta(days=1)
+    if rolled and rolled[0] <= previous <= rolled[1]:
+        state = dict(
+            db.query(RiderDailyRollup.rider_id, RiderDailyRollup.end_status)
+            .filter(RiderDailyRollup.day == previous, RiderDailyRollup.rider_id.in_(riders))
+            .all()
+        )
+    else:
+        state = raw_carry_in(db, midnight, riders)
+    if at > midnight:
+        for rider_id, status in (
+            db.query(RiderStatus.rider_id, RiderStatus.status)
+            .filter(RiderStatus.updated_at >= midnight, RiderStatus.updated_at < at)
+            .order_by(RiderStatus.updated_at, RiderStatus.id)
+        ):
+            if rider_id in wanted:
+                state[rider_id] = status
+    return state
+
+
+def _overlap(windows: tuple[list, list] | None, start: datetime, end: datetime) -> float:
+    """Seconds of [start, end) inside the rider's (sorted, non-overlapping) shifts."""
+    if windows is None:
+        return 0.0
+    starts, spans = windows
+    total = 0.0
+    i = max(bisect_right(starts, start) - 1, 0)
+    while i < len(spans) and spans[i][0] < end:
+        s, e = max(spans[i][0], start), min(spans[i][1], end)
+        if e > s:
+            total += (e - s).total_seconds()
+        i += 1
+    return total
+
+
+def _merged(windows: dict) -> dict:
+    """Shift windows with overlapping shifts merged, so no time is counted twice."""
+    merged = {}
+    for rider_id, (_, spans) in windows.items():
+        out: list[tuple[datetime, datetime]] = []
+        for s, e in spans:
+            if out and s <= out[-1][1]:
+                out[-1] = (out[-1][0], max(out[-1][1], e))
+            else:
+                out.append((s, e))
+        merged[rider_id] = ([s for s, _ in out], out)
+    return merged
+
+
+def _sweep(db, riders, wanted, start, end, rolled, totals, shifts=None) -> None:
+    """Add each rider's seconds per status in [start, end) (inside shifts, when given) to totals."""
+    state = state_at(db, start, riders, wanted, rolled)
+    since = {rider_id: start for rider_id in state}
+
+    def close(rider_id, until):
+        status = state.get(rider_id)
+        if status is None or status == OFFLINE:
+            return
+        began = since[rider_id]
+        if shifts is not None:
+            seconds = _overlap(shifts.get(rider_id), began, until)
+        else:
+            seconds = (until - began).total_seconds()
+        totals[rider_id][status if status in STATES else OTHER] += seconds
+
+    # Rows are picked by time only: with `rider_id IN (...)` planners walk the rider_id
+    # index through every rider's whole history instead of the day's updated_at range.
+    for rider_id, status, at in (
+        db.query(RiderStatus.rider_id, RiderStatus.status, RiderStatus.updated_at)
+        .filter(RiderStatus.updated_at >= start, RiderStatus.updated_at < end)
+        .order_by(RiderStatus.updated_at, RiderStatus.id)
+    ):
+        if rider_id not in wanted:
+            continue
+        if rider_id in state:
+            close(rider_id, at)
+        state[rider_id], since[rider_id] = status, at
+    for rider_id in state:
+        close(rider_id, end)
+
+
+def time_in_state(
+    db: Session,
+    riders: Query,
+    rider_ids: list[int],
+    start: datetime,
+    end: datetime,
+    within_shifts: bool = False,
+) -> dict[int, dict[str, float]]:
+    """
+    Per rider id in rider_ids (`riders` is the same set as an IN-able query):
+    seconds available / delivery / break / other / offline, and `total`, the
+    time considered (the window, or the rider's shift time inside it).
+    Offline is whatever part of `total` the rider was not online.
+    """
+    totals: dict[int, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    wanted = set(rider_ids)
+    window = (end - start).total_seconds()
+    capacity = {rider_id: window for rider_id in rider_ids}
+
+    if within_shifts:
+        shifts = _merged(shift_windows(db, wanted, start, end)) if rider_ids else {}
+        capacity = {rider_id: _overlap(shifts.get(rider_id), start, end) for rider_id in rider_ids}
+        _sweep(db, riders, wanted, start, end, rolled_days(db), totals, shifts)
+    else:
+        rolled = rolled_days(db)
+        first_full = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+        last_full = end.date() - timedelta(days=1)
+        if rolled:
+            first_full = max(first_full, rolled[0])
+            last_full = min(last_full, rolled[1])
+        if rolled and first_full <= last_full:
+            full_start = datetime.combine(first_full, time.min)
+            full_end = datetime.combine(last_full + timedelta(days=1), time.min)
+            r = RiderDailyRollup
+            for row in (
+                db.query(
+                    r.rider_id,
+                    func.sum(r.seconds_online).label("online"),
+                    func.sum(r.seconds_available).label("available"),
+                    func.sum(r.seconds_delivery).label("delivery"),
+                    func.sum(r.seconds_break).label("break"),
+                )
+                .filter(r.day >= first_full, r.day <= last_full, r.rider_id.in_(riders))
+                .group_by(r.rider_id)
+            ):
+                rider_totals = totals[row.rider_id]
+                for status in STATES:
+                    rider_totals[status] += getattr(row, status) or 0
+                rider_totals[OTHER] += (row.online or 0) - sum(getattr(row, s) or 0 for s in STATES)
+            if start < full_start:
+                _sweep(db, riders, wanted, start, full_start, rolled, totals)
+            if full_end < end:
+                _sweep(db, riders, wanted, full_end, end, rolled, totals)
+        else:
+            _sweep(db, riders, wanted, start, end, rolled, totals)
+
+    result = {}
+    for rider_id in rider_ids:
+        rider_totals = totals.get(rider_id, {})
+        row = {status: round(rider_totals.get(status, 0.0)) for status in (*STATES, OTHER)}
+        row["total"] = round(capacity[rider_id])
+        row[OFFLINE] = max(row["total"] - sum(row[s] for s in (*STATES, OTHER)), 0)
+        result[rider_id] = row
+    return result
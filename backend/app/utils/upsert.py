@@ -0,0 +1,57 @@
+from sqlalchemy.orm import Session
+
+# Multi-row VALUES per statement; 5k rows x a handful of columns stays under
+# SQLite's 32766 and Postgres' 65535 bind-parameter limits.
+UPSERT_CHUNK = 5000
+
+
+def dialect_insert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect_name in {"mysql", "mariadb"}:
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        raise NotImplementedError(f"No native upsert for dialect '{dialect_name}'")
+    return insert
+
+
+def upsert(
+    db: Session,
+    table,
+    rows: list[dict],
+    conflict_columns: list[str],
+    update_columns: list[str],
+) -> int:
+    """
+    INSERT ... ON CONFLICT (conflict_columns) DO UPDATE SET update_columns, using the
+    bind's dialect (ON DUPLICATE KEY UPDATE on MySQL). Rows go out as multi-row VALUES
+    statements of up to UPSERT_CHUNK rows, so there is no read-then-write race.
+    With no update_columns, conflicting rows are left untouched (DO NOTHING / IGNORE).
+    Returns the affected row count reported by the driver.
+    """
+    if not rows:
+        return 0
+    dialect_name = db.get_bind().dialect.name
+    insert = dialect_insert(dialect_name)
+
+    affected = 0
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        stmt = insert(table).values(rows[i:i + UPSERT_CHUNK])
+        if not update_columns:
+            if dialect_name in {"mysql", "mariadb"}:
+                stmt = stmt.prefix_with("IGNORE")
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=conflict_columns)
+        elif dialect_name in {"mysql", "mariadb"}:
+            stmt = stmt.on_duplicate_key_update(
+                {col: stmt.inserted[col] for col in update_columns}
+            )
+        else:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=conflict_columns,
+                set_={col: stmt.excluded[col] for col in update_columns},
+            )
+        affected += db.execute(stmt).rowcount
+    return affected
@@ -0,0 +1,143 @@
+"""
+Serialization time and bytes on the wire for a 5k-rider admin payload.
+
+    cd backend && python -m benchmarks.bench_payload [--riders 5000] [--repeat 20]
+
+Compares the old path (isoformat() per row, stdlib json) with orjson, with
+the typed response model in front, and with gzip/brotli on top; then
+measures GET /admin/rider-status end to end for each Accept-Encoding.
+Runs against a throwaway SQLite file unless DATABASE_URL is already set.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_payload.db"
+)
+os.environ.setdefault("AUTO_SEED_ADMIN", "true")
+
+import orjson  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.config import PRIME_ADMIN_PASSWORD, PRIME_ADMIN_USERNAME  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import RiderCurrentStatus, RiderStatus, User  # noqa: E402
+from app.schemas import RiderListResponse  # noqa: E402
+from app.utils.compression import brotli, compress  # noqa: E402
+
+STATUSES = ("available", "delivery", "break", "offline")
+
+
+def build_items(n: int) -> list[dict]:
+    base = datetime(2030, 1, 7, 8, 0, 0, 123456)
+    return [
+        {
+            "id": i,
+            "username": f"bench_rider_{i}",
+            "name": f"Bench Rider {i}",
+            "manager_id": 1,
+            "store": f"store_{i % 10}",
+            "status": STATUSES[i % 4],
+            "updated_at": base + timedelta(seconds=i),
+        }
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat: int) -> tuple[float, bytes]:
+    best = float("inf")
+    out = b""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def seed(n: int) -> None:
+    db = SessionLocal()
+    prime = db.query(User).filter(User.username == PRIME_ADMIN_USERNAME).first()
+    db.execute(
+        insert(User),
+        [
+            {
+                "username": f"bench_rider_{i}",
+                "name": f"Bench Rider {i}",
+                "password": "x",
+                "role": "rider",
+                "store": f"store_{i % 10}",
+                "manager_id": prime.id,
+                "is_active": True,
+            }
+            for i in range(n)
+        ],
+    )
+    ids = [r.id for r in db.query(User.id).filter(User.username.like("bench_rider_%")).all()]
+    now = datetime.utcnow()
+    rows = [{"rider_id": rid, "status": STATUSES[rid % 4], "updated_at": now} for rid in ids]
+    db.execute(insert(RiderStatus), rows)
+    db.execute(insert(RiderCurrentStatus), rows)
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--riders", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    items = build_items(args.riders)
+    adapter = TypeAdapter(RiderListResponse)
+
+    def stdlib():
+        rows = [{**r, "updated_at": r["updated_at"].isoformat()} for r in items]
+        return json.dumps({"items": rows, "next_cursor": None}, ensure_ascii=False,
+                          separators=(",", ":")).encode()
+
+    def fast():
+        return orjson.dumps({"items": items, "next_cursor": None})
+
+    def typed():
+        model = adapter.validate_python({"items": items, "next_cursor": None})
+        return orjson.dumps(adapter.dump_python(model, mode="json"))
+
+    print(f"payload               {args.riders} riders, best of {args.repeat}")
+    for label, fn in (("isoformat + json", stdlib), ("orjson", fast), ("model + orjson", typed)):
+        seconds, body = timed(fn, args.repeat)
+        print(f"{label:<22}{seconds * 1000:8.2f} ms  {len(body):>9,} bytes")
+
+    body = fast()
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    for encoding in encodings:
+        seconds, packed = timed(lambda: compress(body, encoding), args.repeat)
+        print(f"{encoding + ' compress':<22}{seconds * 1000:8.2f} ms  {len(packed):>9,} bytes "
+              f"({len(packed) / len(body):.1%})")
+
+    with TestClient(app) as client:
+        seed(args.riders)
+        token = client.post(
+            "/auth/login",
+            json={"username": PRIME_ADMIN_USERNAME, "password": PRIME_ADMIN_PASSWORD},
+        ).json()["token"]
+        for encoding in ["identity"] + encodings:
+            headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": encoding}
+            best = float("inf")
+            for _ in range(max(1, args.repeat // 4)):
+                t0 = time.perf_counter()
+                res = client.get("/admin/rider-status", headers=headers)
+                best = min(best, time.perf_counter() - t0)
+            wire = int(res.headers["content-length"])
+            print(f"GET rider-status {encoding:<5}{best * 1000:8.2f} ms  {wire:>9,} bytes on the wire "
+                  f"({len(res.json()['items'])} items)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Throughput of POST /shifts/bulk for a 10k-shift weekly roster.
+
+    cd backend && python -m benchmarks.bench_roster [--riders 500] [--per-rider 20]
+
+Runs against a throwaway SQLite file unless DATABASE_URL is already set.
+Roughly 2% of the generated shifts deliberately overlap so the conflict
+path is exercised as well. Rosters above MAX_BULK_SHIFTS are posted in
+chunks of whole riders, as a client has to, and timed together.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_roster.db"
+)
+os.environ.setdefault("AUTO_SEED_ADMIN", "true")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.config import PRIME_ADMIN_PASSWORD, PRIME_ADMIN_USERNAME  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Shift, User  # noqa: E402
+from app.schemas import MAX_BULK_SHIFTS  # noqa: E402
+from app.utils.intervals import Interval, find_conflicts  # noqa: E402
+
+
+def build_roster(rider_ids: list[int], per_rider: int, seed: int = 7) -> list[dict]:
+    rnd = random.Random(seed)
+    week = datetime(2030, 1, 7, 8, 0)
+    shifts = []
+    for rid in rider_ids:
+        for n in range(per_rider):
+            # Two non-overlapping blocks per day, seven days a week (wraps after 14).
+            start = week + timedelta(days=(n // 2) % 7 + 7 * (n // 14), hours=6 * (n % 2))
+            end = start + timedelta(hours=5)
+            if rnd.random() < 0.02:
+                start += timedelta(hours=3)  # overlap the next block
+                end += timedelta(hours=3)
+            shifts.append(
+                {"rider_id": rid, "start_time": start.isoformat(), "end_time": end.isoformat()}
+            )
+    return shifts
+
+
+def chunks(roster: list[dict]) -> list[list[dict]]:
+    """Requests of at most MAX_BULK_SHIFTS shifts, never splitting a rider's shifts."""
+    by_rider: dict[int, list[dict]] = {}
+    for s in roster:
+        by_rider.setdefault(s["rider_id"], []).append(s)
+    out: list[list[dict]] = [[]]
+    for shifts in by_rider.values():
+        if out[-1] and len(out[-1]) + len(shifts) > MAX_BULK_SHIFTS:
+            out.append([])
+        out[-1].extend(shifts)
+    return out
+
+
+def post_roster(client, roster: list[dict], headers: dict) -> tuple[float, int, int]:
+    """(seconds, inserted, rejected) over all chunks."""
+    inserted = rejected = 0
+    t0 = time.perf_counter()
+    for chunk in chunks(roster):
+        res = client.post("/shifts/bulk", json={"shifts": chunk}, headers=headers)
+        res.raise_for_status()
+        body = res.json()
+        inserted += body["inserted"]
+        rejected += len(body["rejected"])
+    return time.perf_counter() - t0, inserted, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--riders", type=int, default=500)
+    parser.add_argument("--per-rider", type=int, default=20)
+    args = parser.parse_args()
+
+    with TestClient(app) as client:
+        db = SessionLocal()
+        prime = db.query(User).filter(User.username == PRIME_ADMIN_USERNAME).first()
+        db.execute(
+            insert(User),
+            [
+                {
+                    "username": f"bench_rider_{i}",
+                    "name": f"Bench Rider {i}",
+                    "password": "x",
+                    "role": "rider",
+                    "store": f"store_{i % 10}",
+                    "manager_id": prime.id,
+                    "is_active": True,
+                }
+                for i in range(args.riders)
+            ],
+        )
+        db.commit()
+        rider_ids = [
+            r.id for r in db.query(User.id).filter(User.username.like("bench_rider_%")).all()
+        ]
+        db.close()
+
+        roster = build_roster(rider_ids, args.per_rider)
+        token = client.post(
+            "/auth/login",
+            json={"username": PRIME_ADMIN_USERNAME, "password": PRIME_ADMIN_PASSWORD},
+        ).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # Sweep alone, no I/O.
+        candidates = [
+            Interval(s["rider_id"], datetime.fromisoformat(s["start_time"]),
+                     datetime.fromisoformat(s["end_time"]), i)
+            for i, s in enumerate(roster)
+        ]
+        t0 = time.perf_counter()
+        accepted, _ = find_conflicts([], candidates)
+        sweep = time.perf_counter() - t0
+
+        # End to end: validation, one window query, one bulk insert per request.
+        first, inserted, rejected = post_roster(client, roster, headers)
+
+        # Resubmitting the same roster: everything now overlaps stored shifts.
+        second, again_inserted, again_rejected = post_roster(client, roster, headers)
+
+        db = SessionLocal()
+        stored = db.query(Shift).count()
+        db.close()
+
+    n = len(roster)
+    print(f"roster size           {n} ({len(chunks(roster))} requests)")
+    print(f"sweep only            {sweep * 1000:8.1f} ms  ({n / sweep:,.0f} shifts/s, {len(accepted)} accepted)")
+    print(f"bulk insert (fresh)   {first * 1000:8.1f} ms  ({n / first:,.0f} shifts/s, "
+          f"{inserted} inserted, {rejected} rejected)")
+    print(f"bulk resubmit         {second * 1000:8.1f} ms  ({n / second:,.0f} shifts/s, "
+          f"{again_inserted} inserted, {again_rejected} rejected)")
+    print(f"rows in shifts        {stored}")
+
+
+if __name__ == "__main__":
+    main()
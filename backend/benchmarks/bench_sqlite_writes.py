@@ -0,0 +1,133 @@
+"""
+Concurrent rider write throughput on SQLite: SQLITE_PROFILE=default vs tuned.
+
+    cd backend && python -m benchmarks.bench_sqlite_writes [--riders 48] [--readers 8] [--seconds 20] [--workers 1]
+
+For each profile: a fresh SQLite file, the API under uvicorn (see
+benchmarks.load), one client thread per rider posting location pings with a
+status change every tenth request, as a fleet reconnecting at once does, and
+--readers threads polling GET /rider/queue meanwhile. Reports writes/s,
+failed writes (mostly "database is locked"), write latency p50/p95/p99 and
+reads/s.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from passlib.hash import bcrypt
+
+from benchmarks.load import percentile, start_server
+
+PASSWORD = "bench-pass"
+STATUSES = ("available", "delivery", "break")
+
+
+def add_riders(path: str, riders: int) -> list[str]:
+    password = bcrypt.using(rounds=4).hash(PASSWORD)
+    usernames = [f"bench_rider_{i}" for i in range(riders)]
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            "INSERT INTO users (username, password, name, role, store, is_active, created_at) "
+            "VALUES (?, ?, ?, 'rider', 'bench', 1, CURRENT_TIMESTAMP)",
+            [(u, password, u) for u in usernames],
+        )
+    return usernames
+
+
+def run_profile(profile: str, riders: int, readers: int, seconds: float, workers: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), "bench_sqlite_writes.db")
+    os.environ["SQLITE_PROFILE"] = profile
+    proc, base_url = start_server(f"sqlite:///{path}", workers)
+    try:
+        usernames = add_riders(path, riders)
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            tokens = [
+                client.post("/auth/login", json={"username": u, "password": PASSWORD}).json()["token"]
+                for u in usernames
+            ]
+
+        latencies: list[float] = []
+        errors = 0
+        reads = 0
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def rider(i: int) -> None:
+            nonlocal errors
+            rnd = random.Random(i)
+            headers = {"Authorization": f"Bearer {tokens[i]}"}
+            mine, failed = [], 0
+            with httpx.Client(base_url=base_url, timeout=60, headers=headers) as client:
+                n = 0
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    if n % 10 == 9:
+                        res = client.post("/rider/status", json={"status": rnd.choice(STATUSES)})
+                    else:
+                        res = client.post(
+                            "/tracking/location",
+                            params={"lat": 5.6 + rnd.random() / 100, "lng": -0.2 + rnd.random() / 100},
+                        )
+                    mine.append(time.perf_counter() - start)
+                    failed += res.status_code >= 400
+                    n += 1
+            with lock:
+                latencies.extend(mine)
+                errors += failed
+
+        def reader(i: int) -> None:
+            nonlocal reads
+            n = 0
+            headers = {"Authorization": f"Bearer {tokens[i % riders]}"}
+            with httpx.Client(base_url=base_url, timeout=60, headers=headers) as client:
+                while time.perf_counter() < deadline:
+                    client.get("/rider/queue")
+                    n += 1
+            with lock:
+                reads += n
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=riders + readers) as pool:
+            jobs = [pool.submit(rider, i) for i in range(riders)] + [pool.submit(reader, i) for i in range(readers)]
+            for job in jobs:
+                job.result()
+        wall = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / wall,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "reads_ps": reads / wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--riders", type=int, default=48, help="concurrent rider clients")
+    parser.add_argument("--readers", type=int, default=8, help="concurrent clients polling the queue")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'writes':>8}{'errors':>8}{'writes/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'reads/s':>10}")
+    for profile in ("default", "tuned"):
+        r = run_profile(profile, args.riders, args.readers, args.seconds, args.workers)
+        print(f"{profile:<10}{r['requests']:>8}{r['errors']:>8}{r['rps']:>10.1f}"
+              f"{r['p50_ms']:>8.1f}ms{r['p95_ms']:>8.1f}ms{r['p99_ms']:>8.1f}ms{r['reads_ps']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
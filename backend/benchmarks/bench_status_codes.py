@@ -0,0 +1,151 @@
+"""
+Storage and scan cost of rider status history: legacy VARCHAR status vs SMALLINT status_code.
+
+    cd backend && python -m benchmarks.bench_status_codes [--rows 1000000]
+
+Builds both layouts side by side in scratch tables (bench_status_legacy with
+the old index on status, bench_status_codes without it), with the same rows,
+then reports table and index sizes and the best of --repeat timings for the
+time-range scan the reports and dashboards run, and for whole-table status
+counts (answered from the status index alone on the legacy layout; nothing
+in the app runs them). Uses a throwaway SQLite file unless DATABASE_URL is
+already set; on Postgres sizes come from pg_relation_size, on SQLite from
+the dbstat table.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench_status_codes.db"
+)
+
+from sqlalchemy import (  # noqa: E402
+    Column, DateTime, Index, Integer, MetaData, SmallInteger, String, Table, func, insert, select, text,
+)
+
+from app.database import engine  # noqa: E402
+from app.utils.status_codes import BUILTIN_CODES  # noqa: E402
+
+WEIGHTS = {"available": 40, "delivery": 30, "break": 10, "offline": 15, "online": 5}
+BATCH = 10000
+
+metadata = MetaData()
+legacy = Table(
+    "bench_status_legacy", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("rider_id", Integer, nullable=False),
+    Column("status", String(50), nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Index("ix_bench_status_legacy_rider_id", "rider_id"),
+    Index("ix_bench_status_legacy_status", "status"),
+    Index("ix_bench_status_legacy_updated_at", "updated_at"),
+)
+compact = Table(
+    "bench_status_codes", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("rider_id", Integer, nullable=False),
+    Column("status_code", SmallInteger, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+    Index("ix_bench_status_codes_rider_id", "rider_id"),
+    Index("ix_bench_status_codes_updated_at", "updated_at"),
+)
+
+
+def fill(rows: int, riders: int) -> None:
+    rnd = random.Random(7)
+    names, weights = list(WEIGHTS), list(WEIGHTS.values())
+    start = datetime(2030, 1, 1)
+    with engine.begin() as conn:
+        for lo in range(0, rows, BATCH):
+            batch = []
+            for n in range(lo, min(lo + BATCH, rows)):
+                status = rnd.choices(names, weights)[0]
+                batch.append((rnd.randrange(riders) + 1, status, start + timedelta(seconds=n * 3)))
+            conn.execute(insert(legacy), [{"rider_id": r, "status": s, "updated_at": t} for r, s, t in batch])
+            conn.execute(
+                insert(compact),
+                [{"rider_id": r, "status_code": BUILTIN_CODES[s], "updated_at": t} for r, s, t in batch],
+            )
+
+
+def sizes(table: Table) -> tuple[int, int]:
+    """(table bytes, index bytes)."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            return conn.execute(
+                text("SELECT pg_relation_size(:t), pg_indexes_size(:t)"), {"t": table.name}
+            ).one()
+        if engine.dialect.name == "sqlite":
+            conn.execute(text("ANALYZE"))
+            data = conn.execute(
+                text("SELECT SUM(pgsize) FROM dbstat WHERE name = :t"), {"t": table.name}
+            ).scalar()
+            index = conn.execute(
+                text("SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master "
+                     "WHERE type = 'index' AND tbl_name = :t)"),
+                {"t": table.name},
+            ).scalar()
+            return data or 0, index or 0
+    raise SystemExit(f"No size query for {engine.dialect.name}")
+
+
+def best_of(repeat: int, statement) -> float:
+    best = None
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(statement).all()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--riders", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    started = time.perf_counter()
+    fill(args.rows, args.riders)
+    print(f"{args.rows:,} rows per layout in {time.perf_counter() - started:.1f}s ({engine.dialect.name})")
+
+    print(f"{'':<22}{'table':>12}{'indexes':>12}")
+    for label, table in (("VARCHAR status", legacy), ("SMALLINT status_code", compact)):
+        data, index = sizes(table)
+        print(f"{label:<22}{data / 2**20:>10.1f}MB{index / 2**20:>10.1f}MB")
+
+    window_start = datetime(2030, 1, 1) + timedelta(seconds=args.rows)  # the newest half
+    scans = {
+        "count by status*": (
+            select(legacy.c.status, func.count()).group_by(legacy.c.status),
+            select(compact.c.status_code, func.count()).group_by(compact.c.status_code),
+        ),
+        "count one status*": (
+            select(func.count()).where(legacy.c.status == "delivery"),
+            select(func.count()).where(compact.c.status_code == BUILTIN_CODES["delivery"]),
+        ),
+        "per rider, time range": (
+            select(legacy.c.rider_id, legacy.c.status, func.count())
+            .where(legacy.c.updated_at >= window_start).group_by(legacy.c.rider_id, legacy.c.status),
+            select(compact.c.rider_id, compact.c.status_code, func.count())
+            .where(compact.c.updated_at >= window_start).group_by(compact.c.rider_id, compact.c.status_code),
+        ),
+    }
+    print(f"{'':<22}{'VARCHAR':>12}{'SMALLINT':>12}")
+    for label, (old, new) in scans.items():
+        print(f"{label:<22}{best_of(args.repeat, old) * 1000:>10.1f}ms{best_of(args.repeat, new) * 1000:>10.1f}ms")
+    print("* index-only on the VARCHAR layout, which pays for it in index size and on every insert")
+
+    metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Deterministic synthetic fleet: sub admins, stores, riders and months of
+status, location, attendance and shift history, bulk-inserted.
+
+    cd backend && python -m benchmarks.fleet --database-url sqlite:////tmp/fleet.db \
+        [--riders 10000] [--sub-admins 20] [--stores 25] [--days 60] [--seed 42]
+
+The same arguments (and end date) always produce the same rows. Every
+account's password is PASSWORD; the prime admin is PRIME_USERNAME.
+Works against SQLite or Postgres; the target database should be empty.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from passlib.hash import bcrypt
+from sqlalchemy import insert, select
+
+PASSWORD = "bench-pass"
+PRIME_USERNAME = "bench_prime"
+INSERT_CHUNK = 20000
+
+SHIFT_STARTS = (7, 9, 11, 15)  # rider i starts at SHIFT_STARTS[i % 4]:00
+SHIFT_HOURS = 8
+UPCOMING_DAYS = 7  # shifts are also scheduled this far ahead
+
+
+def sub_admin_username(i: int) -> str:
+    return f"bench_sub_{i}"
+
+
+def rider_username(i: int) -> str:
+    return f"bench_rider_{i}"
+
+
+def store_name(i: int) -> str:
+    return f"Store {i:02d}"
+
+
+class ChunkedInsert:
+    """Buffers rows per model and flushes them as executemany INSERTs of INSERT_CHUNK rows."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffers: dict = {}
+        self.counts: dict[str, int] = {}
+
+    def add(self, model, row: dict) -> None:
+        buffer = self.buffers.setdefault(model, [])
+        buffer.append(row)
+        if len(buffer) >= INSERT_CHUNK:
+            self.flush(model)
+
+    def flush(self, model=None) -> None:
+        for m in [model] if model is not None else list(self.buffers):
+            rows = self.buffers.get(m)
+            if rows:
+                self.conn.execute(insert(m), rows)
+                self.counts[m.__tablename__] = self.counts.get(m.__tablename__, 0) + len(rows)
+                self.buffers[m] = []
+
+
+def generate_fleet(
+    engine,
+    riders: int = 10000,
+    sub_admins: int = 20,
+    stores: int = 25,
+    days: int = 60,
+    seed: int = 42,
+    end_date: date | None = None,
+) -> dict:
+    """
+    Create the schema and load the fleet. History covers the `days` days up to and
+    including end_date (today, UTC, by default); today's activity stops at the current
+    time so live views have riders on shift. Returns row counts per table.
+    """
+    # app.* reads DATABASE_URL at import time, so callers set it first.
+    from app.database import Base
+    from app.models import (
+        Attendance,
+        ImpersonationLog,
+        RiderCurrentStatus,
+        RiderLocation,
+        RiderStatus,
+        Shift,
+        User,
+    )
+
+    rnd = random.Random(seed)
+    end_date = end_date or datetime.utcnow().date()
+    now = datetime.utcnow()
+    password = bcrypt.hash(PASSWORD)
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [{"username": PRIME_USERNAME, "name": "Bench Prime", "password": password,
+              "role": "prime_admin", "store": "admin", "is_active": True}],
+        )
+        prime_id = conn.execute(select(User.id).where(User.username == PRIME_USERNAME)).scalar_one()
+        conn.execute(
+            insert(User),
+            [{"username": sub_admin_username(i), "name": f"Bench Sub Admin {i}", "password": password,
+              "role": "sub_admin", "manager_id": prime_id, "is_active": True}
+             for i in range(sub_admins)],
+        )
+        sub_ids = dict(
+            conn.execute(select(User.username, User.id).where(User.role == "sub_admin")).all()
+        )
+        conn.execute(
+            insert(User),
+            [{"username": rider_username(i), "name": f"Bench Rider {i}", "password": password,
+              "role": "rider", "store": store_name(i % stores),
+              "manager_id": sub_ids[sub_admin_username(i % sub_admins)], "is_active": True}
+             for i in range(riders)],
+        )
+        rider_ids = dict(conn.execute(select(User.username, User.id).where(User.role == "rider")).all())
+        rider_ids = [rider_ids[rider_username(i)] for i in range(riders)]
+
+        out = ChunkedInsert(conn)
+        current: dict[int, tuple[str, datetime]] = {}
+        first_day = end_date - timedelta(days=days - 1)
+        for offset in range(days + UPCOMING_DAYS):
+            day = first_day + timedelta(days=offset)
+            past = day <= end_date
+            for i, rider_id in enumerate(rider_ids):
+                if day.weekday() == i % 7:
+                    if past:
+                        out.add(Attendance, {"rider_id": rider_id, "date": day, "status": "off_day",
+                                             "source": "manual", "created_at": datetime.combine(day, datetime.min.time())})
+                    continue
+                start = datetime.combine(day, datetime.min.time()) + timedelta(hours=SHIFT_STARTS[i % 4])
+                end = start + timedelta(hours=SHIFT_HOURS)
+                out.add(Shift, {"rider_id": rider_id, "start_time": start, "end_time": end, "created_at": start})
+                if not past:
+                    continue
+                if rnd.random() < 0.03:
+                    out.add(Attendance, {"rider_id": rider_id, "date": day, "status": "absent",
+                                         "source": "manual", "created_at": start})
+                    continue
+                out.add(Attendance, {"rider_id": rider_id, "date": day, "status": "present",
+                                     "source": "auto" if rnd.random() < 0.5 else "manual", "created_at": start})
+
+                # available -> delivery -> available -> offline through the shift
+                marks = sorted(rnd.sample(range(30, SHIFT_HOURS * 60 - 30), 2))
+                events = [
+                    ("available", start),
+                    ("delivery", start + timedelta(minutes=marks[0])),
+                    ("available", start + timedelta(minutes=marks[1])),
+                    ("offline", end),
+                ]
+                lat, lng = 5.55 + (i % 100) * 0.002, -0.20 + (i // 100 % 100) * 0.002
+                pings = [
+                    (start + timedelta(minutes=60 + ping * 100 + rnd.randrange(30)),
+                     lat + rnd.uniform(-0.01, 0.01), lng + rnd.uniform(-0.01, 0.01))
+                    for ping in range(4)
+                ]
+                # Random draws above never depend on the clock, so only the cut-off moves.
+                for status, at in events:
+                    if at <= now:
+                        out.add(RiderStatus, {"rider_id": rider_id, "status": status, "updated_at": at})
+                        current[rider_id] = (status, at)
+                for at, ping_lat, ping_lng in pings:
+                    if at <= now:
+                        out.add(RiderLocation, {"rider_id": rider_id, "lat": ping_lat, "lng": ping_lng,
+                                                "updated_at": at})
+        out.flush()
+
+        conn.execute(
+            insert(RiderCurrentStatus),
+            [{"rider_id": rid, "status": status, "updated_at": at} for rid, (status, at) in current.items()],
+        )
+        conn.execute(
+            insert(ImpersonationLog),
+            [{"actor_id": prime_id, "target_id": rnd.choice(rider_ids), "target_role": "rider",
+              "created_at": now - timedelta(hours=n)} for n in range(200)],
+        )
+
+    counts = {"users": 1 + sub_admins + riders, **out.counts, "rider_current_status": len(current)}
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--riders", type=int, default=10000)
+    parser.add_argument("--sub-admins", type=int, default=20)
+    parser.add_argument("--stores", type=int, default=25)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url (or DATABASE_URL) is required")
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from app.database import engine
+
+    t0 = time.perf_counter()
+    counts = generate_fleet(engine, args.riders, args.sub_admins, args.stores, args.days, args.seed)
+    elapsed = time.perf_counter() - t0
+    total = sum(counts.values())
+    for table, n in counts.items():
+        print(f"{table:<22}{n:>12,}")
+    print(f"{'total':<22}{total:>12,}  in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Load test every router against a synthetic fleet and compare with a baseline.
+
+    cd backend && python -m benchmarks.load [--riders 10000] [--days 60] \
+        [--concurrency 16] [--requests 200] [--workers 1] \
+        [--database-url postgresql://...] [--reuse] \
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--fail-on-regression] \
+        [--query-budgets]
+
+Loads the fleet from benchmarks.fleet (into a throwaway SQLite file unless
+--database-url points at an empty database; --reuse skips loading), starts
+the API with uvicorn in a subprocess, then runs each scenario on its own
+with `--concurrency` client threads and reports throughput and p50/p95/p99
+latency. With a baseline file present, p95 changes beyond --tolerance are
+flagged; --save-baseline writes the current run as the new baseline.
+
+--query-budgets skips the load run. Instead it calls every endpoint that
+declares a query_budget in process with QUERY_DIAGNOSTICS=raise. It then
+lowers one budget below what its endpoint needs, to prove an overrun fails.
+The run exits 1 when any budgeted call fails, when a budgeted route has no
+scenario, or when the overrun goes through.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks.fleet import PASSWORD, PRIME_USERNAME, rider_username, store_name, sub_admin_username
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+RIDER_SESSIONS = 16  # distinct rider logins shared by the rider scenarios
+
+
+class Scenario:
+    def __init__(self, name: str, role: str, method: str, path, body=None, requests: int | None = None,
+                 expected: tuple[int, ...] = ()):
+        self.name = name
+        self.role = role  # prime | sub | rider | anon
+        self.method = method
+        self.path = path  # str, or callable(i) -> str
+        self.body = body  # None, dict, or callable(i) -> dict
+        self.requests = requests  # overrides --requests for very heavy endpoints
+        self.expected = expected  # 4xx statuses that are normal answers, not errors
+
+    def request_args(self, i: int) -> tuple[str, dict | None]:
+        path = self.path(i) if callable(self.path) else self.path
+        body = self.body(i) if callable(self.body) else self.body
+        return path, body
+
+
+def scenarios(riders: int, stores: int) -> list[Scenario]:
+    today = datetime.utcnow().date()
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=7)
+    future = datetime(today.year + 5, 1, 1, 6, 0)
+    month_ago = today - timedelta(days=30)
+    now = datetime.utcnow().replace(microsecond=0).isoformat()
+
+    return [
+        Scenario("health", "anon", "GET", "/health"),
+        Scenario("auth.login", "anon", "POST", "/auth/login",
+                 lambda i: {"username": rider_username(i % riders), "password": PASSWORD}, requests=40),
+        Scenario("admin.riders", "prime", "GET", "/admin/riders?limit=500"),
+        Scenario("admin.riders.search", "prime", "GET", lambda i: f"/admin/riders?q=rider_{i % 97}&limit=100"),
+        Scenario("admin.riders.by_status", "sub", "GET", "/admin/riders?status=available&sort=updated_at"),
+        Scenario("admin.rider_status", "prime", "GET", "/admin/rider-status"),
+        Scenario("admin.rider_status.sub", "sub", "GET", "/admin/rider-status"),
+        Scenario("admin.dashboard_stats", "prime", "GET", "/admin/dashboard-stats"),
+        Scenario("admin.dashboard_stats.store", "prime", "GET",
+                 lambda i: f"/admin/dashboard-stats?store={store_name(i % stores)}"),
+        Scenario("admin.sub_admins", "prime", "GET", "/admin/sub-admins"),
+        Scenario("admin.prime_overview", "prime", "GET", "/admin/prime-overview"),
+        Scenario("admin.impersonation_logs", "prime", "GET", "/admin/impersonation-logs?limit=100"),
+        Scenario("attendance.today", "rider", "GET", "/attendance/today"),
+        Scenario("attendance.mark", "rider", "POST", "/attendance/mark", {"status": "present"}),
+        Scenario("attendance.bulk", "sub", "POST", "/attendance/bulk",
+                 {"status": "present", "rider_ids": None}),
+        Scenario("rider.status", "rider", "POST", "/rider/status",
+                 lambda i: {"status": ("available", "delivery", "break")[i % 3]}),
+        Scenario("rider.queue", "rider", "GET", "/rider/queue"),
+        Scenario("rider.sync", "rider", "POST", "/rider/sync",
+                 lambda i: {"events": [
+                     {"key": f"load-{i}-{k}", "type": ("status", "location")[k % 2], "at": now,
+                      "status": "available", "lat": 5.55, "lng": -0.2}
+                     for k in range(20)
+                 ]}),
+        Scenario("dispatch.queue", "prime", "GET", lambda i: f"/dispatch/queue?store={store_name(i % stores)}"),
+        Scenario("dispatch.next", "prime", "POST", "/dispatch/next",
+                 lambda i: {"store": store_name(i % stores), "order_ref": f"bench-{i}"}, requests=50,
+                 expected=(409,)),  # nobody available in the store at this hour
+        Scenario("tracking.location", "rider", "POST",
+                 lambda i: f"/tracking/location?lat={5.55 + i * 1e-5:.5f}&lng={-0.2 + i * 1e-5:.5f}"),
+        Scenario("tracking.live", "prime", "GET", "/tracking/live", requests=4),
+        Scenario("reports.store_summary", "prime", "GET",
+                 f"/reports/stores/summary?from_date={month_ago}&to_date={today}"),
+        Scenario("reports.stores_daily", "prime", "GET",
+                 f"/reports/stores/daily?from_date={month_ago}&to_date={today}"),
+        Scenario("reports.riders_daily", "sub", "GET",
+                 f"/reports/riders/daily?from_date={month_ago}&to_date={today}&limit=1000"),
+        Scenario("reports.time_in_state", "sub", "GET",
+                 f"/reports/time-in-state?from_time={month_ago}T00:00:00&to_time={now}", requests=40),
+        Scenario("reports.time_in_state.store", "prime", "GET",
+                 f"/reports/time-in-state?from_time={month_ago}T00:00:00&to_time={now}&group_by=store",
+                 requests=20),
+        Scenario("reports.status_series", "sub", "GET", "/reports/status-series"),
+        Scenario("shifts.list.week", "prime", "GET",
+                 f"/shifts/list?from_time={week_start}T00:00:00&to_time={week_end}T00:00:00&limit=2000"),
+        Scenario("shifts.list.rider", "sub", "GET",
+                 lambda i: f"/shifts/list?rider_id={i % riders + 1}&limit=100"),
+        Scenario("shifts.coverage", "prime", "GET",
+                 f"/shifts/coverage?from_date={week_start}&to_date={week_end - timedelta(days=1)}",
+                 requests=40),
+        Scenario("shifts.create", "prime", "POST", "/shifts/create",
+                 lambda i: {"rider_id": None,
+                            "start_time": (future + timedelta(days=i)).isoformat(),
+                            "end_time": (future + timedelta(days=i, hours=4)).isoformat()}),
+        Scenario("shifts.export", "prime", "POST", "/shifts/export",
+                 {"from_date": str(week_start), "to_date": str(week_end)}, requests=10),
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str, workers: int) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    # No background jobs: auto-offline and attendance derivation would change the data mid-run.
+    env = {**os.environ, "DATABASE_URL": database_url, "AUTO_SEED_ADMIN": "false", "SCHEDULER_ENABLED": "false"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError("API server did not become healthy within 120s")
+
+
+def login(client: httpx.Client, username: str) -> dict:
+    res = client.post("/auth/login", json={"username": username, "password": PASSWORD})
+    res.raise_for_status()
+    return {"Authorization": f"Bearer {res.json()['token']}"}
+
+
+def open_sessions(client: httpx.Client, rider_count: int) -> dict:
+    prime = login(client, PRIME_USERNAME)
+    sub = login(client, sub_admin_username(0))
+    riders = [login(client, rider_username(i)) for i in range(min(RIDER_SESSIONS, rider_count))]
+    sub_riders = client.get("/admin/riders?limit=1000", headers=sub).json()["items"]
+    return {
+        "anon": lambda i: {},
+        "prime": lambda i: prime,
+        "sub": lambda i: sub,
+        "rider": lambda i: riders[i % len(riders)],
+        "sub_rider_ids": [r["id"] for r in sub_riders[:200]],
+        "rider_ids": [r["id"] for r in sub_riders],
+    }
+
+
+def prepare_request(scenario: Scenario, sessions: dict, i: int) -> tuple[str, dict | None, dict]:
+    headers = sessions[scenario.role](i)
+    path, body = scenario.request_args(i)
+    if isinstance(body, dict) and "rider_ids" in body:
+        body = {**body, "rider_ids": sessions["sub_rider_ids"]}
+    if isinstance(body, dict) and "rider_id" in body and body["rider_id"] is None:
+        body = {**body, "rider_id": sessions["rider_ids"][i % len(sessions["rider_ids"])]}
+    return path, body, headers
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def run_scenario(base_url: str, scenario: Scenario, sessions: dict, total: int, concurrency: int) -> dict:
+    local = threading.local()
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        nonlocal errors
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = httpx.Client(base_url=base_url, timeout=300)
+        path, body, headers = prepare_request(scenario, sessions, i)
+        start = time.perf_counter()
+        res = client.request(scenario.method, path, json=body, headers=headers)
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if res.status_code >= 400 and res.status_code not in scenario.expected:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / wall, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def check_query_budgets(riders: int, stores: int) -> list[str]:
+    """
+    Call each scenario that hits a route with a query_budget a few times, then
+    drop the /admin/sub-admins budget to 1 and expect that request to fail.
+    Needs QUERY_DIAGNOSTICS=raise in the environment before app is imported.
+    """
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.utils.query_diagnostics import QueryDiagnosticsError, query_budget
+
+    failures = []
+    covered = set()
+    with TestClient(app) as client:
+        budgets = {}  # route path -> its query_budget dependency
+        routes = list(app.routes)
+        while routes:
+            route = routes.pop()
+            if hasattr(route, "original_router"):  # included routers stay nested
+                routes.extend(route.original_router.routes)
+            for dependency in getattr(route, "dependencies", ()):
+                if hasattr(dependency.dependency, "limit"):
+                    budgets[route.path] = dependency.dependency
+        sessions = open_sessions(client, riders)
+        for scenario in scenarios(riders, stores):
+            for i in range(3):
+                path, body, headers = prepare_request(scenario, sessions, i)
+                route_path = path.split("?")[0]
+                if route_path not in budgets:
+                    break
+                covered.add(route_path)
+                try:
+                    res = client.request(scenario.method, path, json=body, headers=headers)
+                except QueryDiagnosticsError as exc:
+                    failures.append(f"{scenario.name}: {exc}")
+                    break
+                if res.status_code >= 400 and res.status_code not in scenario.expected:
+                    failures.append(f"{scenario.name}: HTTP {res.status_code} {res.text[:200]}")
+                    break
+        print(f"  called {len(covered)} of {len(budgets)} budgeted routes, {len(failures)} failed")
+        for path in sorted(set(budgets) - covered):
+            failures.append(f"{path}: declares a query budget but no scenario calls it")
+
+        # An overrun must fail the request, or the checks above prove nothing.
+        app.dependency_overrides[budgets["/admin/sub-admins"]] = query_budget(1)
+        try:
+            client.get("/admin/sub-admins", headers=sessions["prime"](0))
+            failures.append("GET /admin/sub-admins ran with a budget of 1; budgets are not enforced")
+        except QueryDiagnosticsError as exc:
+            print(f"  overrun fails as expected: {exc}")
+        finally:
+            app.dependency_overrides.clear()
+    return failures
+
+
+def compare(results: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    print(f"\n{'scenario':<30}{'n':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'p95 vs base':>13}")
+    regressions = []
+    for name, r in results.items():
+        delta = ""
+        base = (baseline or {}).get("results", {}).get(name)
+        if base and base["p95_ms"] > 0:
+            change = r["p95_ms"] / base["p95_ms"] - 1
+            delta = f"{change:+.0%}"
+            # Ignore sub-5ms wobble on very fast endpoints.
+            if change > tolerance and r["p95_ms"] - base["p95_ms"] > 5:
+                delta += " !"
+                regressions.append(name)
+        print(f"{name:<30}{r['requests']:>6}{r['errors']:>5}{r['rps']:>9}{r['p50_ms']:>10}"
+              f"{r['p95_ms']:>10}{r['p99_ms']:>10}{delta:>13}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database-url", default=None, help="Empty database to load (default: temp SQLite)")
+    parser.add_argument("--reuse", action="store_true", help="Database already holds a fleet; skip loading")
+    parser.add_argument("--riders", type=int, default=10000)
+    parser.add_argument("--sub-admins", type=int, default=20)
+    parser.add_argument("--stores", type=int, default=25)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per scenario")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--only", default=None, help="Run scenarios whose name contains this")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth (0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--query-budgets", action="store_true",
+                        help="Check the declared query budgets in raise mode instead of load testing")
+    args = parser.parse_args()
+
+    if args.query_budgets:
+        # Must be set before app.config is first imported.
+        os.environ.update(QUERY_DIAGNOSTICS="raise", SCHEDULER_ENABLED="false", AUTO_SEED_ADMIN="false")
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench_fleet.db"
+    os.environ["DATABASE_URL"] = database_url
+    if not args.reuse:
+        from app.database import engine
+
+        t0 = time.perf_counter()
+        from benchmarks.fleet import generate_fleet
+
+        counts = generate_fleet(engine, args.riders, args.sub_admins, args.stores, args.days, args.seed)
+        print(f"loaded {sum(counts.values()):,} rows in {time.perf_counter() - t0:.1f}s: "
+              + ", ".join(f"{t}={n:,}" for t, n in counts.items()))
+
+        # The server runs without the scheduler, so roll the history up here for /reports.
+        from app.jobs.daily_rollups import run_once as roll_up_days
+
+        t0 = time.perf_counter()
+        rolled = roll_up_days()
+        print(f"rolled up {rolled['closed_days']} days in {time.perf_counter() - t0:.1f}s")
+        engine.dispose()
+
+    if args.query_budgets:
+        failures = check_query_budgets(args.riders, args.stores)
+        for failure in failures:
+            print(f"  FAIL {failure}")
+        sys.exit(1 if failures else 0)
+
+    proc, base_url = start_server(database_url, args.workers)
+    try:
+        with httpx.Client(base_url=base_url, timeout=60) as client:
+            sessions = open_sessions(client, args.riders)
+
+        results = {}
+        for scenario in scenarios(args.riders, args.stores):
+            if args.only and args.only not in scenario.name:
+                continue
+            total = scenario.requests or args.requests
+            results[scenario.name] = run_scenario(base_url, scenario, sessions, total, args.concurrency)
+            r = results[scenario.name]
+            print(f"  {scenario.name:<30} p95 {r['p95_ms']:>9} ms  {r['rps']:>8} req/s  {r['errors']} errors",
+                  flush=True)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    regressions = compare(results, baseline, args.tolerance)
+
+    params = {k: getattr(args, k) for k in ("riders", "sub_admins", "stores", "days", "seed",
+                                           "concurrency", "requests", "workers")}
+    if baseline and baseline.get("params") != params:
+        print(f"\nnote: baseline was recorded with {baseline.get('params')}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(
+            {"recorded_at": date.today().isoformat(), "params": params, "results": results}, indent=2
+        ) + "\n")
+        print(f"\nbaseline written to {args.baseline}")
+    if regressions:
+        print(f"\np95 regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
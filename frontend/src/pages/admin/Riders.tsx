@@ -43,10 +43,16 @@ function RidersInner() {
     setLoading(true);
     setErr(null);
     try {
-      const res = await api.get<{ items: Rider[] }>("/admin/riders", {
-        params: { store: storeFilter !== "all" ? storeFilter : undefined },
-      });
-      setRiders(res.data.items || []);
+      const all: Rider[] = [];
+      let cursor: string | null = null;
+      do {
+        const res = await api.get<{ items: Rider[]; next_cursor: string | null }>("/admin/riders", {
+          params: { store: storeFilter !== "all" ? storeFilter : undefined, cursor: cursor || undefined },
+        });
+        all.push(...(res.data.items || []));
+        cursor = res.data.next_cursor;
+      } while (cursor);
+      setRiders(all);
       if (isPrime) {
         const subs = await api.get<{ items: SubAdmin[] }>("/admin/sub-admins");
         setSubAdmins(subs.data.items || []);
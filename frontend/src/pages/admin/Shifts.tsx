@@ -121,8 +121,21 @@ export default function Shifts() {
     setLoading(true);
     setError(null);
     try {
-      const res = await api.get<ApiShift[]>("/shifts/list");
-      setShifts(res.data);
+      // Only the visible week, following the keyset cursor until exhausted.
+      const all: ApiShift[] = [];
+      let cursor: string | undefined;
+      do {
+        const res = await api.get<ApiShift[]>("/shifts/list", {
+          params: {
+            from_time: weekStart.toISOString(),
+            to_time: addDays(weekStart, 7).toISOString(),
+            cursor,
+          },
+        });
+        all.push(...res.data);
+        cursor = res.headers["x-next-cursor"] || undefined;
+      } while (cursor);
+      setShifts(all);
     } catch (err: any) {
       setError(errx.responsex.datax.detail || "Failed to load shifts");
     } finally {
@@ -176,9 +189,12 @@ export default function Shifts() {
         setBreaks({});
       }
     }
-    loadShifts();
   }, []);
 
+  useEffect(() => {
+    loadShifts();
+  }, [weekStart]);
+
   return (
     <div className="shift-page">
       <Topbar title="Shifts" />